@@ -1,7 +1,6 @@
 import pandas as pd
 import pypsa
 from data_loader import DataLoader, annuity
-import results_plotter as plot
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning, module="pypsa")
 
@@ -134,6 +133,7 @@ def create_network(data: DataLoader):
 
 
 if __name__ == "__main__":
+    import results_plotter as plot
 
     data = DataLoader(country="ESP", discount_rate=0.07)
 
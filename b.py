@@ -1,7 +1,10 @@
+import pathlib
 import pypsa
 from data_loader import DataLoader
 from a import create_network
-import results_plotter as plot
+from sweep_runner import SWEEP_DIR, run_sweep, load_results, load_mixes
+from lean_extraction import lean_solve, extract_lean_results
+import references
 import numpy as np
 
 def create_co2_limits(n_opts: int = 10):
@@ -20,21 +23,27 @@ def add_co2_constraint(network: pypsa.Network, co2_limit: float):
     )
     return network
 
-def simulate_tests(network: pypsa.Network, n_opts: int = 10):
+def simulate_tests(network: pypsa.Network, n_opts: int = 10, log_file: str | pathlib.Path = SWEEP_DIR / "b_co2_limits.jsonl"):
+    import results_plotter as plot
+
     co2_limits = create_co2_limits(n_opts)
+    scenarios = {f"co2_limit={co2_limit/1e6}MT": float(co2_limit) for co2_limit in co2_limits}
+
+    # Every finished CO2 limit is logged, an interrupted sweep resumes where it stopped.
+    # Only the plotted capacities, the objective and the CO2 dual are extracted per solve.
+    capacities = {'Generator': references.REFERENCES['GENERATORS'], 'Link': references.REFERENCES['LINKS']}
+    run_sweep(
+        scenarios,
+        lambda co2_limit: add_co2_constraint(network.copy(), co2_limit),
+        log_file,
+        extract=lambda n: extract_lean_results(n, capacities),
+        solve=lean_solve(capacities),
+    )
 
-    mixes = []
-    objectives = []
-    for co2_limit in co2_limits:
-        network = add_co2_constraint(network, co2_limit)
-        network.optimize()
-        mix = []
-        for ix, gen in enumerate(plot.REFERENCES['GENERATORS']):
-            mix += [network.generators.p_nom_opt[gen]]
-        for ix, link in enumerate(plot.REFERENCES['LINKS']):
-            mix += [network.links.p_nom_opt[link]]
-        mixes += [mix]
-        objectives += [network.objective/1e6] # in million EUR
+    results = load_results(log_file, scenarios)
+    mixes = load_mixes(log_file, references.REFERENCES['GENERATORS'], references.REFERENCES['LINKS'], scenarios)
+    objectives = [result['objective']/1e6 for result in results.values()] # in million EUR
+    co2_limits = np.array([scenarios[key] for key in results])
     # Plot the results
     plot.plot_capacity_variation_under_varying_co2_limits(mixes, co2_limits, objectives, filename="b_co2_limit.png")
 
@@ -43,7 +52,6 @@ if __name__ == '__main__':
     data = DataLoader(country="ESP", discount_rate=0.07)
     # Create the network
     network = create_network(data)
-    network.optimize.create_model()
     # Spain's CO2 emissions data: https://www.iea.org/countries/spain/emissions
     # It is at 49 MT CO2 in 2022, down from 118 MT in 2007. Was at 40 MT in 2020.
     simulate_tests(network)
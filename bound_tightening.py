@@ -0,0 +1,187 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pypsa
+from warm_start import solver_statistics
+from references import NOMINAL_ATTRS
+
+
+def _bus_peak_load(network: pypsa.Network):
+    """ Peak of the summed loads per bus (zero for buses without load) """
+    loads = network.get_switchable_as_dense("Load", "p_set")
+    by_bus = loads.T.groupby(network.loads.bus).sum().T
+    return by_bus.max().reindex(network.buses.index, fill_value=0)
+
+
+def _electric_buses(network: pypsa.Network):
+    """ AC buses with demand; the battery bus is AC as well but only reachable through its links """
+    ac = network.buses.index[network.buses.carrier == "AC"]
+    return ac[ac.isin(network.loads.bus)]
+
+
+def derive_bounds(network: pypsa.Network, margin: float = 1.5, min_useful_cf: float = 0.05):
+    """
+    Upper bounds on the extendable capacities that no sensible optimum exceeds.
+
+    Parameters:
+        network (pypsa.Network): Network before solving.
+        margin (float): Safety factor on the power bounds, so they stay slack at the optimum.
+        min_useful_cf (float): Lowest yearly capacity factor, after curtailment, that justifies
+                               building variable renewable capacity.
+
+    Returns:
+        pd.DataFrame: Per extendable component its attribute, the bound and the reason.
+    """
+    weights = network.snapshot_weightings.generators
+    loads = network.get_switchable_as_dense("Load", "p_set")
+    ac_loads = loads.loc[:, network.loads.bus.isin(_electric_buses(network))]
+    system_peak = ac_loads.sum(axis=1).max()
+    system_energy = ac_loads.sum(axis=1).mul(weights).sum()
+    peak_load = _bus_peak_load(network)
+    p_max_pu = network.get_switchable_as_dense("Generator", "p_max_pu")
+
+    records = []
+    def add(component, name, bound, reason):
+        records.append({'component': component, 'name': name, 'attr': NOMINAL_ATTRS[component],
+                        'bound': float(bound), 'reason': reason})
+
+    generators = network.generators[network.generators.p_nom_extendable]
+    for name, g in generators.iterrows():
+        if p_max_pu[name].min() < 1:
+            # Variable renewable: at least min_useful_cf of the capacity must reach a load
+            add('Generator', name, system_energy / (min_useful_cf * weights.sum()), "demand / minimum useful capacity factor")
+        else:
+            # Dispatchable: never needs to exceed the peak load it can serve
+            peak = system_peak if g.bus in _electric_buses(network) else peak_load[g.bus]
+            add('Generator', name, margin * peak, "peak load")
+
+    stores = network.stores[network.stores.e_nom_extendable]
+    for name, s in stores.iterrows():
+        # A cyclic store never usefully holds more than the yearly demand it could supply
+        discharge = network.links[network.links.bus0 == s.bus]
+        efficiency = discharge.efficiency.max() if len(discharge) else 1
+        add('Store', name, margin * system_energy / efficiency, "yearly demand / discharge efficiency")
+
+    links = network.links[network.links.p_nom_extendable]
+    electric = _electric_buses(network)
+    for name, l in links.iterrows():
+        if l.bus1 in electric and l.p_min_pu >= 0:
+            # Discharging into the grid: output never needs to exceed the peak load
+            add('Link', name, margin * system_peak / l.efficiency, "peak load / efficiency")
+        elif l.bus0 in electric and l.p_min_pu >= 0:
+            # Charging from the grid: input is limited by the generation able to feed it
+            add('Link', name, np.inf, "generation at bus0")
+        else:
+            branch_bound = _leaf_bound(network, l.bus0, l.bus1, peak_load)
+            if branch_bound is not None:
+                add('Link', name, margin * branch_bound, "peak load / capacity behind the leaf bus")
+
+    lines = network.lines[network.lines.s_nom_extendable]
+    for name, l in lines.iterrows():
+        branch_bound = _leaf_bound(network, l.bus0, l.bus1, peak_load)
+        if branch_bound is not None:
+            add('Line', name, margin * branch_bound, "peak load / capacity behind the leaf bus")
+
+    bounds = pd.DataFrame(records, columns=['component', 'name', 'attr', 'bound', 'reason'])
+
+    # Charging links: bounded by the bounds of the generators at their input bus
+    generator_bounds = bounds[bounds.component == 'Generator'].set_index('name').bound
+    fixed = network.generators[~network.generators.p_nom_extendable]
+    for i in bounds.index[bounds.reason == "generation at bus0"]:
+        bus = network.links.at[bounds.at[i, 'name'], 'bus0']
+        at_bus = network.generators.index[network.generators.bus == bus]
+        bounds.at[i, 'bound'] = generator_bounds.reindex(at_bus).fillna(fixed.p_nom.reindex(at_bus)).sum()
+    return bounds[np.isfinite(bounds.bound)].reset_index(drop=True)
+
+
+def _leaf_bound(network: pypsa.Network, bus0: str, bus1: str, peak_load: pd.Series):
+    """
+    Flow bound of a branch that is the only expandable connection of one of its buses. Only
+    lines and extendable links count as connections; fixed links (such as "PRT HDAM") are part
+    of the capacity behind the bus. The flow cannot exceed the bus's peak load plus the input of
+    its fixed outgoing links (import), or its fixed generation plus the fixed links into it (export).
+    """
+    links = network.links
+    branches = pd.concat([network.lines[['bus0', 'bus1']], links.loc[links.p_nom_extendable, ['bus0', 'bus1']]])
+    fixed_links = links[~links.p_nom_extendable]
+    for bus in (bus0, bus1):
+        degree = (branches.bus0 == bus).sum() + (branches.bus1 == bus).sum()
+        extendable = network.generators.p_nom_extendable[network.generators.bus == bus].any()
+        if degree == 1 and not extendable:
+            generation = network.generators.p_nom[network.generators.bus == bus].sum() + fixed_links.p_nom[fixed_links.bus1 == bus].sum()
+            demand = peak_load[bus] + fixed_links.p_nom[fixed_links.bus0 == bus].sum()
+            return max(demand, generation)
+    return None
+
+
+def tighten_bounds(network: pypsa.Network, bounds: pd.DataFrame | None = None, **kwargs):
+    """ Set the derived bounds as *_nom_max, keeping any tighter bound already in place """
+    bounds = derive_bounds(network, **kwargs) if bounds is None else bounds
+    for (component, attr), group in bounds.groupby(['component', 'attr']):
+        df = network.df(component)
+        current = df.loc[group['name'], f"{attr}_max"].values
+        df.loc[group['name'], f"{attr}_max"] = np.minimum(current, group.bound.values)
+    return network
+
+
+def binding_bounds(network: pypsa.Network, bounds: pd.DataFrame, rtol: float = 1e-3):
+    """ Derived bounds reached by the solution; these were not valid and should be loosened """
+    optimal = np.array([network.df(c).at[n, f"{a}_opt"] for c, n, a in bounds[['component', 'name', 'attr']].values])
+    return bounds[optimal >= (1 - rtol) * bounds.bound.values]
+
+
+def optimize_tightened(network: pypsa.Network, **kwargs):
+    """
+    network.optimize() after bound tightening. Derived bounds that bind at the optimum were not
+    valid: they are dropped, i.e. the bounds in place before tightening are restored, and the
+    network is re-solved until no derived bound binds.
+    """
+    bounds = derive_bounds(network)
+    original = {(c, n): network.df(c).at[n, f"{a}_max"] for c, n, a in bounds[['component', 'name', 'attr']].values}
+    tighten_bounds(network, bounds)
+    while True:
+        status, condition = network.optimize(**kwargs)
+        if status != "ok":
+            return status, condition
+        binding = binding_bounds(network, bounds)
+        if binding.empty:
+            return status, condition
+        warnings.warn(f"Derived capacity bounds are binding, re-solving without them: {list(binding['name'])}")
+        for c, n, a in binding[['component', 'name', 'attr']].values:
+            network.df(c).at[n, f"{a}_max"] = original[c, n]
+        bounds = bounds.drop(binding.index)
+
+
+if __name__ == "__main__":
+    import time
+    from data_loader import DataLoader
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+    from f import add_neighbors
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+    builds = {
+        'a base'             : lambda: create_network(data),
+        'd storage + 0 CO2'  : lambda: add_co2_constraint(add_storage(create_network(data), data), 0),
+        'f interconnected'   : lambda: add_neighbors(add_co2_constraint(add_storage(create_network(data), data), 0), data),
+    }
+
+    rows = []
+    for case, build in builds.items():
+        for tightened in [False, True]:
+            network = build()
+            start = time.perf_counter()
+            status, _ = optimize_tightened(network) if tightened else network.optimize()
+            rows.append({'case': case, 'bounds': tightened, 'time [s]': time.perf_counter() - start,
+                         'objective [M€]': network.objective / 1e6, **solver_statistics(network)})
+        bounds = derive_bounds(build())
+        print(bounds)
+        # Every interconnector of f.py leads to a leaf bus and must be bounded
+        network = build()
+        lines = network.lines.index[network.lines.s_nom_extendable]
+        unbounded = lines.difference(bounds.name[bounds.component == 'Line'])
+        assert unbounded.empty, f"Interconnectors without a bound: {list(unbounded)}"
+
+    pd.set_option('display.width', 200)
+    print(pd.DataFrame(rows).set_index(['case', 'bounds']))
@@ -1,5 +1,10 @@
 from data_loader import DataLoader
 from a import create_network
+from model_cache import optimize_cached
+from sweep_runner import SWEEP_DIR, run_sweep, load_mixes
+from dispatch_store import append_dispatch
+from warm_start import WarmStartSolver, order_scenarios
+from weather_years import year_statistics
 import results_plotter as plot
 import numpy as np
 import matplotlib.pyplot as plt
@@ -7,21 +12,26 @@ import matplotlib.pyplot as plt
 #weather_years = [2015]
 weather_years = range(1985, 2016) # all years
 
-mixes = []
+log_file = SWEEP_DIR / "c_weather_years.jsonl"
+dispatch_file = SWEEP_DIR / "c_weather_years_dispatch.zarr"
+scenarios = {f"weather_year={w_year}": w_year for w_year in weather_years}
+datas = {w_year: DataLoader(country="ESP", discount_rate=0.07, weather_year=w_year) for w_year in weather_years}
 
-for w_year in weather_years:
-
-    data = DataLoader(country="ESP", discount_rate=0.07, weather_year=w_year)
+def build(w_year: int):
     # Create the network
-    network = create_network(data)
-    network.optimize.create_model()
+    return create_network(datas[w_year])
+
+# Weather years only change the availability profiles, the built model is reused and
+# every year is warm-started from the basis of the previous one, so the years are solved
+# in an order where consecutive years have similar statistics
+# The hourly dispatch of every year is appended to a compressed store for post-analysis
+solve_order = {f"weather_year={w_year}": w_year for w_year in order_scenarios(year_statistics(datas))}
+solver = WarmStartSolver(solve=optimize_cached)
+run_sweep(solve_order, build, log_file, solve=solver,
+          callback=lambda key, network: append_dispatch(dispatch_file, network, key))
+
+print(solver.report())
 
-    network.optimize()
-    mix = []
-    for ix, gen in enumerate(plot.REFERENCES['GENERATORS']):
-        mix += [network.generators.p_nom_opt[gen]]
-    for ix, link in enumerate(plot.REFERENCES['LINKS']):
-        mix += [network.links.p_nom_opt[link]]
-    mixes += [mix]
+mixes = load_mixes(log_file, plot.REFERENCES['GENERATORS'], plot.REFERENCES['LINKS'], scenarios)
 
-plot.plot_weather_variability(mixes, filename="c_weather_variability.png")
\ No newline at end of file
+plot.plot_weather_variability(mixes, filename="c_weather_variability.png")
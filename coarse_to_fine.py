@@ -0,0 +1,199 @@
+import time
+import numpy as np
+import pandas as pd
+import pypsa
+from model_cache import set_objective
+from references import NOMINAL_ATTRS
+
+
+def aggregate_snapshots(network: pypsa.Network, hours: int):
+    """
+    Copy of a network on consecutive blocks of `hours` snapshots.
+
+    Time series are averaged over each block and the snapshot weightings count the
+    hours of the block, so energies, costs and emissions keep their yearly totals.
+    """
+    if hours == 1:
+        return network.copy()
+    aggregated = network.copy()
+    blocks = np.arange(len(network.snapshots)) // hours
+    snapshots = network.snapshots[::hours]
+
+    series = {}
+    for component in aggregated.iterate_components():
+        for attr, df in component.pnl.items():
+            if not df.empty:
+                series[component.name, attr] = df.groupby(blocks).mean().set_axis(snapshots)
+
+    weightings = network.snapshot_weightings.groupby(blocks).sum().set_axis(snapshots)
+    aggregated.set_snapshots(snapshots)
+    aggregated.snapshot_weightings = weightings
+    for (component, attr), df in series.items():
+        aggregated.pnl(component)[attr] = df
+    return aggregated
+
+
+def extendable_capacities(network: pypsa.Network):
+    """ Optimal capacities of the extendable components: (component, name) -> capacity """
+    capacities = {}
+    for component, attr in NOMINAL_ATTRS.items():
+        df = network.df(component)
+        for name in df.index[df[f"{attr}_extendable"]]:
+            capacities[component, name] = df.at[name, f"{attr}_opt"]
+    return capacities
+
+
+def apply_capacities(network: pypsa.Network, capacities: dict, mode: str = "bound"):
+    """
+    Fix the capacities of a network (mode="fix") or use them as lower bounds (mode="bound").
+
+    Fixing leaves a dispatch-only problem, which may be infeasible if the coarse solution
+    misses peaks. Bounding keeps the investment problem, but starts it from the coarse mix.
+    """
+    for (component, name), capacity in capacities.items():
+        attr = NOMINAL_ATTRS[component]
+        df = network.df(component)
+        if mode == "fix":
+            df.at[name, attr] = capacity
+            df.at[name, f"{attr}_extendable"] = False
+        else:
+            df.at[name, f"{attr}_min"] = capacity
+    return network
+
+
+def total_cost(refined: pypsa.Network, network: pypsa.Network, capacities: dict, mode: str = "bound"):
+    """
+    Objective of the refined solve in the terms of the original network, i.e. as network.optimize()
+    reports it: with fixed capacities, their capital costs beyond the existing capacity are added.
+    """
+    if mode != "fix":
+        return refined.objective
+    capex = sum(
+        network.df(component).at[name, "capital_cost"] * (capacity - network.df(component).at[name, NOMINAL_ATTRS[component]])
+        for (component, name), capacity in capacities.items()
+    )
+    return refined.objective + capex
+
+
+def coarse_to_fine(network: pypsa.Network, resolutions: tuple = (24, 6, 3), mode: str = "bound",
+                   gap_tolerance: float = 0.02, direct_cost: float | None = None, **kwargs):
+    """
+    Optimise capacities on an aggregated network, then re-solve the hourly dispatch with them.
+
+    The coarse resolutions are tried in order; a finer one is only used if the refined solve
+    is infeasible or its cost is more than gap_tolerance above the coarse estimate. If none
+    succeeds, the network is solved directly at full resolution.
+
+    Parameters:
+        network (pypsa.Network): Built network at hourly resolution; the solution is written into it.
+        resolutions (tuple): Snapshot block lengths in hours, from coarse to fine.
+        mode (str): "bound" or "fix", see apply_capacities. Fixing is infeasible whenever the coarse
+                    mix cannot cover an hourly peak, unless the network has load shedding.
+        gap_tolerance (float): Accepted relative gap between the refined and the coarse total cost.
+        direct_cost (float): Objective of the direct full-resolution solve, if known; adds the
+                             gap of every iteration to it.
+        **kwargs: Passed to network.optimize().
+
+    Returns:
+        pd.DataFrame: One row per iteration with resolution, status, costs, gap and runtimes.
+    """
+    iterations = []
+    for hours in resolutions:
+        start = time.perf_counter()
+        coarse = aggregate_snapshots(network, hours)
+        status, _ = coarse.optimize(**kwargs)
+        coarse_time = time.perf_counter() - start
+        if status != "ok":
+            iterations.append({'hours': hours, 'status': f"coarse {status}", 'coarse time [s]': coarse_time})
+            continue
+
+        capacities = extendable_capacities(coarse)
+        refined = apply_capacities(network.copy(), capacities, mode)
+        start = time.perf_counter()
+        status, condition = refined.optimize(**kwargs)
+        refined_time = time.perf_counter() - start
+
+        row = {
+            'hours'            : hours,
+            'status'           : status if status == "ok" else f"refined {condition}",
+            'coarse cost'      : coarse.objective,
+            'refined cost'     : total_cost(refined, network, capacities, mode) if status == "ok" else np.nan,
+            'coarse time [s]'  : coarse_time,
+            'refined time [s]' : refined_time,
+        }
+        row['gap'] = (row['refined cost'] - row['coarse cost']) / row['refined cost']
+        if direct_cost is not None:
+            row['gap to direct'] = row['refined cost'] / direct_cost - 1
+        iterations.append(row)
+        if status == "ok" and row['gap'] <= gap_tolerance:
+            _copy_solution(refined, network, capacities, mode)
+            return pd.DataFrame(iterations)
+
+    # No coarse resolution was good enough: solve at full resolution
+    start = time.perf_counter()
+    status, _ = network.optimize(**kwargs)
+    row = {'hours': 1, 'status': status, 'refined cost': network.objective, 'refined time [s]': time.perf_counter() - start}
+    if direct_cost is not None:
+        row['gap to direct'] = row['refined cost'] / direct_cost - 1
+    iterations.append(row)
+    return pd.DataFrame(iterations)
+
+
+def _copy_solution(refined: pypsa.Network, network: pypsa.Network, capacities: dict, mode: str):
+    """ Copy the refined solution into the original network, keeping it extendable """
+    for component in refined.iterate_components():
+        output = component.attrs.index[component.attrs['status'] == "Output"]
+        df = network.df(component.name)
+        for attr in output:
+            if attr in component.df and attr in df:
+                df[attr] = component.df[attr].reindex(df.index)
+            if attr in component.pnl:
+                network.pnl(component.name)[attr] = component.pnl[attr]
+    # Capital costs of the existing capacities of extendable components form the objective constant
+    constant = sum(
+        df.at[name, 'capital_cost'] * df.at[name, NOMINAL_ATTRS[component]]
+        for component in NOMINAL_ATTRS
+        for df in [network.df(component)]
+        for name in df.index[df[f"{NOMINAL_ATTRS[component]}_extendable"]]
+    )
+    set_objective(network, total_cost(refined, network, capacities, mode), constant)
+
+
+if __name__ == "__main__":
+    from data_loader import DataLoader
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+    from f import add_neighbors
+    from pipeline import STEPS
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+    builds = {
+        'f interconnected' : lambda: add_neighbors(add_co2_constraint(add_storage(create_network(data), data), 0), data),
+        'g heat coupled'   : lambda: STEPS['couple_heat'](STEPS['heat_network'](None, data), data),
+    }
+
+    rows = []
+    for case, build in builds.items():
+        network = build()
+        start = time.perf_counter()
+        network.optimize()
+        direct_time, direct_cost = time.perf_counter() - start, network.objective
+
+        network = build()
+        start = time.perf_counter()
+        iterations = coarse_to_fine(network, direct_cost=direct_cost)
+        print(case)
+        print(iterations)
+        rows.append({
+            'case'                    : case,
+            'direct time [s]'         : direct_time,
+            'coarse-to-fine time [s]' : time.perf_counter() - start,
+            'direct cost [M€]'        : direct_cost / 1e6,
+            'coarse-to-fine cost [M€]': network.objective / 1e6,
+            'gap to direct'           : network.objective / direct_cost - 1,
+            'iterations'              : len(iterations),
+        })
+
+    pd.set_option('display.width', 200)
+    print(pd.DataFrame(rows).set_index('case'))
@@ -0,0 +1,168 @@
+import pandas as pd
+import pypsa
+from data_loader import DataLoader
+
+# Storage chains with fixed power and energy (Bus + Store + Links) that are exactly one
+# StorageUnit. Battery and H2 size energy and power independently, which a StorageUnit
+# (fixed max_hours) cannot represent, so they keep their Store + Link formulation.
+# StorageUnit -> names of the components it replaces
+CHAINS = {
+    'PumpedHydro' : {'bus': 'PumpedHydro', 'store': 'PumpedHydro', 'charge': 'PumpedHydroPump',
+                     'discharge': 'PumpedHydroTurbine', 'inflow': None},
+    'DamWater'    : {'bus': 'DamWater', 'store': 'DamReservoir', 'charge': None,
+                     'discharge': 'HDAM', 'inflow': 'Rain to DamWater'},
+}
+
+
+def add_compact_hydro_storages(network: pypsa.Network, data: DataLoader):
+    """
+    Pumped hydro of d.add_hydro_storages as a single StorageUnit.
+
+    The links limit their input, so the unit's dispatch is limited to efficiency * p_nom
+    while pumping uses the full p_nom. A StorageUnit has no cost on charging, so the
+    Store + Link formulation is kept if pumping has a marginal cost.
+    """
+    if data.costs.at["PHS", "marginal_cost"] != 0:
+        from d import add_hydro_storages
+        return add_hydro_storages(network, data)
+
+    power = data.hydro_capacities["pumped_hydro_power"].values[0]
+    efficiency = data.costs.at["PHS", "efficiency"]
+    network.add(
+        "StorageUnit",
+        "PumpedHydro",
+        bus = "electricity bus",
+        carrier = "Water",
+        p_nom = power,
+        p_max_pu = efficiency,
+        p_min_pu = -1,
+        max_hours = data.hydro_capacities["pumped_hydro_storage"].values[0] / power,
+        efficiency_store = efficiency,
+        efficiency_dispatch = efficiency,
+        cyclic_state_of_charge = True,
+        capital_cost = data.costs.at["PHS", "capital_cost"],
+        # The turbine's marginal cost applies to its input, p_dispatch / efficiency
+        marginal_cost = data.costs.at["PHS", "marginal_cost"] / efficiency,
+    )
+    return network
+
+
+def compact_dam_hydro(network: pypsa.Network):
+    """ Replace the dammed hydro chain of a.create_network (bus, inflow, reservoir, turbine) by a StorageUnit """
+    names = CHAINS['DamWater']
+    link = network.links.loc[names['discharge']]
+    inflow = network.get_switchable_as_dense("Generator", "p_max_pu")[names['inflow']] * network.generators.at[names['inflow'], "p_nom"]
+    network.add(
+        "StorageUnit",
+        "DamWater",
+        bus = link.bus1,
+        carrier = "Water",
+        p_nom = link.p_nom,
+        p_max_pu = link.efficiency,
+        p_min_pu = 0,
+        max_hours = network.stores.at[names['store'], "e_nom"] / link.p_nom,
+        efficiency_dispatch = link.efficiency,
+        cyclic_state_of_charge = bool(network.stores.at[names['store'], "e_cyclic"]),
+        inflow = inflow.values, # unused inflow is spilled, as the curtailed rain generator
+        capital_cost = link.capital_cost,
+        marginal_cost = link.marginal_cost / link.efficiency,
+    )
+    network.remove("Link", names['discharge'])
+    network.remove("Store", names['store'])
+    network.remove("Generator", names['inflow'])
+    network.remove("Bus", names['bus'])
+    return network
+
+
+def expand_storage_units(network: pypsa.Network):
+    """
+    Map a solved compact network back to the Bus + Store + Link names of d.py,
+    so the plots and KPIs that look up links_t/stores_t keep working.
+    """
+    for unit, names in CHAINS.items():
+        if unit not in network.storage_units.index:
+            continue
+        su = network.storage_units.loc[unit]
+        p_dispatch = network.storage_units_t.p_dispatch[unit]
+        p_store = network.storage_units_t.p_store.get(unit, 0 * p_dispatch)
+        spill = network.storage_units_t.spill.get(unit, 0 * p_dispatch)
+        soc = network.storage_units_t.state_of_charge[unit]
+        bus = network.buses.loc[su.bus]
+        link_p_nom = su.p_nom # the links limit their input side, see add_compact_hydro_storages
+        turbine_efficiency = su.efficiency_dispatch
+
+        network.add("Bus", names['bus'], x=bus.x, y=bus.y, carrier="Water")
+        network.add("Store", names['store'], bus=names['bus'], e_nom=su.p_nom * su.max_hours,
+                    e_cyclic=su.cyclic_state_of_charge, capital_cost=0)
+        links = {names['discharge']: (names['bus'], su.bus, turbine_efficiency, p_dispatch / turbine_efficiency, -p_dispatch)}
+        if names['charge'] is not None:
+            links[names['charge']] = (su.bus, names['bus'], su.efficiency_store, p_store, -p_store * su.efficiency_store)
+        share = 1 / len(links)
+        for name, (bus0, bus1, efficiency, p0, p1) in links.items():
+            network.add("Link", name, bus0=bus0, bus1=bus1, p_nom=link_p_nom, efficiency=efficiency,
+                        capital_cost=su.capital_cost * share, marginal_cost=su.marginal_cost * turbine_efficiency)
+            network.links.at[name, "p_nom_opt"] = link_p_nom
+            network.links_t.p0[name] = p0
+            network.links_t.p1[name] = p1
+
+        inflow = 0
+        if names['inflow'] is not None:
+            available = network.get_switchable_as_dense("StorageUnit", "inflow")[unit]
+            inflow = available - spill
+            network.add("Generator", names['inflow'], bus=names['bus'], carrier="Water", p_nom=available.max(),
+                        p_max_pu=available / available.max())
+            network.generators.at[names['inflow'], "p_nom_opt"] = available.max()
+            network.generators_t.p[names['inflow']] = inflow
+        network.stores.at[names['store'], "e_nom_opt"] = su.p_nom * su.max_hours
+        network.stores_t.e[names['store']] = soc
+        network.stores_t.p[names['store']] = p_dispatch / turbine_efficiency - su.efficiency_store * p_store - inflow
+
+        network.remove("StorageUnit", unit)
+    return network
+
+
+def optimize_compact(network: pypsa.Network, **kwargs):
+    """ Optimise a compact network and map the storage units back to the d.py names """
+    status, condition = network.optimize(**kwargs)
+    if status == "ok":
+        expand_storage_units(network)
+    return status, condition
+
+
+def model_size(network: pypsa.Network):
+    """ Number of components, variables and constraints of the network's optimisation model """
+    model = network.optimize.create_model()
+    return {
+        'components'  : sum(len(c.df) for c in network.iterate_components() if c.name not in ("Carrier", "SubNetwork")),
+        'variables'   : model.nvars,
+        'constraints' : model.ncons,
+    }
+
+
+if __name__ == "__main__":
+    import time
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+    from references import REFERENCES
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+
+    rows, networks = {}, {}
+    for compact in [False, True]:
+        network = create_network(data)
+        network = add_storage(network, data, compact=compact)
+        network = add_co2_constraint(network, 0)
+        rows[compact] = model_size(network)
+        start = time.perf_counter()
+        optimize_compact(network) if compact else network.optimize()
+        rows[compact]['solve [s]'] = time.perf_counter() - start
+        rows[compact]['objective [M€]'] = network.objective / 1e6
+        networks[compact] = network
+
+    report = pd.DataFrame(rows).T.rename(index={False: "Bus + Store + Links", True: "StorageUnit"})
+    print(report)
+    print(f"Reduction: {1 - report.iloc[1] / report.iloc[0]}")
+    print(pd.DataFrame({
+        compact: n.generators.p_nom_opt[REFERENCES['GENERATORS']] for compact, n in networks.items()
+    }).div(1e3).round(2))
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+from data_loader import read_cost_table, annuity
+
+# Years published in the PyPSA technology-data repository
+PUBLISHED_YEARS = [2025, 2030, 2035, 2040, 2045, 2050]
+PARAMETERS = ['investment', 'FOM', 'VOM', 'fuel', 'efficiency', 'lifetime', 'CO2 intensity', 'discount rate']
+
+
+def load_cost_tables(years: list = PUBLISHED_YEARS):
+    """ Raw cost parameters of several published years as a technology x parameter x year array """
+    tables = {year: read_cost_table(year) for year in years}
+    technologies = sorted(set.intersection(*[set(table.index) for table in tables.values()]))
+    values = np.stack([tables[year].reindex(index=technologies, columns=PARAMETERS).values for year in years], axis=-1)
+    return xr.DataArray(
+        values.astype(float),
+        coords={'technology': technologies, 'parameter': PARAMETERS, 'year': list(years)},
+        dims=('technology', 'parameter', 'year'),
+    )
+
+
+def interpolate_years(raw: xr.DataArray, years: list):
+    """ Linearly interpolate the cost parameters between published years """
+    return raw.interp(year=years).ffill('year').bfill('year')
+
+
+def build_cost_cube(raw: xr.DataArray, years: list | None = None, discount_rates: list | None = None):
+    """
+    Technology x year x discount rate cube of capital and marginal costs.
+
+    Parameters:
+        raw (xr.DataArray): Output of load_cost_tables.
+        years (list): Cost years, interpolated between the published ones. Defaults to the published years.
+        discount_rates (list): Discount rates applied to all technologies. Defaults to each
+                               technology's own rate (a single 'technology' entry along the dimension).
+
+    Returns:
+        xr.Dataset: capital_cost (EUR/MW/a) and marginal_cost (EUR/MWh) plus the raw parameters.
+    """
+    params = interpolate_years(raw, years) if years is not None else raw
+    p = {name: params.sel(parameter=name, drop=True) for name in PARAMETERS}
+
+    if discount_rates is None:
+        r = p['discount rate'].expand_dims(discount_rate=['technology'])
+    else:
+        r = xr.DataArray(np.asarray(discount_rates, dtype=float), coords={'discount_rate': discount_rates}, dims='discount_rate')
+        r = r.broadcast_like(p['lifetime'])
+
+    r, lifetime = xr.broadcast(r, p['lifetime'])
+    annuity_ = xr.DataArray(annuity(r.values, lifetime.values), coords=r.coords, dims=r.dims)
+
+    cube = xr.Dataset({
+        'capital_cost'  : (annuity_ + p['FOM'] / 100) * p['investment'],
+        'marginal_cost' : p['VOM'] + p['fuel'] / p['efficiency'],
+    })
+    for name in PARAMETERS:
+        cube[name] = p[name]
+    return cube.transpose('technology', 'year', 'discount_rate')
+
+
+def costs_for(cube: xr.Dataset, year: int, discount_rate=None):
+    """ Cost table of one year and discount rate in the layout of DataLoader.costs """
+    selection = {'year': year}
+    if discount_rate is not None:
+        selection['discount_rate'] = discount_rate
+    else:
+        selection['discount_rate'] = cube.discount_rate.values[0]
+    costs = cube.sel(selection).to_dataframe()
+    return costs.drop(columns=['year', 'discount_rate'], errors='ignore')
+
+
+if __name__ == "__main__":
+    import time
+    from data_loader import DataLoader
+
+    raw = load_cost_tables()
+
+    start = time.perf_counter()
+    cube = build_cost_cube(raw, years=list(range(2025, 2051)), discount_rates=[0.03, 0.05, 0.07, 0.1])
+    print(f"Cost cube {dict(cube.sizes)} built in {1e3 * (time.perf_counter() - start):.1f} ms")
+    print(cube.capital_cost.sel(technology=["onwind", "solar", "OCGT", "battery storage"], discount_rate=0.07)
+          .to_pandas().loc[:, [2025, 2030, 2040, 2050]].round(0))
+
+    # Patch one DataLoader instead of re-reading the cost CSV per scenario
+    data = DataLoader(country="ESP", discount_rate=0.07)
+    data.costs = costs_for(cube, 2030, 0.05)
+    print(data.costs.loc[["onwind", "solar"], ["capital_cost", "marginal_cost"]])
@@ -0,0 +1,228 @@
+import multiprocessing
+import os
+import tempfile
+import time
+import traceback
+import numpy as np
+import pandas as pd
+import pypsa
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from data_loader import add_derived_costs
+from sweep_runner import SWEEP_DIR, extract_results, read_log, input_hash, append_record
+from model_cache import structure_hash, parameter_hashes
+
+# Uncertain cost parameters: (row of data.costs, parameter) -> range as multiples of the point estimate
+UNCERTAIN_COSTS = {
+    ('onwind', 'investment')                       : (0.8, 1.2),
+    ('solar', 'investment')                        : (0.7, 1.3),
+    ('OCGT', 'fuel')                               : (0.6, 2.0), # 35 EUR/MWh point estimate
+    ('battery storage', 'investment')              : (0.6, 1.4),
+    ('electrolysis', 'investment')                 : (0.6, 1.4),
+    ('electrolysis', 'efficiency')                 : (0.9, 1.1),
+    ('fuel cell', 'investment')                    : (0.6, 1.4),
+    ('hydrogen storage underground', 'investment') : (0.5, 1.5),
+}
+
+# Components of d.py whose costs come from a costs row: (row, share of the capital cost, patched attributes)
+COST_ROWS = {
+    ('Generator', 'onshore wind')    : ('onwind', 1, ['capital_cost', 'marginal_cost']),
+    ('Generator', 'solar')           : ('solar', 1, ['capital_cost', 'marginal_cost']),
+    ('Generator', 'OCGT')            : ('OCGT', 1, ['capital_cost', 'marginal_cost', 'efficiency']),
+    ('Store', 'H2 Storage')          : ('hydrogen storage underground', 1, ['capital_cost', 'marginal_cost']),
+    ('Link', 'H2 Electrolysis')      : ('electrolysis', 1, ['capital_cost', 'marginal_cost', 'efficiency']),
+    ('Link', 'H2 Fuel Cell')         : ('fuel cell', 1, ['capital_cost', 'marginal_cost', 'efficiency']),
+    ('Store', 'Battery')             : ('battery storage', 1, ['capital_cost']),
+    ('Link', 'AC-DC Converter')      : ('battery inverter', 0.5, ['capital_cost', 'marginal_cost', 'efficiency']),
+    ('Link', 'DC-AC Inverter')       : ('battery inverter', 0.5, ['capital_cost', 'marginal_cost', 'efficiency']),
+}
+
+
+def latin_hypercube(n_samples: int, n_dims: int, seed: int = 0):
+    """ Latin-hypercube sample on the unit cube: one point in every 1/n slice of each dimension """
+    rng = np.random.default_rng(seed)
+    slices = rng.permuted(np.tile(np.arange(n_samples), (n_dims, 1)), axis=1).T
+    return (slices + rng.random((n_samples, n_dims))) / n_samples
+
+
+def sample_costs(costs: pd.DataFrame, n_samples: int, uncertain: dict = UNCERTAIN_COSTS, seed: int = 0):
+    """
+    Latin-hypercube samples of the uncertain cost parameters.
+
+    Returns:
+        pd.DataFrame: One row per sample, one column per "row|parameter", in the units of data.costs.
+    """
+    u = latin_hypercube(n_samples, len(uncertain), seed)
+    low = np.array([costs.at[row, param] * lo for (row, param), (lo, _) in uncertain.items()])
+    high = np.array([costs.at[row, param] * hi for (row, param), (_, hi) in uncertain.items()])
+    return pd.DataFrame(low + u * (high - low), columns=[f"{row}|{param}" for row, param in uncertain])
+
+
+def patch_costs(network: pypsa.Network, costs: pd.DataFrame, sample: dict, cost_rows: dict = COST_ROWS):
+    """ Set the sampled cost parameters, recompute the derived costs and write them into the network """
+    costs = costs.copy()
+    for key, value in sample.items():
+        row, param = key.split("|")
+        costs.at[row, param] = value
+    costs = add_derived_costs(costs)
+
+    for (component, name), (row, share, attrs) in cost_rows.items():
+        df = network.df(component)
+        if name not in df.index:
+            continue
+        for attr in attrs:
+            df.at[name, attr] = costs.at[row, attr] * (share if attr == "capital_cost" else 1)
+    return network
+
+
+def _solve_batch(template_file: str, costs: pd.DataFrame, batch: list, solver_name: str, solver_options: dict):
+    """ Worker: load the template once and solve every sample of the batch on a copy of it """
+    template = pypsa.Network(template_file)
+    records = []
+    for index, sample, digest in batch:
+        start = time.perf_counter()
+        record = {'scenario': f"sample={index}", 'parameters': sample, 'inputs': digest}
+        try:
+            network = patch_costs(template.copy(), costs, sample)
+            status, condition = network.optimize(solver_name=solver_name, solver_options=solver_options)
+            record.update(status=status, condition=condition)
+            if status == "ok":
+                record.update(extract_results(network))
+        except Exception:
+            record.update(status='error', condition=traceback.format_exc(limit=3))
+        record['time'] = time.perf_counter() - start
+        records.append(record)
+    return records
+
+
+def output_table(log_file: str | os.PathLike, outputs: dict, inputs: set | None = None):
+    """
+    Sampled parameters and outputs of the solved samples, in solve order.
+
+    Parameters:
+        outputs (dict): Column name -> function(record) giving the output, e.g.
+                        {'OCGT': lambda r: r['capacities']['Generator']['OCGT']}.
+        inputs (set): Input hashes of the samples to include, all samples by default.
+    """
+    # Keyed by input hash: sample=i of another seed or template is a different sample
+    records = {r.get('inputs', r['scenario']): r for r in read_log(log_file)
+               if r['status'] == 'ok' and (inputs is None or r.get('inputs') in inputs)}
+    rows = [
+        {**r['parameters'], **{name: output(r) for name, output in outputs.items()}}
+        for r in records.values()
+    ]
+    return pd.DataFrame(rows)
+
+
+def convergence(table: pd.DataFrame, outputs: list, confidence: float = 1.96):
+    """
+    Running mean, standard error and relative 95% confidence half-width of the outputs
+    as the samples accumulate; the last row describes the current state.
+    """
+    n = np.arange(1, len(table) + 1)[:, None]
+    values = table[outputs].values
+    mean = np.cumsum(values, axis=0) / n
+    variance = np.maximum(np.cumsum(values**2, axis=0) / n - mean**2, 0) * n / np.maximum(n - 1, 1)
+    sem = np.sqrt(variance / n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        half_width = confidence * sem / np.abs(mean)
+    return pd.concat({
+        'mean'       : pd.DataFrame(mean, columns=outputs),
+        'sem'        : pd.DataFrame(sem, columns=outputs),
+        'half width' : pd.DataFrame(half_width, columns=outputs),
+    }, axis=1).set_axis(n.ravel(), axis=0).rename_axis('samples')
+
+
+DEFAULT_OUTPUTS = {
+    'objective [M€]' : lambda r: r['objective'] / 1e6,
+    'onshore wind'   : lambda r: r['capacities']['Generator']['onshore wind'],
+    'solar'          : lambda r: r['capacities']['Generator']['solar'],
+    'OCGT'           : lambda r: r['capacities']['Generator']['OCGT'],
+}
+
+
+def run_cost_uncertainty(
+        template: pypsa.Network,
+        costs: pd.DataFrame,
+        n_samples: int,
+        log_file: str | os.PathLike = SWEEP_DIR / "cost_uncertainty.jsonl",
+        uncertain: dict = UNCERTAIN_COSTS,
+        outputs: dict = DEFAULT_OUTPUTS,
+        batch_size: int = 4,
+        n_workers: int | None = None,
+        tolerance: float = 0.01,
+        seed: int = 0,
+        solver_name: str = "highs",
+        solver_options: dict | None = None,
+    ):
+    """
+    Solve a Latin-hypercube sample of cost scenarios in a process pool.
+
+    Every solved sample is appended to a sweep log (see sweep_runner) as soon as its batch
+    finishes, so an interrupted run resumes where it stopped. Samples are matched on a hash of
+    their parameters, the template, the point estimates and the solver options, so a run with
+    another seed, n_samples or network does not reuse them. After every batch the running
+    statistics of the outputs are printed; the run stops early once the 95% confidence
+    half-width of every output mean is below `tolerance` (relative).
+
+    Parameters:
+        template (pypsa.Network): Built network the costs are patched into.
+        costs (pd.DataFrame): Point estimates, data.costs of the DataLoader used to build the template.
+        n_samples (int): Maximum number of samples.
+
+    Returns:
+        pd.DataFrame: Sampled parameters and outputs of the solved samples.
+        pd.DataFrame: Convergence diagnostics, see convergence().
+    """
+    solver_options = solver_options or {}
+    samples = sample_costs(costs, n_samples, uncertain, seed)
+    context = input_hash(structure_hash(template), parameter_hashes(template), costs.to_json(), solver_name, solver_options)
+    records = samples.to_dict('records')
+    digests = [input_hash(context, sample) for sample in records]
+    done = {r.get('inputs') for r in read_log(log_file) if r['status'] == 'ok'}
+    todo = [(i, sample, digest) for i, (sample, digest) in enumerate(zip(records, digests)) if digest not in done]
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    SWEEP_DIR.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        template_file = os.path.join(tmpdir, "template.nc")
+        template.export_to_netcdf(template_file)
+
+        # Spawned workers: forking a parent that has built the template deadlocks in linopy's LP writer
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_solve_batch, template_file, costs, batch, solver_name, solver_options) for batch in batches]
+            converged = False
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                # Batches that were already running when the run converged are still logged
+                for record in future.result():
+                    append_record(log_file, record)
+                if converged:
+                    continue
+                table = output_table(log_file, outputs, set(digests))
+                if len(table) < 2:
+                    continue
+                state = convergence(table, list(outputs)).iloc[-1]
+                print(f"{len(table)} samples, half width: {state['half width'].round(4).to_dict()}")
+                if (state['half width'] < tolerance).all():
+                    converged = True
+                    for f in futures:
+                        f.cancel() # only batches that have not started
+
+    table = output_table(log_file, outputs, set(digests))
+    return table, convergence(table, list(outputs))
+
+
+if __name__ == "__main__":
+    from data_loader import DataLoader
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+    template = add_co2_constraint(add_storage(create_network(data), data), 2e6)
+
+    table, diagnostics = run_cost_uncertainty(template, data.costs, n_samples=64)
+    pd.set_option('display.width', 200)
+    print(table.describe(percentiles=[0.05, 0.5, 0.95]).T)
+    print(diagnostics.tail())
@@ -3,7 +3,6 @@ from typing import Dict
 from data_loader import DataLoader
 from a import create_network
 from b import add_co2_constraint, create_co2_limits
-import results_plotter as plot
 
 def add_hydrogen(network: pypsa.Network, data: DataLoader):
     #Create a new carrier
@@ -140,11 +139,22 @@ def add_hydro_storages(network: pypsa.Network, data: DataLoader):
     )
     return network
 
-def add_storage(network: pypsa.Network, data: DataLoader):
-    """ Add storage to the network """
+def add_storage(network: pypsa.Network, data: DataLoader, compact: bool = False):
+    """
+    Add storage to the network.
+
+    With compact=True the pumped and dammed hydro chains are single StorageUnits, see
+    compact_storage.py. Solve with compact_storage.optimize_compact to get the results
+    under the usual component names.
+    """
 
     # Add hydro storage
-    network = add_hydro_storages(network, data)
+    if compact:
+        from compact_storage import add_compact_hydro_storages, compact_dam_hydro
+        network = add_compact_hydro_storages(network, data)
+        network = compact_dam_hydro(network)
+    else:
+        network = add_hydro_storages(network, data)
 
     # Add hydrogen storage
     network = add_hydrogen(network, data)
@@ -156,6 +166,8 @@ def add_storage(network: pypsa.Network, data: DataLoader):
 
 def compare_capacity_mixes(data: DataLoader, co2_limit: float, filename: str | None = None):
     """ Compare capacity mixes with and without the CO2 constraint and storage """
+    import results_plotter as plot
+
     n_base = create_network(data)
     n_base.optimize()
 
@@ -177,6 +189,8 @@ def compare_capacity_mixes(data: DataLoader, co2_limit: float, filename: str | N
 
 
 if __name__ == "__main__":
+    import results_plotter as plot
+
     data = DataLoader(country="ESP", discount_rate=0.07)
 
     co2_limit = 0
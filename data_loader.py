@@ -1,15 +1,58 @@
+import numpy as np
 import pandas as pd
 import pathlib
+from snapshot_calendar import year_hours, read_hourly_year, cyclic_offsets
 
 
 def annuity(r,n):
     """ Calculate the annuity factor for an asset with lifetime n years and
-    discount rate  r """
+    discount rate  r. Works element-wise on arrays of r and n. """
 
-    if r > 0:
-        return r/(1. - 1./(1.+r)**n)
-    else:
-        return 1/n
+    r, n = np.asarray(r, dtype=float), np.asarray(n, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = np.where(r > 0, r/(1. - 1./(1.+r)**n), 1/n)
+    return factor if factor.ndim else float(factor)
+
+
+COST_DEFAULTS = {
+    "FOM": 0,
+    "VOM": 0,
+    "efficiency": 1,
+    "fuel": 0,
+    "investment": 0,
+    "lifetime": 25,
+    "CO2 intensity": 0,
+    "discount rate": 0.07,
+}
+
+
+def read_cost_table(cost_year: int, discount_rate: float = 0.07):
+    """ Read the PyPSA technology-data costs of one year (technology x parameter) """
+    url = f"https://raw.githubusercontent.com/PyPSA/technology-data/master/outputs/costs_{cost_year}.csv"
+    costs = pd.read_csv(url, index_col=[0, 1])
+    costs.loc[costs.unit.str.contains("/kW"), "value"] *= 1e3
+    costs.unit = costs.unit.str.replace("/kW", "/MW")
+
+    defaults = dict(COST_DEFAULTS, **{"discount rate": discount_rate})
+    costs = costs.value.unstack().fillna(defaults)
+
+    # Set OCGT values to gas values
+    costs.at["OCGT", "fuel"] = 35 # costs.at["gas", "fuel"]
+    costs.at["OCGT", "CO2 intensity"] = costs.at["gas", "CO2 intensity"]
+    costs.at["central solid biomass CHP CC", "fuel"] = costs.at["solid biomass", "fuel"]
+    #costs.at["central solid biomass CHP CC", "CO2 intensity"] = costs.at["solid biomass", "CO2 intensity"]
+    return costs
+
+
+def add_derived_costs(costs: pd.DataFrame):
+    """ Add marginal costs and annualised capital costs to a cost table """
+    # Calculate marginal costs
+    costs["marginal_cost"] = costs["VOM"] + costs["fuel"] / costs["efficiency"]
+
+    # Calculate capital costs including annuity
+    annuity_ = annuity(costs["discount rate"].values, costs["lifetime"].values)
+    costs["capital_cost"] = (annuity_ + costs["FOM"] / 100) * costs["investment"]
+    return costs
 
 
 class DataLoader:
@@ -25,8 +68,9 @@ class DataLoader:
         self.country = country
         self.neighbors = neighbors
         self.coordinates = coordinates
-        self.dates = pd.date_range('2015-01-01 00:00Z', '2015-12-31 23:00Z', freq='h')
-        self.weather_dates = pd.date_range(f'{weather_year}-01-01 00:00Z', f'{weather_year}-12-31 23:00Z', freq='h')
+        self.dates = year_hours(2015)
+        self.weather_year = weather_year
+        self.weather_dates = year_hours(weather_year) # 29 February is dropped
         self.r = discount_rate
         self.path = str(pathlib.Path(__file__).parent.resolve()) + "/"
         self.read_costs(cost_year)
@@ -39,135 +83,35 @@ class DataLoader:
         self.read_hydro_inflows_PRT()
 
     def read_costs(self, cost_year: int):
-        # Import data
-        url = f"https://raw.githubusercontent.com/PyPSA/technology-data/master/outputs/costs_{cost_year}.csv"
-        costs = pd.read_csv(url, index_col=[0, 1])
-        costs.loc[costs.unit.str.contains("/kW"), "value"] *= 1e3
-        costs.unit = costs.unit.str.replace("/kW", "/MW")
-
-        defaults = {
-            "FOM": 0,
-            "VOM": 0,
-            "efficiency": 1,
-            "fuel": 0,
-            "investment": 0,
-            "lifetime": 25,
-            "CO2 intensity": 0,
-            "discount rate": 0.07,
-        }
-        costs = costs.value.unstack().fillna(defaults)
-
-        # Set OCGT values to gas values
-        costs.at["OCGT", "fuel"] = 35 # costs.at["gas", "fuel"]
-        costs.at["OCGT", "CO2 intensity"] = costs.at["gas", "CO2 intensity"]
-        costs.at["central solid biomass CHP CC", "fuel"] = costs.at["solid biomass", "fuel"]
-        #costs.at["central solid biomass CHP CC", "CO2 intensity"] = costs.at["solid biomass", "CO2 intensity"]
-
-        # Calculate marginal costs
-        costs["marginal_cost"] = costs["VOM"] + costs["fuel"] / costs["efficiency"]
-
-        # Calculate capital costs including annuity
-        annuity_ = costs.apply(lambda x: annuity(x["discount rate"], x["lifetime"]), axis=1)
-        costs["capital_cost"] = (annuity_ + costs["FOM"] / 100) * costs["investment"]
-
-        self.costs = costs
+        """ Read the technology costs of one year, using the loader's discount rate as default """
+        self.costs = add_derived_costs(read_cost_table(cost_year, self.r))
 
     def read_electricity_demand(self):
         """ Read electricity demand data from CSV file """
 
-        df_elec = pd.read_csv(self.path + 'data/electricity_demand.csv', sep=';', index_col=0)
-        df_elec.index = pd.to_datetime(df_elec.index)
-
-        self.p_d = df_elec[[self.country]+self.neighbors].loc[self.dates]
+        self.p_d = read_hourly_year(self.path + 'data/electricity_demand.csv', [self.country]+self.neighbors, 2015)
 
     def read_onshore_wind(self):
         """ Read onshore wind data from CSV file """
-        df_onshorewind = pd.read_csv(self.path + 'data/onshore_wind_1979-2017.csv', sep=';', index_col=0)
-        df_onshorewind.index = pd.to_datetime(df_onshorewind.index)
-
-
-        df_onshorewind = df_onshorewind[[self.country]+self.neighbors].loc[self.weather_dates]
-        self.cf_onw = df_onshorewind[~((df_onshorewind.index.month == 2) & (df_onshorewind.index.day == 29))]
+        self.cf_onw = read_hourly_year(self.path + 'data/onshore_wind_1979-2017.csv', [self.country]+self.neighbors, self.weather_year)
 
     def read_hydro_inflows(self):
-        """Read hydro data from CSV file and expand it to hourly resolution for 2013–2022"""
-
-        # Load CSV and parse date
-        df_hydro = pd.read_csv(self.path + 'data/Hydro_Inflow_ES.csv', sep=',')
-        df_hydro['date'] = pd.to_datetime(df_hydro[['Year', 'Month', 'Day']])
-        df_hydro['date'] = df_hydro['date'].dt.tz_localize('UTC')
-        df_hydro.set_index('date', inplace=True)
-        df_hydro.drop(columns=['Year', 'Month', 'Day'], inplace=True)
-
-        # Convert daily inflow to hourly (divide by 24 and repeat)
-        daily_values = df_hydro.copy()
-        daily_values = daily_values.loc[daily_values.index.repeat(24)]
-        daily_values.index = pd.date_range(
-            start=df_hydro.index.min(),
-            periods=len(daily_values),
-            freq='h',
-            tz='UTC'
-        )
-        daily_values['Inflow [GWh]'] /= 24
-
-        # Repeat inflow values to cover 2013–2022
-        target_index = pd.date_range(
-            start='1983-01-01 00:00:00',
-            end='2023-01-02 23:00:00',
-            freq='h',
-            tz='UTC'
-        )
-        num_hours_needed = len(target_index)
-        hourly_cycle = daily_values['Inflow [GWh]'].values
-        repeats = -(-num_hours_needed // len(hourly_cycle))  # Ceiling division
-        full_inflow = pd.Series(hourly_cycle.tolist() * repeats, index=target_index)[:num_hours_needed]
-
-        #Create final DataFrame with correct hourly index
-        df_expanded = pd.DataFrame({'Inflow [MWh]': full_inflow*1000}) # Convert GWh to MWh
-        df_expanded.index.name = 'datetime'
-
-        self.cf_hydro = df_expanded.loc[self.weather_dates, 'Inflow [MWh]']
-        self.cf_hydro= self.cf_hydro[~((self.cf_hydro.index.month == 2) & (self.cf_hydro.index.day == 29))] # Select only the dates we need
-    
+        """Read daily hydro inflows and repeat them as an hourly cycle starting in 1983"""
+        self.cf_hydro = self.read_inflow_cycle('data/Hydro_Inflow_ES.csv', anchor='1983-01-01', year=self.weather_year)
+
     def read_hydro_inflows_PRT(self):
-        """Read hydro data from CSV file and expand it to hourly resolution for 2013–2022"""
-
-        # Load CSV and parse date
-        df_hydro = pd.read_csv(self.path + 'data/Hydro_Inflow_PT.csv', sep=',')
-        df_hydro['date'] = pd.to_datetime(df_hydro[['Year', 'Month', 'Day']])
-        df_hydro['date'] = df_hydro['date'].dt.tz_localize('UTC')
-        df_hydro.set_index('date', inplace=True)
-        df_hydro.drop(columns=['Year', 'Month', 'Day'], inplace=True)
-
-        # Convert daily inflow to hourly (divide by 24 and repeat)
-        daily_values = df_hydro.copy()
-        daily_values = daily_values.loc[daily_values.index.repeat(24)]
-        daily_values.index = pd.date_range(
-            start=df_hydro.index.min(),
-            periods=len(daily_values),
-            freq='h',
-            tz='UTC'
-        )
-        daily_values['Inflow [GWh]'] /= 24
-
-        # Repeat inflow values to cover 2013–2022
-        target_index = pd.date_range(
-            start='2013-01-01 00:00:00',
-            end='2023-01-01 23:00:00',
-            freq='h',
-            tz='UTC'
-        )
-        num_hours_needed = len(target_index)
-        hourly_cycle = daily_values['Inflow [GWh]'].values
-        repeats = -(-num_hours_needed // len(hourly_cycle))  # Ceiling division
-        full_inflow = pd.Series(hourly_cycle.tolist() * repeats, index=target_index)[:num_hours_needed]
-
-        #Create final DataFrame with correct hourly index
-        df_expanded = pd.DataFrame({'Inflow [MWh]': full_inflow*1000}) # Convert GWh to MWh
-        df_expanded.index.name = 'datetime'
-
-        self.cf_hydro_PRT = df_expanded.loc[self.dates, 'Inflow [MWh]'] # Select only the dates we need
-    
+        """Read daily hydro inflows and repeat them as an hourly cycle starting in 2013"""
+        self.cf_hydro_PRT = self.read_inflow_cycle('data/Hydro_Inflow_PT.csv', anchor='2013-01-01', year=2015)
+
+    def read_inflow_cycle(self, filename: str, anchor: str, year: int):
+        """ Hourly inflow (MWh) of one year from a daily inflow file repeated from `anchor` """
+        df_hydro = pd.read_csv(self.path + filename, sep=',')
+
+        # Convert daily inflow (GWh) to hourly inflow (MWh), divide by 24 and repeat
+        hourly_cycle = np.repeat(df_hydro['Inflow [GWh]'].values / 24, 24) * 1000
+
+        offsets = cyclic_offsets(anchor, len(hourly_cycle), year)
+        return pd.Series(hourly_cycle[offsets], index=year_hours(year), name='Inflow [MWh]')
 
     # def read_offshore_wind(self):
     #     """ Read offshore wind data from CSV file """
@@ -179,12 +123,7 @@ class DataLoader:
 
     def read_solar(self):
         """ Read solar data from CSV file """
-
-        df_solar = pd.read_csv(self.path + 'data/pv_optimal.csv', sep=';', index_col=0)
-        df_solar.index = pd.to_datetime(df_solar.index)
-
-        df_solar = df_solar[[self.country]+self.neighbors].loc[self.weather_dates]
-        self.cf_solar = df_solar[~((df_solar.index.month == 2) & (df_solar.index.day == 29))]
+        self.cf_solar = read_hourly_year(self.path + 'data/pv_optimal.csv', [self.country]+self.neighbors, self.weather_year)
 
     def read_hydro_capacities(self):
         """ Read hydro data from CSV file """
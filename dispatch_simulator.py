@@ -0,0 +1,286 @@
+import time
+import numpy as np
+import pandas as pd
+import pypsa
+from data_loader import DataLoader
+
+# Storage technologies in dispatch priority: short-term stores are used before seasonal ones
+STORAGES = {
+    'battery'      : {'store': 'Battery',     'charge': 'AC-DC Converter', 'discharge': 'DC-AC Inverter'},
+    'pumped hydro' : {'store': 'PumpedHydro', 'charge': 'PumpedHydroPump', 'discharge': 'PumpedHydroTurbine'},
+    'H2'           : {'store': 'H2 Storage',  'charge': 'H2 Electrolysis', 'discharge': 'H2 Fuel Cell'},
+}
+# Storages discharged before the dammed hydro, the remaining ones are used after it
+SHORT_TERM = ['battery', 'pumped hydro']
+
+GAS_CO2_INTENSITY = 0.198 # t_CO2/MWh_th, as the "gas" carrier in a.create_network
+
+
+def fleet_from_data(data: DataLoader, capacities: dict | None = None):
+    """
+    Fleet parameters for the components of a.create_network and d.add_storage.
+
+    Extendable capacities default to zero and are set through `capacities`, using the
+    keys of the returned dict (e.g. 'onshore wind', 'battery energy', 'H2 discharge').
+    """
+    hydro = data.hydro_capacities.iloc[0]
+    fleet = {
+        'onshore wind'    : 0.,
+        'solar'           : 0.,
+        'OCGT'            : 0.,
+        'OCGT efficiency' : data.costs.at["OCGT", "efficiency"],
+        'HDAM'            : hydro['dammed_hydro_power'],
+        'HDAM efficiency' : data.costs.at["hydro", "efficiency"],
+        'DamReservoir'    : hydro['dammed_hydro_storage'],
+    }
+    efficiencies = {
+        'battery'      : (data.costs.at["battery inverter", "efficiency"], data.costs.at["battery inverter", "efficiency"]),
+        'pumped hydro' : (data.costs.at["PHS", "efficiency"], data.costs.at["PHS", "efficiency"]),
+        'H2'           : (data.costs.at["electrolysis", "efficiency"], data.costs.at["fuel cell", "efficiency"]),
+    }
+    for storage, (eta_charge, eta_discharge) in efficiencies.items():
+        fleet[f'{storage} charge'] = 0.
+        fleet[f'{storage} discharge'] = 0.
+        fleet[f'{storage} energy'] = 0.
+        fleet[f'{storage} charge efficiency'] = eta_charge
+        fleet[f'{storage} discharge efficiency'] = eta_discharge
+    fleet['pumped hydro charge'] = hydro['pumped_hydro_power']
+    fleet['pumped hydro discharge'] = hydro['pumped_hydro_power']
+    fleet['pumped hydro energy'] = hydro['pumped_hydro_storage']
+
+    fleet.update(capacities or {})
+    return fleet
+
+
+def fleet_from_network(network: pypsa.Network):
+    """ Fleet parameters from the optimal capacities of a solved network """
+    generators, links, stores = network.generators, network.links, network.stores
+    fleet = {
+        'onshore wind'    : generators.at['onshore wind', 'p_nom_opt'],
+        'solar'           : generators.at['solar', 'p_nom_opt'],
+        'OCGT'            : generators.at['OCGT', 'p_nom_opt'],
+        'OCGT efficiency' : generators.at['OCGT', 'efficiency'],
+        'HDAM'            : links.at['HDAM', 'p_nom_opt'],
+        'HDAM efficiency' : links.at['HDAM', 'efficiency'],
+        'DamReservoir'    : stores.at['DamReservoir', 'e_nom_opt'],
+    }
+    for storage, names in STORAGES.items():
+        present = names['store'] in stores.index
+        fleet[f'{storage} charge'] = links.at[names['charge'], 'p_nom_opt'] if present else 0.
+        fleet[f'{storage} discharge'] = links.at[names['discharge'], 'p_nom_opt'] if present else 0.
+        fleet[f'{storage} energy'] = stores.at[names['store'], 'e_nom_opt'] if present else 0.
+        fleet[f'{storage} charge efficiency'] = links.at[names['charge'], 'efficiency'] if present else 1.
+        fleet[f'{storage} discharge efficiency'] = links.at[names['discharge'], 'efficiency'] if present else 1.
+    return fleet
+
+
+def profiles_from_data(datas: list):
+    """ Stack the hourly profiles of several DataLoaders (e.g. weather years) into years x hours arrays """
+    return {
+        'demand'       : np.vstack([data.p_d[data.country].values for data in datas]),
+        'onshore wind' : np.vstack([data.cf_onw[data.country].values for data in datas]),
+        'solar'        : np.vstack([data.cf_solar[data.country].values for data in datas]),
+        'inflow'       : np.vstack([data.cf_hydro.values for data in datas]),
+    }
+
+
+def profiles_from_network(network: pypsa.Network):
+    """ Hourly profiles (1 x hours) used by the LP of a network built with a.create_network """
+    return {
+        'demand'       : network.loads_t.p_set['load'].values[None, :],
+        'onshore wind' : network.generators_t.p_max_pu['onshore wind'].values[None, :],
+        'solar'        : network.generators_t.p_max_pu['solar'].values[None, :],
+        'inflow'       : (network.generators.at['Rain to DamWater', 'p_nom']
+                          * network.generators_t.p_max_pu['Rain to DamWater'].values[None, :]),
+    }
+
+
+def simulate_dispatch(fleet: dict, profiles: dict, initial_soc: float = 0.5, cycles: int = 3, hourly: bool = False):
+    """
+    Merit-order dispatch with greedy storage operation, vectorised over scenarios.
+
+    Every fleet value is a scalar or an array of shape (scenarios,), every profile an
+    array of shape (scenarios, hours) or (hours,). Variable renewables serve the load
+    first, surpluses charge the storages in the order of STORAGES and are otherwise
+    curtailed. Deficits are covered by the short-term storages, the dammed hydro
+    reservoir, the remaining storages, OCGT and finally remain unserved. As in the LP,
+    the link capacities limit the power drawn from a store, so a storage delivers at
+    most its discharge capacity times its discharge efficiency.
+
+    The stores of the LP are cyclic. The year is therefore simulated up to `cycles` times,
+    every pass starting from the storage levels the previous one ended with. Energy still
+    drawn down after the last pass (final below initial level) was never paid for and is
+    counted as unserved energy, reported separately as 'storage drawdown'.
+
+    Returns:
+        dict: Annual energy per technology (MWh), CO2 emissions (t) and unserved energy
+              (MWh) per scenario, plus the hourly series of the last pass if `hourly` is True.
+    """
+    demand, cf_onw, cf_solar, inflow = np.broadcast_arrays(
+        *[np.atleast_2d(profiles[key]) for key in ['demand', 'onshore wind', 'solar', 'inflow']]
+    )
+    n_scenarios = max(demand.shape[0], *[np.size(value) for value in fleet.values()])
+    n_hours = demand.shape[1]
+    shape = (n_scenarios, n_hours)
+    par = {key: np.broadcast_to(np.asarray(value, dtype=float), (n_scenarios,)) for key, value in fleet.items()}
+    demand, cf_onw, cf_solar, inflow = [np.broadcast_to(x, shape) for x in (demand, cf_onw, cf_solar, inflow)]
+
+    # Variable renewables do not depend on the storage state and are computed in one go
+    vre = par['onshore wind'][:, None] * cf_onw + par['solar'][:, None] * cf_solar
+    residual = demand - vre
+
+    def simulate_year(soc, dam):
+        soc = {storage: level.copy() for storage, level in soc.items()}
+        series = {key: np.zeros(shape) for key in ['HDAM', 'OCGT', 'curtailment', 'spillage', 'unserved']}
+        for storage in STORAGES:
+            series[f'{storage} charge'] = np.zeros(shape)
+            series[f'{storage} discharge'] = np.zeros(shape)
+
+        def discharge(storage, t, deficit):
+            eta = par[f'{storage} discharge efficiency']
+            p = np.minimum(deficit, np.minimum(par[f'{storage} discharge'] * eta, soc[storage] * eta))
+            soc[storage] -= p / eta
+            series[f'{storage} discharge'][:, t] = p
+            return deficit - p
+
+        for t in range(n_hours):
+            # Rain fills the reservoir, water above its capacity is spilled
+            dam = dam + inflow[:, t]
+            series['spillage'][:, t] = np.maximum(dam - par['DamReservoir'], 0)
+            dam = np.minimum(dam, par['DamReservoir'])
+
+            surplus = np.maximum(-residual[:, t], 0)
+            deficit = np.maximum(residual[:, t], 0)
+
+            for storage in STORAGES:
+                eta = par[f'{storage} charge efficiency']
+                p = np.minimum(surplus, np.minimum(par[f'{storage} charge'], (par[f'{storage} energy'] - soc[storage]) / eta))
+                soc[storage] += p * eta
+                surplus -= p
+                series[f'{storage} charge'][:, t] = p
+            series['curtailment'][:, t] = surplus
+
+            for storage in SHORT_TERM:
+                deficit = discharge(storage, t, deficit)
+
+            eta = par['HDAM efficiency']
+            p = np.minimum(deficit, np.minimum(par['HDAM'] * eta, dam * eta))
+            dam -= p / eta
+            deficit -= p
+            series['HDAM'][:, t] = p
+
+            for storage in STORAGES:
+                if storage not in SHORT_TERM:
+                    deficit = discharge(storage, t, deficit)
+
+            p = np.minimum(deficit, par['OCGT'])
+            series['OCGT'][:, t] = p
+            series['unserved'][:, t] = deficit - p
+        return series, soc, dam
+
+    soc = {storage: initial_soc * par[f'{storage} energy'] for storage in STORAGES}
+    dam = initial_soc * par['DamReservoir']
+    for _ in range(max(cycles, 1)):
+        series, final_soc, final_dam = simulate_year(soc, dam)
+        # Drawdown in delivered energy: stored energy times the discharge efficiency
+        drawdown = np.maximum(dam - final_dam, 0) * par['HDAM efficiency'] + sum(
+            np.maximum(soc[storage] - final_soc[storage], 0) * par[f'{storage} discharge efficiency'] for storage in STORAGES
+        )
+        if np.all(drawdown <= 1e-6 * np.maximum(demand.sum(axis=1), 1)):
+            break
+        soc, dam = final_soc, final_dam
+
+    results = {
+        'onshore wind' : (par['onshore wind'][:, None] * cf_onw).sum(axis=1),
+        'solar'        : (par['solar'][:, None] * cf_solar).sum(axis=1),
+    }
+    results.update({key: value.sum(axis=1) for key, value in series.items()})
+    results['onshore wind'] -= results['curtailment'] * _share(par['onshore wind'][:, None] * cf_onw, vre, series['curtailment'])
+    results['solar'] -= results['curtailment'] * _share(par['solar'][:, None] * cf_solar, vre, series['curtailment'])
+    results['CO2'] = results['OCGT'] / par['OCGT efficiency'] * GAS_CO2_INTENSITY
+    results['storage drawdown'] = drawdown
+    results['unserved'] = results['unserved'] + drawdown
+    if hourly:
+        results['series'] = series
+    return results
+
+
+def _share(part: np.ndarray, total: np.ndarray, weights: np.ndarray):
+    """ Curtailment-weighted share of `part` in `total` per scenario """
+    share = np.divide(part, total, out=np.zeros_like(part), where=total > 0)
+    curtailed = weights.sum(axis=1)
+    return np.divide((share * weights).sum(axis=1), curtailed, out=np.zeros_like(curtailed), where=curtailed > 0)
+
+
+def screen(fleets: pd.DataFrame, profiles: dict, labels: list | None = None, **kwargs):
+    """
+    Simulate every combination of fleet (rows of `fleets`) and profile year.
+
+    Returns:
+        pd.DataFrame: Annual results indexed by (fleet, year).
+    """
+    n_fleets = len(fleets)
+    n_years = np.atleast_2d(profiles['demand']).shape[0]
+    labels = labels if labels is not None else list(range(n_years))
+
+    fleet = {key: np.repeat(fleets[key].values, n_years) for key in fleets.columns}
+    tiled = {key: np.tile(np.atleast_2d(value), (n_fleets, 1)) for key, value in profiles.items()}
+    results = simulate_dispatch(fleet, tiled, **kwargs)
+    results.pop('series', None)
+
+    index = pd.MultiIndex.from_product([fleets.index, labels], names=['fleet', 'year'])
+    return pd.DataFrame(results, index=index)
+
+
+def validate_against_lp(network: pypsa.Network, **kwargs):
+    """ Compare the heuristic dispatch with the LP dispatch of a solved network """
+    results = simulate_dispatch(fleet_from_network(network), profiles_from_network(network), **kwargs)
+
+    lp = {
+        'onshore wind' : network.generators_t.p['onshore wind'].sum(),
+        'solar'        : network.generators_t.p['solar'].sum(),
+        'OCGT'         : network.generators_t.p['OCGT'].sum(),
+        'HDAM'         : -network.links_t.p1['HDAM'].sum(),
+    }
+    for storage, names in STORAGES.items():
+        if names['discharge'] in network.links.index:
+            lp[f'{storage} discharge'] = -network.links_t.p1[names['discharge']].sum()
+    lp['CO2'] = lp['OCGT'] / network.generators.at['OCGT', 'efficiency'] * GAS_CO2_INTENSITY
+    # Networks without load shedding serve all demand in the LP
+    lp['unserved'] = network.generators_t.p.loc[:, network.generators.carrier == "load shedding"].sum().sum()
+
+    validation = pd.DataFrame({
+        'LP'        : pd.Series(lp),
+        'heuristic' : pd.Series({key: results[key][0] for key in lp}),
+    })
+    validation['relative error'] = (validation['heuristic'] - validation['LP']) / validation['LP'].abs().replace(0, np.nan)
+    return validation
+
+
+if __name__ == "__main__":
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+
+    # Validate the heuristic against the LP dispatch
+    network = create_network(data)
+    network = add_storage(network, data)
+    network = add_co2_constraint(network, 2e6)
+    network.optimize()
+    print(validate_against_lp(network).round(3))
+
+    # Screening throughput for random fleets around the LP optimum
+    base = pd.Series(fleet_from_network(network))
+    rng = np.random.default_rng(0)
+    n_fleets = 2000
+    fleets = pd.DataFrame([base.values] * n_fleets, columns=base.index)
+    for key in ['onshore wind', 'solar', 'OCGT', 'battery energy', 'H2 energy']:
+        fleets[key] *= rng.uniform(0.5, 1.5, n_fleets)
+
+    start = time.perf_counter()
+    results = screen(fleets, profiles_from_data([data]), labels=[2015])
+    elapsed = time.perf_counter() - start
+    print(f"{n_fleets} fleets in {elapsed:.2f} s ({n_fleets / elapsed:.0f} combinations/s)")
+    print(results[['OCGT', 'CO2', 'unserved', 'curtailment']].describe())
@@ -0,0 +1,119 @@
+import json
+import pathlib
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import xarray as xr
+import pypsa
+from numcodecs import Blosc
+
+# Time series kept per scenario: variable name -> (list name, attribute, component dimension)
+SERIES = {
+    'Generator-p' : ('generators_t', 'p', 'Generator'),
+    'Link-p0'     : ('links_t', 'p0', 'Link'),
+    'Link-p1'     : ('links_t', 'p1', 'Link'),
+    'Store-e'     : ('stores_t', 'e', 'Store'),
+    'Line-p0'     : ('lines_t', 'p0', 'Line'),
+    'Load-p'      : ('loads_t', 'p', 'Load'),
+}
+# Static topology needed by the results_plotter functions
+STATIC = {'links': ['bus0', 'bus1'], 'lines': ['bus0', 'bus1']}
+
+CHUNK_HOURS = 730 # about one month per chunk
+COMPRESSOR = Blosc(cname="zstd", clevel=5, shuffle=Blosc.BITSHUFFLE)
+
+
+def _to_dataset(network: pypsa.Network, scenario: str, dtype: str):
+    """ Dispatch time series of one solved network as a dataset with a scenario dimension of length 1 """
+    data_vars = {}
+    for var, (list_name, attr, dim) in SERIES.items():
+        df = getattr(network, list_name)[attr]
+        names = getattr(network, list_name[:-2]).index
+        df = df.reindex(columns=names, fill_value=0.)
+        if df.shape[1] == 0:
+            continue
+        data_vars[var] = xr.DataArray(
+            df.values.astype(dtype)[None, :, :],
+            coords={'scenario': np.array([scenario], dtype=object), 'snapshot': df.index.values, dim: df.columns.values.astype(object)},
+            dims=('scenario', 'snapshot', dim),
+        )
+    ds = xr.Dataset(data_vars)
+    ds.attrs['static'] = json.dumps({
+        list_name: getattr(network, list_name)[attrs].to_dict() for list_name, attrs in STATIC.items()
+    })
+    return ds
+
+
+def scenarios_in_store(path: str | pathlib.Path):
+    """ Scenario labels already written to a store """
+    path = pathlib.Path(path)
+    if not path.exists():
+        return []
+    return list(xr.open_zarr(path, chunks=None).scenario.values)
+
+
+def append_dispatch(path: str | pathlib.Path, network: pypsa.Network, scenario: str, dtype: str = "float32"):
+    """
+    Append the dispatch of a solved network to a chunked, compressed Zarr store.
+
+    The components of the first scenario fix the component coordinates of the store,
+    later scenarios are aligned to them (missing components are stored as NaN).
+    Scenarios already in the store are skipped, so re-running a sweep is safe.
+    """
+    path = pathlib.Path(path)
+    scenario = str(scenario)
+    ds = _to_dataset(network, scenario, dtype)
+
+    if not path.exists():
+        encoding = {
+            var: {'chunks': (1, CHUNK_HOURS, ds[var].shape[2]), 'compressor': COMPRESSOR}
+            for var in ds.data_vars
+        }
+        ds.to_zarr(path, mode='w', encoding=encoding)
+        return
+
+    existing = xr.open_zarr(path, chunks=None)
+    if scenario in existing.scenario.values:
+        return
+    dropped = [
+        f"{var}: {sorted(set(ds[var][dim].values) - set(existing[var][dim].values))}"
+        for var, (_, _, dim) in SERIES.items()
+        if var in ds and var in existing and not set(ds[var][dim].values) <= set(existing[var][dim].values)
+    ]
+    if dropped:
+        raise ValueError(f"Scenario {scenario} has components that are not in the store: {dropped}")
+    ds = ds[[var for var in existing.data_vars if var in ds]]
+    ds = ds.reindex({dim: existing[dim].values for _, _, dim in SERIES.values() if dim in existing.dims})
+    ds.attrs = existing.attrs
+    ds.to_zarr(path, append_dim='scenario')
+
+
+def open_dispatch(path: str | pathlib.Path):
+    """ Open a store lazily, values are only read from disk for the selected slices """
+    return xr.open_zarr(path, chunks=None)
+
+
+def sweep_series(path: str | pathlib.Path, variable: str, name: str):
+    """ Snapshot x scenario table of one component across the whole sweep, e.g. ('Generator-p', 'OCGT') """
+    ds = open_dispatch(path)
+    dim = SERIES[variable][2]
+    return ds[variable].sel({dim: name}).to_pandas().T
+
+
+def load_scenario(path: str | pathlib.Path, scenario: str):
+    """
+    Network-like view of one stored scenario for the results_plotter functions.
+
+    Only the time series of the selected scenario are read from the store.
+    """
+    ds = open_dispatch(path).sel(scenario=str(scenario))
+    snapshots = pd.DatetimeIndex(ds.snapshot.values)
+    view = SimpleNamespace(snapshots=snapshots)
+    for var, (list_name, attr, dim) in SERIES.items():
+        if list_name not in vars(view):
+            setattr(view, list_name, SimpleNamespace())
+        df = ds[var].to_pandas() if var in ds else pd.DataFrame(index=snapshots)
+        setattr(getattr(view, list_name), attr, df.astype(float))
+    for list_name, static in json.loads(ds.attrs['static']).items():
+        setattr(view, list_name, pd.DataFrame(static))
+    return view
@@ -4,6 +4,7 @@ from data_loader import DataLoader
 from a import create_network, annuity
 from b import add_co2_constraint, create_co2_limits
 from d import add_storage
+from kpis import compute_kpis
 import results_plotter as plot
 
 if __name__ == "__main__":
@@ -25,7 +26,8 @@ if __name__ == "__main__":
         network.optimize()
 
         # Retrieve CO2 price
-        co2_price = - network.global_constraints.mu.iloc[0]
+        kpis = compute_kpis(network, scenario=co2_limit)
+        co2_price = kpis.loc[kpis.metric == "co2 price", "value"].iloc[0]
         print(f"CO2 limit: {co2_limit} tonCO2")
         print(f"CO2 price: {np.round(co2_price / 1000, 2)} t€/tonCO2")
         co2_prices.append(np.round(co2_price, 2))
@@ -4,8 +4,6 @@ from data_loader import DataLoader
 from a import create_network, annuity
 from b import add_co2_constraint, create_co2_limits
 from d import add_storage
-import results_plotter as plot
-import matplotlib.pyplot as plt
 
 def add_neighbors(network: pypsa.Network, data: DataLoader):
     length = {"FRA": 400, "PRT": 90} # km source: https://www.ren.pt/en-gb/activity/main-projects/portugal-spain-interconnection
@@ -155,6 +153,8 @@ def add_neighbors(network: pypsa.Network, data: DataLoader):
 
 def compare_capacity_mixes(data: DataLoader, co2_limit: float, filename: str | None = None):
     """ Compare capacity mixes with and without the CO2 constraint and storage """
+    import results_plotter as plot
+
     n_base = create_network(data)
     n_base.optimize()
 
@@ -183,6 +183,9 @@ def compare_capacity_mixes(data: DataLoader, co2_limit: float, filename: str | N
     
 
 if __name__ == '__main__':
+    import results_plotter as plot
+    import matplotlib.pyplot as plt
+
     data = DataLoader(country="ESP", discount_rate=0.07)
     
     co2_limit = 0 # 50 MT CO2 limi
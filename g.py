@@ -1,9 +1,7 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import pypsa
 from data_loader import DataLoader
-import results_plotter as plot
 from a import create_network
 from b import add_co2_constraint
 from d import add_storage
@@ -142,6 +140,9 @@ def create_non_coupled_el_and_heat_network(data:DataLoader, heat_demand_profile:
     return n
 
 if __name__ == "__main__":
+    import results_plotter as plot
+    import matplotlib.pyplot as plt
+
     data = DataLoader(country="ESP", discount_rate=0.07)
 
     # Load the heating demand data
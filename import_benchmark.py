@@ -0,0 +1,51 @@
+import re
+import subprocess
+import sys
+import pathlib
+import pandas as pd
+
+# Modules that solver processes import to build networks
+MODEL_MODULES = ['data_loader', 'a', 'b', 'd', 'f', 'g', 'dispatch_simulator', 'model_cache', 'model_reduction', 'sweep_runner']
+PLOTTING_MODULES = ['matplotlib', 'seaborn', 'brokenaxes', 'results_plotter']
+
+
+def import_time(module: str):
+    """
+    Import a module in a fresh interpreter with `python -X importtime`.
+
+    Returns:
+        float: Cumulative import time of the module in milliseconds.
+        list: Plotting modules that were pulled in by the import.
+    """
+    check = f"import sys, {module}; print(','.join(m for m in {PLOTTING_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True, text=True, cwd=pathlib.Path(__file__).parent.resolve(),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    # Lines look like "import time:       self |  cumulative | module"
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)$", line)
+        if match and match.group(3) == module:
+            cumulative = int(match.group(2))
+    plotting = [m for m in result.stdout.strip().split(',') if m]
+    return cumulative / 1e3, plotting
+
+
+def benchmark(modules: list = MODEL_MODULES):
+    """ Import time and plotting modules loaded for each model-building module """
+    rows = {}
+    for module in modules:
+        ms, plotting = import_time(module)
+        rows[module] = {'import time (ms)': ms, 'plotting modules': ", ".join(plotting) or "-"}
+    return pd.DataFrame(rows).T
+
+
+if __name__ == "__main__":
+    report = benchmark()
+    print(report.to_string())
+    if (report['plotting modules'] != "-").any():
+        sys.exit("Model-building modules import the plotting stack")
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+import pypsa
+
+COLUMNS = ['scenario', 'component', 'name', 'carrier', 'bus', 'metric', 'value']
+
+
+def _tidy(df: pd.DataFrame, component: str, scenario):
+    """ Melt a component x metric table into the tidy KPI layout """
+    df = df.rename_axis('name').reset_index()
+    df = df.melt(id_vars=['name', 'carrier', 'bus'], var_name='metric', value_name='value')
+    df.insert(0, 'component', component)
+    df.insert(0, 'scenario', scenario)
+    return df[COLUMNS]
+
+
+def generator_kpis(network: pypsa.Network):
+    """ Capacity, energy, curtailment, capacity factor, emissions and costs of the generators """
+    gens = network.generators
+    weights = network.snapshot_weightings.generators
+    hours = weights.sum()
+    p = network.generators_t.p.reindex(columns=gens.index, fill_value=0)
+    p_max_pu = network.get_switchable_as_dense('Generator', 'p_max_pu')
+    marginal_cost = network.get_switchable_as_dense('Generator', 'marginal_cost')
+    capacity = gens.p_nom_opt
+
+    energy = p.mul(weights, axis=0).sum()
+    available = p_max_pu.mul(capacity, axis=1).mul(weights, axis=0).sum()
+    # Curtailment only applies to weather-dependent availability (VRE, inflow); the unused
+    # headroom of dispatchable generators is not curtailment
+    variable = gens.index.isin(network.generators_t.p_max_pu.columns) & (p_max_pu.min() < 1)
+    co2 = gens.carrier.map(network.carriers.co2_emissions).fillna(0)
+
+    df = pd.DataFrame({
+        'carrier'         : gens.carrier,
+        'bus'             : gens.bus,
+        'capacity'        : capacity,
+        'energy'          : energy,
+        'curtailment'     : (available - energy).clip(lower=0).where(variable),
+        'capacity factor' : energy / (capacity * hours).replace(0, np.nan),
+        'emissions'       : energy / gens.efficiency * co2,
+        'capex'           : gens.capital_cost * capacity,
+        'opex'            : (p * marginal_cost).mul(weights, axis=0).sum(),
+    })
+    return df
+
+
+def link_kpis(network: pypsa.Network):
+    """ Capacity, delivered energy, capacity factor and costs of the links """
+    links = network.links
+    weights = network.snapshot_weightings.generators
+    hours = weights.sum()
+    p0 = network.links_t.p0.reindex(columns=links.index, fill_value=0)
+    p1 = network.links_t.p1.reindex(columns=links.index, fill_value=0)
+    marginal_cost = network.get_switchable_as_dense('Link', 'marginal_cost')
+    capacity = links.p_nom_opt
+
+    withdrawn = p0.mul(weights, axis=0).sum()
+    df = pd.DataFrame({
+        'carrier'         : links.carrier,
+        'bus'             : links.bus1,
+        'capacity'        : capacity,
+        'energy'          : -p1.mul(weights, axis=0).sum(),
+        'withdrawal'      : withdrawn,
+        'capacity factor' : withdrawn / (capacity * hours).replace(0, np.nan),
+        'capex'           : links.capital_cost * capacity,
+        'opex'            : (p0 * marginal_cost).mul(weights, axis=0).sum(),
+    })
+    return df
+
+
+def store_kpis(network: pypsa.Network):
+    """ Energy capacity, throughput, full cycles and costs of the stores """
+    stores = network.stores
+    weights = network.snapshot_weightings.stores
+    p = network.stores_t.p.reindex(columns=stores.index, fill_value=0)
+    e = network.stores_t.e.reindex(columns=stores.index, fill_value=0)
+    capacity = stores.e_nom_opt
+
+    discharged = p.clip(lower=0).mul(weights, axis=0).sum()
+    df = pd.DataFrame({
+        'carrier'     : stores.carrier,
+        'bus'         : stores.bus,
+        'capacity'    : capacity,
+        'energy'      : discharged,
+        'mean level'  : e.mean() / capacity.replace(0, np.nan),
+        'cycles'      : discharged / capacity.replace(0, np.nan),
+        'capex'       : stores.capital_cost * capacity,
+        'opex'        : (p.clip(lower=0) * stores.marginal_cost).mul(weights, axis=0).sum(),
+    })
+    return df
+
+
+def line_kpis(network: pypsa.Network):
+    """ Capacity, transported energy, utilisation and costs of the lines """
+    lines = network.lines
+    weights = network.snapshot_weightings.generators
+    p0 = network.lines_t.p0.reindex(columns=lines.index, fill_value=0)
+    capacity = lines.s_nom_opt
+
+    df = pd.DataFrame({
+        'carrier'         : lines.carrier,
+        'bus'             : lines.bus1,
+        'capacity'        : capacity,
+        'energy'          : p0.abs().mul(weights, axis=0).sum(),
+        'capacity factor' : p0.abs().mean() / capacity.replace(0, np.nan),
+        'capex'           : lines.capital_cost * capacity,
+    })
+    return df
+
+
+def bus_kpis(network: pypsa.Network):
+    """ Mean, load-weighted and peak marginal prices and load of the buses """
+    buses = network.buses
+    weights = network.snapshot_weightings.generators
+    prices = network.buses_t.marginal_price.reindex(columns=buses.index)
+    loads = network.loads_t.p.T.groupby(network.loads.bus).sum().T.reindex(columns=buses.index, fill_value=0)
+    load = loads.mul(weights, axis=0).sum()
+
+    df = pd.DataFrame({
+        'carrier'             : buses.carrier,
+        'bus'                 : buses.index,
+        'load'                : load,
+        'mean price'          : prices.mul(weights, axis=0).sum() / weights.sum(),
+        'load-weighted price' : (prices * loads).mul(weights, axis=0).sum() / load.replace(0, np.nan),
+        'max price'           : prices.max(),
+    })
+    return df
+
+
+def system_kpis(network: pypsa.Network, tables: dict):
+    """ System totals: cost, load, emissions, CO2 price and LCOE """
+    capex = sum(df['capex'].sum() for df in tables.values() if 'capex' in df)
+    opex = sum(df['opex'].sum() for df in tables.values() if 'opex' in df)
+    load = tables['Bus'].loc[tables['Bus'].carrier == 'AC', 'load'].sum()
+    co2 = network.global_constraints.query("type == 'primary_energy'").mu
+
+    values = {
+        'objective'  : network.objective,
+        'capex'      : capex,
+        'opex'       : opex,
+        'load'       : load,
+        'emissions'  : tables['Generator']['emissions'].sum(),
+        'co2 price'  : -co2.iloc[0] if len(co2) > 0 else np.nan,
+        'LCOE'       : (capex + opex) / load if load > 0 else np.nan,
+    }
+    return pd.DataFrame({'carrier': None, 'bus': None, **{k: [v] for k, v in values.items()}}, index=['system'])
+
+
+def compute_kpis(network: pypsa.Network, scenario=None):
+    """
+    KPIs of a solved network in a tidy table.
+
+    Parameters:
+        network (pypsa.Network): The solved network.
+        scenario: Label stored in the 'scenario' column.
+
+    Returns:
+        pd.DataFrame: One row per (component, name, metric), with the columns of COLUMNS.
+    """
+    tables = {
+        'Generator' : generator_kpis(network),
+        'Link'      : link_kpis(network),
+        'Store'     : store_kpis(network),
+        'Line'      : line_kpis(network),
+        'Bus'       : bus_kpis(network),
+    }
+    tables['System'] = system_kpis(network, tables)
+    return pd.concat([_tidy(df, component, scenario) for component, df in tables.items() if not df.empty],
+                     ignore_index=True)
+
+
+def stack_kpis(networks: dict):
+    """ KPIs of several solved networks, keyed by scenario """
+    return pd.concat([compute_kpis(network, scenario) for scenario, network in networks.items()], ignore_index=True)
+
+
+def kpi_table(kpis: pd.DataFrame, metric: str, component: str | None = None):
+    """ Scenario x name table of one metric, e.g. kpi_table(kpis, 'capacity', 'Generator') """
+    kpis = kpis[kpis.metric == metric]
+    if component is not None:
+        kpis = kpis[kpis.component == component]
+    return kpis.pivot_table(index='scenario', columns='name', values='value', sort=False)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pypsa
+from model_cache import set_objective
+from references import NOMINAL_ATTRS
+
+OPERATIONAL_ATTRS = {'Generator': 'p', 'Link': 'p', 'Store': 'e', 'Line': 's'}
+
+
+def optimize_lean(
+        network: pypsa.Network,
+        capacities: dict | None = None,
+        global_constraint_duals: bool = True,
+        dispatch: dict | None = None,
+        solver_name: str = "highs",
+        solver_options: dict | None = None,
+        **kwargs,
+    ):
+    """
+    Optimise and pull only the requested quantities from the solved model.
+
+    Unlike network.optimize(), the primal and dual time series are not written back to
+    the network. Only the objective, the requested optimal capacities (as *_nom_opt),
+    the global constraint duals (as mu) and the requested dispatch series are set.
+
+    Parameters:
+        network (pypsa.Network): The network to optimise.
+        capacities (dict): Component -> names whose optimal capacity is needed,
+                           e.g. {'Generator': ['onshore wind', 'solar', 'OCGT'], 'Link': ['HDAM']}.
+        global_constraint_duals (bool): Whether to set the duals of the global constraints.
+        dispatch (dict): Component -> names whose time series are needed (p for generators
+                         and links, e for stores, s for lines).
+        solver_name (str): Solver passed to linopy.
+        solver_options (dict): Options passed to the solver.
+
+    Returns:
+        tuple: Solver status and termination condition, as network.optimize().
+    """
+    model = network.optimize.create_model(**kwargs)
+    status, condition = model.solve(solver_name=solver_name, **(solver_options or {}))
+    if status != "ok":
+        return status, condition
+
+    set_objective(network, model.objective.value)
+
+    for component, names in (capacities or {}).items():
+        attr = NOMINAL_ATTRS[component]
+        df = network.df(component)
+        var = f"{component}-{attr}"
+        optimal = df.loc[names, attr].astype(float).copy()
+        if var in model.variables:
+            solution = model.variables[var].solution.to_pandas()
+            ext_i = solution.index.intersection(names)
+            optimal[ext_i] = solution[ext_i]
+        df.loc[names, f"{attr}_opt"] = optimal
+
+    if global_constraint_duals and len(network.global_constraints) > 0:
+        network.global_constraints['mu'] = [
+            float(model.constraints[f"GlobalConstraint-{name}"].dual) for name in network.global_constraints.index
+        ]
+
+    for component, names in (dispatch or {}).items():
+        attr = OPERATIONAL_ATTRS[component]
+        series = model.variables[f"{component}-{attr}"].solution.to_pandas()
+        network.pnl(component)[attr] = series[names].reindex(network.snapshots)
+
+    # The solver-side copy of the model is not needed any more
+    model.solver_model = None
+    return status, condition
+
+
+def lean_solve(capacities: dict | None = None, global_constraint_duals: bool = True, dispatch: dict | None = None):
+    """ Solve function for sweep_runner.run_sweep that only extracts the given quantities """
+    def solve(network: pypsa.Network, **profile):
+        return optimize_lean(network, capacities, global_constraint_duals, dispatch, **profile)
+    return solve
+
+
+def extract_lean_results(network: pypsa.Network, capacities: dict | None = None):
+    """ Results of a lean solve in the layout of sweep_runner.extract_results """
+    return {
+        'objective'  : network.objective,
+        'capacities' : {
+            component: network.df(component).loc[names, f"{NOMINAL_ATTRS[component]}_opt"].to_dict()
+            for component, names in (capacities or {}).items()
+        },
+        'duals'      : network.global_constraints.mu.to_dict() if 'mu' in network.global_constraints else {},
+    }
+
+
+if __name__ == "__main__":
+    import time
+    from data_loader import DataLoader
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+    from references import REFERENCES
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+    capacities = {'Generator': REFERENCES['GENERATORS'], 'Link': REFERENCES['LINKS']}
+
+    for mode in ['full', 'lean']:
+        network = create_network(data)
+        network = add_storage(network, data)
+        network = add_co2_constraint(network, 2e6)
+        start = time.perf_counter()
+        if mode == 'full':
+            network.optimize()
+        else:
+            optimize_lean(network, capacities)
+        elapsed = time.perf_counter() - start
+        print(f"{mode}: {elapsed:.1f} s, objective {network.objective/1e6:.1f} M€, "
+              f"co2 price {-network.global_constraints.mu.iloc[0]:.1f} €/t")
+        print(network.generators.p_nom_opt[REFERENCES['GENERATORS']].div(1e3).round(2).to_dict())
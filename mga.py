@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pypsa
+from concurrent.futures import ProcessPoolExecutor
+from scipy.spatial import ConvexHull
+from data_loader import DataLoader
+from a import create_network
+from b import add_co2_constraint
+from d import add_storage
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning, module="pypsa")
+
+# Technologies spanning the near-optimal space: (component, capacity attribute, component names)
+TECHNOLOGIES = {
+    'onshore wind'     : ('Generator', 'p_nom', ['onshore wind']),
+    'solar'            : ('Generator', 'p_nom', ['solar']),
+    'OCGT'             : ('Generator', 'p_nom', ['OCGT']),
+    'H2'               : ('Link',      'p_nom', ['H2 Electrolysis', 'H2 Fuel Cell']),
+    'battery'          : ('Store',     'e_nom', ['Battery']),
+    'interconnectors'  : ('Line',      's_nom', ['ESP-FRA', 'ESP-PRT']),
+}
+
+
+def available_technologies(network: pypsa.Network, technologies: dict = TECHNOLOGIES):
+    """ Keep the technologies that have at least one extendable component in the network """
+    available = {}
+    for tech, (component, attr, names) in technologies.items():
+        df = network.df(component)
+        extendable = df.index[df[f"{attr}_extendable"]].intersection(names)
+        if len(extendable) > 0:
+            available[tech] = (component, attr, list(extendable))
+    return available
+
+
+def capacity_expression(model, component: str, attr: str, names: list):
+    """ Linear expression for the summed capacity of the given components """
+    var = model.variables[f"{component}-{attr}"]
+    return var.sel({f"{component}-ext": names}).sum()
+
+
+def capacity_values(model, component: str, attr: str, names: list):
+    """ Summed optimal capacity of the given components from the solved model """
+    var = model.variables[f"{component}-{attr}"]
+    return float(var.solution.sel({f"{component}-ext": names}).sum())
+
+
+def add_cost_slack_constraint(network: pypsa.Network, objective: float, slack: float):
+    """ Restrict the total system cost to (1 + slack) times the cost-optimal objective """
+    model = network.model
+    expression = model.objective.expression
+    constant = getattr(network, "objective_constant", 0)
+    model.add_constraints(expression + constant <= (1 + slack) * (objective + constant), name="mga-budget")
+    return model
+
+
+def create_directions(technologies: dict, n_random: int = 0, seed: int = 0):
+    """ Min/max directions along each technology axis plus optional random directions """
+    n_tech = len(technologies)
+    directions = np.vstack([np.eye(n_tech), -np.eye(n_tech)])
+    if n_random > 0:
+        rng = np.random.default_rng(seed)
+        random_directions = rng.normal(size=(n_random, n_tech))
+        random_directions /= np.linalg.norm(random_directions, axis=1, keepdims=True)
+        directions = np.vstack([directions, random_directions])
+    return directions
+
+
+def _solve_directions(network_file: str, objective: float, slack: float, technologies: dict,
+                      directions: np.ndarray, solver_name: str, solver_options: dict):
+    """ Worker: build the model once, then re-solve it for every direction in the chunk """
+    network = pypsa.Network(network_file)
+    network.optimize.create_model()
+    model = add_cost_slack_constraint(network, objective, slack)
+    expressions = [capacity_expression(model, *spec) for spec in technologies.values()]
+
+    points = []
+    for direction in directions:
+        # A positive weight maximises the capacity, a negative weight minimises it
+        model.add_objective(sum(-w * expr for w, expr in zip(direction, expressions) if w != 0), overwrite=True)
+        status, condition = model.solve(solver_name=solver_name, **solver_options)
+        if status != "ok":
+            points.append([np.nan] * len(technologies))
+            continue
+        points.append([capacity_values(model, *spec) for spec in technologies.values()])
+    return points
+
+
+def explore_near_optimal_space(
+        network: pypsa.Network,
+        slack: float = 0.05,
+        n_random: int = 0,
+        n_workers: int | None = None,
+        solver_name: str = "highs",
+        solver_options: dict | None = None,
+        technologies: dict = TECHNOLOGIES,
+    ):
+    """
+    Modelling to generate alternatives around a cost-optimal network.
+
+    Parameters:
+        network (pypsa.Network): The network, optimised with network.optimize().
+        slack (float): Allowed relative increase of the total system cost.
+        n_random (int): Number of random directions added to the min/max directions.
+        n_workers (int): Number of worker processes, defaults to the number of CPUs.
+        solver_name (str): Solver used for every direction.
+        solver_options (dict): Options passed to the solver.
+        technologies (dict): Technology groups spanning the capacity space.
+
+    Returns:
+        pd.DataFrame: Capacity mix (MW / MWh) found for each direction.
+        scipy.spatial.ConvexHull: Convex hull of the near-optimal capacity mixes.
+    """
+    technologies = available_technologies(network, technologies)
+    directions = create_directions(technologies, n_random)
+    n_workers = n_workers or os.cpu_count()
+
+    # Workers load the network from disk instead of receiving the pickled object
+    with tempfile.TemporaryDirectory() as tmpdir:
+        network_file = os.path.join(tmpdir, "network.nc")
+        network.export_to_netcdf(network_file)
+
+        chunks = [chunk for chunk in np.array_split(directions, n_workers) if len(chunk) > 0]
+        # Spawned workers: forking a parent that has solved the network deadlocks in linopy's LP writer
+        with ProcessPoolExecutor(max_workers=len(chunks), mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(_solve_directions, network_file, network.objective, slack, technologies,
+                            chunk, solver_name, solver_options or {})
+                for chunk in chunks
+            ]
+            points = [point for future in futures for point in future.result()]
+
+    mixes = pd.DataFrame(points, columns=list(technologies.keys()))
+    mixes.index = pd.MultiIndex.from_arrays(
+        [np.arange(len(directions)), ["+".join(f"{w:+.2f}" for w in d) for d in directions]],
+        names=["direction", "weights"],
+    )
+    mixes = mixes.dropna()
+
+    # Joggle the input so degenerate (flat) dimensions do not break qhull
+    hull = ConvexHull(mixes.values, qhull_options="QJ")
+    return mixes, hull
+
+
+if __name__ == "__main__":
+    data = DataLoader(country="ESP", discount_rate=0.07)
+
+    network = create_network(data)
+    network = add_storage(network, data)
+    network = add_co2_constraint(network, 0)
+    network.optimize()
+
+    mixes, hull = explore_near_optimal_space(network, slack=0.05, n_random=20)
+    print(mixes.div(1e3).round(2)) # in GW / GWh
+    print("Vertices of the near-optimal space:")
+    print(mixes.iloc[hull.vertices].div(1e3).round(2))
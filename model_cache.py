@@ -0,0 +1,277 @@
+import hashlib
+import json
+import pathlib
+import numpy as np
+import pandas as pd
+import xarray as xr
+import linopy
+import pypsa
+from references import NOMINAL_ATTRS
+
+CACHE_DIR = pathlib.Path(__file__).parent.resolve() / "cache" / "models"
+
+# Component attributes that can be patched into a cached model instead of rebuilding it.
+# Everything else (topology, efficiencies, fixed storage and link sizes, ...) defines the
+# model structure and is part of the cache key.
+PARAMETERS = {
+    'costs'              : ['capital_cost', 'marginal_cost'],
+    'capacity bounds'    : ['p_nom_min', 'p_nom_max', 'e_nom_min', 'e_nom_max', 's_nom_min', 's_nom_max'],
+    'loads'              : ['p_set'],
+    'availability'       : ['p_max_pu', 'p_min_pu', 'p_nom'],
+    'global constraints' : ['constant'],
+}
+PATCHED_COMPONENTS = {
+    'costs'              : ['Generator', 'Link', 'Store', 'Line', 'StorageUnit'],
+    'capacity bounds'    : ['Generator', 'Link', 'Store', 'Line', 'StorageUnit'],
+    'loads'              : ['Load'],
+    'availability'       : ['Generator'],
+    'global constraints' : ['GlobalConstraint'],
+}
+OPERATIONAL_ATTRS = {'Generator': 'p', 'Link': 'p', 'Store': 'p', 'StorageUnit': 'p_dispatch'}
+
+
+def _hash_frame(df: pd.DataFrame, hasher):
+    """ Feed the index, columns and values of a dataframe to a hash object """
+    hasher.update(str(list(df.columns)).encode())
+    if not df.empty:
+        hasher.update(pd.util.hash_pandas_object(df.astype(str), index=True).values.tobytes())
+
+
+def _patched_attributes(component: str):
+    """ Attributes of a component that are patched rather than part of the structure """
+    return [attr for group, attrs in PARAMETERS.items() if component in PATCHED_COMPONENTS[group] for attr in attrs]
+
+
+def structure_hash(network: pypsa.Network):
+    """ Hash of everything in the network that cannot be patched into a built model """
+    hasher = hashlib.sha256()
+    hasher.update(f"pypsa={pypsa.__version__};linopy={linopy.__version__}".encode())
+    hasher.update(pd.util.hash_pandas_object(pd.Series(network.snapshots.astype(str))).values.tobytes())
+    for c in network.iterate_components():
+        patched = _patched_attributes(c.name)
+        hasher.update(c.name.encode())
+        _hash_frame(c.df.drop(columns=patched, errors='ignore'), hasher)
+        for attr, df in sorted(c.pnl.items()):
+            if attr not in patched and not df.empty:
+                hasher.update(attr.encode())
+                _hash_frame(df, hasher)
+    return hasher.hexdigest()[:16]
+
+
+def parameter_hashes(network: pypsa.Network):
+    """ One hash per group of patchable parameters """
+    hashes = {}
+    for group, attrs in PARAMETERS.items():
+        hasher = hashlib.sha256()
+        for c in network.iterate_components(PATCHED_COMPONENTS[group]):
+            _hash_frame(c.df[[attr for attr in attrs if attr in c.df.columns]], hasher)
+            for attr in attrs:
+                if attr in c.pnl and not c.pnl[attr].empty:
+                    _hash_frame(c.pnl[attr], hasher)
+        hashes[group] = hasher.hexdigest()[:16]
+    return hashes
+
+
+def _as_dataarray(df: pd.DataFrame, template: xr.DataArray, dim: str):
+    """ Convert a snapshot x component dataframe to the coordinates of a model array """
+    df = df.reindex(columns=template.coords[dim].values, fill_value=0)
+    values = xr.DataArray(df.values, coords={'snapshot': template.coords['snapshot'].values, dim: df.columns.values},
+                          dims=('snapshot', dim))
+    return values.transpose(*template.dims)
+
+
+def _set_capacity_coefficient(model: linopy.Model, name: str, c: str, values: pd.DataFrame):
+    """ Replace the coefficient of the capacity variable in a per-snapshot capacity constraint """
+    if name not in model.constraints:
+        return
+    con = model.constraints[name]
+    capacity = model.variables[f"{c}-{NOMINAL_ATTRS[c]}"].labels
+    is_capacity = con.vars == capacity
+    coeffs = _as_dataarray(values, con.rhs, f"{c}-ext")
+    con.coeffs = xr.where(is_capacity, coeffs, con.coeffs).transpose(*con.coeffs.dims)
+
+
+def _patch_costs(network: pypsa.Network, model: linopy.Model):
+    """
+    Replace the objective coefficients of capacity and dispatch variables.
+
+    Only terms already present in the objective can be updated. A cost that was zero when
+    the model was built was dropped by PyPSA; if it is now non-zero the model is left
+    untouched and True is returned, so that the caller rebuilds it.
+    """
+    expression = model.objective.expression
+    variables = expression.vars.values
+    lookup = np.full(max(int(model.variables[name].labels.max()) for name in model.variables) + 1, np.nan)
+
+    def assign(labels, costs):
+        labels, costs = np.ravel(labels), np.ravel(costs)
+        valid = labels >= 0 # masked entries have label -1
+        lookup[labels[valid]] = costs[valid]
+
+    weighting = network.snapshot_weightings.objective
+    for c in network.iterate_components(list(NOMINAL_ATTRS)):
+        ext_i = c.df.index[c.df[f"{NOMINAL_ATTRS[c.name]}_extendable"]]
+        name = f"{c.name}-{NOMINAL_ATTRS[c.name]}"
+        if len(ext_i) > 0 and name in model.variables:
+            assign(model.variables[name].labels.sel({f"{c.name}-ext": ext_i}).values, c.df.loc[ext_i, 'capital_cost'].values)
+        name = f"{c.name}-{OPERATIONAL_ATTRS.get(c.name)}"
+        if c.name in OPERATIONAL_ATTRS and name in model.variables:
+            cost = network.get_switchable_as_dense(c.name, 'marginal_cost').mul(weighting, axis=0)
+            labels = model.variables[name].labels
+            assign(labels.values, _as_dataarray(cost, labels, c.name).values)
+
+    in_objective = variables >= 0
+    missing = np.ones(len(lookup), dtype=bool)
+    missing[variables[in_objective]] = False
+    if (missing & (np.nan_to_num(lookup) != 0)).any():
+        return True
+
+    new = lookup[np.where(in_objective, variables, 0)]
+    coeffs = np.where(in_objective & ~np.isnan(new), new, expression.coeffs.values)
+    data = expression.data.assign(coeffs=(expression.coeffs.dims, coeffs))
+    model.add_objective(linopy.LinearExpression(data, model), overwrite=True)
+
+
+def _patch_capacity_bounds(network: pypsa.Network, model: linopy.Model):
+    """ Replace the bounds of the capacity variables of extendable components """
+    for c in network.iterate_components(list(NOMINAL_ATTRS)):
+        attr = NOMINAL_ATTRS[c.name]
+        name = f"{c.name}-{attr}"
+        if name not in model.variables:
+            continue
+        var = model.variables[name]
+        ext_i = var.labels.coords[f"{c.name}-ext"].values
+        var.lower = xr.DataArray(c.df.loc[ext_i, f"{attr}_min"].values, coords=var.lower.coords)
+        var.upper = xr.DataArray(c.df.loc[ext_i, f"{attr}_max"].values, coords=var.upper.coords)
+
+
+def _patch_loads(network: pypsa.Network, model: linopy.Model):
+    """ Replace the nodal balance right-hand side with the current loads """
+    loads = network.get_switchable_as_dense('Load', 'p_set')
+    rhs = (-loads * network.loads.sign).T.groupby(network.loads.bus).sum().T
+    con = model.constraints['Bus-nodal_balance']
+    con.rhs = _as_dataarray(rhs, con.rhs, 'Bus')
+
+
+def _patch_availability(network: pypsa.Network, model: linopy.Model):
+    """ Replace the per-unit availability of generators """
+    p_max_pu = network.get_switchable_as_dense('Generator', 'p_max_pu')
+    p_min_pu = network.get_switchable_as_dense('Generator', 'p_min_pu')
+    p_nom = network.generators.p_nom
+
+    for bound, pu in [('upper', p_max_pu), ('lower', p_min_pu)]:
+        name = f"Generator-fix-p-{bound}"
+        if name in model.constraints:
+            con = model.constraints[name]
+            con.rhs = _as_dataarray(pu * p_nom, con.rhs, 'Generator-fix')
+        _set_capacity_coefficient(model, f"Generator-ext-p-{bound}", 'Generator', -pu)
+
+
+def _patch_global_constraints(network: pypsa.Network, model: linopy.Model):
+    """ Replace the constants of the global constraints (e.g. the CO2 limit) """
+    for name, constant in network.global_constraints.constant.items():
+        model.constraints[f"GlobalConstraint-{name}"].rhs = constant
+
+
+# Patch functions per parameter group; a patch returns True if the model has to be rebuilt instead
+PATCHES = {
+    'costs'              : _patch_costs,
+    'capacity bounds'    : _patch_capacity_bounds,
+    'loads'              : _patch_loads,
+    'availability'       : _patch_availability,
+    'global constraints' : _patch_global_constraints,
+}
+
+
+def attach_model(network: pypsa.Network, model: linopy.Model, objective_constant: float = 0.):
+    """
+    Attach a built linopy model to a network, so network.optimize.solve_model() solves it.
+
+    network.model is read-only since pypsa 0.35 and PyPSA has no public route to solve a model
+    it did not build in this session, so the attributes set by network.optimize.create_model()
+    are written directly (checked against the pypsa versions pinned in requirements.txt).
+    """
+    network._model = model
+    network._objective_constant = objective_constant
+    for attr in ['_multi_invest', '_linearized_uc']:
+        if getattr(network, attr, None) is None:
+            setattr(network, attr, 0)
+    return network
+
+
+def set_objective(network: pypsa.Network, objective: float, objective_constant: float | None = None):
+    """ Store the objective of a solution mapped onto a network (network.objective has no public setter) """
+    network._objective = objective
+    if objective_constant is not None:
+        network._objective_constant = objective_constant
+    return objective
+
+
+def load_or_create_model(network: pypsa.Network, cache_dir: pathlib.Path = CACHE_DIR):
+    """
+    Attach a built model to the network, reusing a cached model with the same structure.
+
+    Parameters:
+        network (pypsa.Network): The network to optimise.
+        cache_dir (pathlib.Path): Directory holding the cached models and their metadata.
+
+    Returns:
+        list: The parameter groups that were patched into a cached model, or None if the
+              model had to be built (no cached model, or a patch needed a rebuild).
+    """
+    cache_dir = pathlib.Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = structure_hash(network)
+    model_file = cache_dir / f"{key}.nc"
+    meta_file = cache_dir / f"{key}.json"
+    hashes = parameter_hashes(network)
+
+    if model_file.exists() and meta_file.exists():
+        meta = json.loads(meta_file.read_text())
+        model = linopy.read_netcdf(model_file)
+        patched = [group for group, value in hashes.items() if meta['parameters'].get(group) != value]
+        if not any([PATCHES[group](network, model) for group in patched]):
+            attach_model(network, model, meta['objective_constant'])
+            return patched
+
+    # No cached model, or a patch cannot be applied to it: build and cache a new one
+    network.optimize.create_model()
+    network.model.to_netcdf(model_file)
+    meta = {
+        'structure'          : key,
+        'parameters'         : hashes,
+        'objective_constant' : float(getattr(network, 'objective_constant', 0)),
+        'pypsa'              : pypsa.__version__,
+        'linopy'             : linopy.__version__,
+    }
+    meta_file.write_text(json.dumps(meta, indent=2))
+    return None
+
+
+def optimize_cached(network: pypsa.Network, cache_dir: pathlib.Path = CACHE_DIR, **kwargs):
+    """ Drop-in replacement for network.optimize() that reuses cached built models """
+    load_or_create_model(network, cache_dir)
+    return network.optimize.solve_model(**kwargs)
+
+
+if __name__ == "__main__":
+    import time
+    from data_loader import DataLoader
+    from g import (load_heating_demand_data, load_temperature_data, create_heating_demand_profile,
+                   create_non_coupled_el_and_heat_network, couple_el_and_heat_sector)
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+    _, annual_space_heating, annual_hot_water = load_heating_demand_data()
+    heating_demand_profile = create_heating_demand_profile(load_temperature_data(), annual_space_heating, annual_hot_water)
+
+    for scaling in [1.0, 0.7]:
+        data.costs.loc["battery storage", "capital_cost"] *= scaling
+        network = create_non_coupled_el_and_heat_network(data, heating_demand_profile)
+        network = couple_el_and_heat_sector(network, data)
+
+        start = time.perf_counter()
+        patched = load_or_create_model(network)
+        built = time.perf_counter()
+        network.optimize.solve_model()
+        solved = time.perf_counter()
+        print(f"patched: {patched}, model: {built - start:.1f} s, solve: {solved - built:.1f} s, objective: {network.objective/1e6:.1f} M€")
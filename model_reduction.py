@@ -0,0 +1,220 @@
+import pandas as pd
+import pypsa
+from model_cache import set_objective
+from references import NOMINAL_ATTRS
+
+# Time-varying results copied back to the original network
+OUTPUTS = {
+    'Generator' : ['p'],
+    'Link'      : ['p0', 'p1', 'p2'],
+    'Store'     : ['p', 'e'],
+    'Line'      : ['p0', 'p1'],
+    'Load'      : ['p'],
+    'Bus'       : ['p', 'marginal_price'],
+}
+# Generator attributes that must be identical for generators to be merged
+EQUIVALENCE_ATTRS = ['bus', 'carrier', 'marginal_cost', 'capital_cost', 'efficiency', 'p_nom_extendable']
+
+
+def model_size(network: pypsa.Network):
+    """ Number of variables and constraints of the optimisation model of a network """
+    model = network.optimize.create_model()
+    return pd.Series({'variables': model.nvars, 'constraints': model.ncons})
+
+
+def remove_dead_components(network: pypsa.Network, mapping: dict):
+    """ Remove components that cannot carry any energy and carriers nobody uses """
+    dead = {
+        'Generator' : network.generators.index[
+            ~network.generators.p_nom_extendable & (network.generators.p_nom == 0)
+            | (network.get_switchable_as_dense('Generator', 'p_max_pu') == 0).all()
+        ],
+        'Link'      : network.links.index[~network.links.p_nom_extendable & (network.links.p_nom == 0)],
+        'Store'     : network.stores.index[~network.stores.e_nom_extendable & (network.stores.e_nom == 0)],
+        'Line'      : network.lines.index[~network.lines.s_nom_extendable & (network.lines.s_nom == 0)],
+        'Load'      : network.loads.index[(network.get_switchable_as_dense('Load', 'p_set') == 0).all()],
+    }
+    for component, names in dead.items():
+        if len(names) > 0:
+            network.remove(component, names)
+            mapping['removed'][component] = list(names)
+
+    used = set()
+    for c in network.iterate_components(['Bus', 'Generator', 'Link', 'Store', 'Line', 'Load', 'StorageUnit']):
+        if 'carrier' in c.df:
+            used.update(c.df.carrier)
+    unused = network.carriers.index.difference(list(used))
+    if len(unused) > 0:
+        network.remove('Carrier', unused)
+        mapping['removed']['Carrier'] = list(unused)
+    return network
+
+
+def convert_fixed_injections(network: pypsa.Network, mapping: dict, must_take: bool = False):
+    """
+    Replace fixed-capacity, zero-cost, emission-free generators by negative loads.
+
+    Only generators with p_min_pu == p_max_pu are converted by default, which is exact.
+    With `must_take`, curtailable ones (such as "Rain to DamWater") are converted too.
+    This forbids spilling their output and changes the feasible set, so the reduced
+    optimum is no longer that of the original network.
+    """
+    generators = network.generators
+    p_max_pu = network.get_switchable_as_dense('Generator', 'p_max_pu')
+    p_min_pu = network.get_switchable_as_dense('Generator', 'p_min_pu')
+    marginal_cost = network.get_switchable_as_dense('Generator', 'marginal_cost')
+    co2 = generators.carrier.map(network.carriers.co2_emissions).fillna(0)
+
+    candidates = generators.index[
+        ~generators.p_nom_extendable
+        & (marginal_cost == 0).all()
+        & (co2 == 0)
+        & ((p_min_pu == p_max_pu).all() | must_take)
+    ]
+    for name in candidates:
+        network.add(
+            "Load",
+            f"{name} injection",
+            bus=generators.at[name, 'bus'],
+            carrier=generators.at[name, 'carrier'],
+            p_set=-(generators.at[name, 'p_nom'] * p_max_pu[name]).values,
+        )
+        mapping['injections'][name] = f"{name} injection"
+    if len(candidates) > 0:
+        network.remove('Generator', candidates)
+    return network
+
+
+def merge_equivalent_generators(network: pypsa.Network, mapping: dict):
+    """ Merge non-extendable generators at the same bus with identical costs and profiles """
+    generators = network.generators[~network.generators.p_nom_extendable]
+    if generators.empty:
+        return network
+    p_max_pu = network.get_switchable_as_dense('Generator', 'p_max_pu')[generators.index]
+    p_min_pu = network.get_switchable_as_dense('Generator', 'p_min_pu')[generators.index]
+    profiles = pd.util.hash_pandas_object(pd.concat([p_max_pu, p_min_pu]).T, index=False)
+
+    keys = generators[EQUIVALENCE_ATTRS].astype(str).agg('|'.join, axis=1) + '|' + profiles.astype(str)
+    for _, names in generators.groupby(keys).groups.items():
+        if len(names) < 2:
+            continue
+        merged = " + ".join(names)
+        first = names[0]
+        network.add(
+            "Generator",
+            merged,
+            **{attr: generators.at[first, attr] for attr in EQUIVALENCE_ATTRS},
+            p_nom=generators.loc[names, 'p_nom'].sum(),
+            p_max_pu=p_max_pu[first].values,
+            p_min_pu=p_min_pu[first].values,
+        )
+        network.remove('Generator', names)
+        mapping['merged']['Generator'][merged] = list(names)
+    return network
+
+
+def reduce_network(network: pypsa.Network, must_take: bool = False):
+    """
+    Pre-solve reduction of a network.
+
+    Parameters:
+        network (pypsa.Network): The network to reduce, left untouched.
+        must_take (bool): Also convert curtailable zero-cost injections to loads (inexact,
+                          see convert_fixed_injections).
+
+    Returns:
+        pypsa.Network: The reduced network.
+        dict: Mapping from the reduced to the original component names.
+    """
+    mapping = {'removed': {}, 'injections': {}, 'merged': {'Generator': {}}}
+    reduced = network.copy()
+    reduced = remove_dead_components(reduced, mapping)
+    reduced = convert_fixed_injections(reduced, mapping, must_take)
+    reduced = merge_equivalent_generators(reduced, mapping)
+    return reduced, mapping
+
+
+def size_report(network: pypsa.Network, reduced: pypsa.Network):
+    """ Variable and constraint counts before and after the reduction """
+    report = pd.DataFrame({
+        'original' : model_size(network.copy()),
+        'reduced'  : model_size(reduced.copy()),
+    })
+    report['reduction'] = 1 - report['reduced'] / report['original']
+    return report
+
+
+def restore_solution(network: pypsa.Network, reduced: pypsa.Network, mapping: dict):
+    """ Write the solution of the reduced network back to the original component names """
+    for component, attrs in OUTPUTS.items():
+        original = network.df(component)
+        solved = reduced.df(component)
+        pnl = network.pnl(component)
+
+        for attr in attrs:
+            if attr not in reduced.pnl(component):
+                continue
+            values = reduced.pnl(component)[attr]
+            if component == 'Generator':
+                for merged, names in mapping['merged']['Generator'].items():
+                    shares = original.loc[names, 'p_nom'] / original.loc[names, 'p_nom'].sum()
+                    values = values.drop(columns=merged).join(pd.DataFrame(
+                        values[[merged]].values * shares.values, index=values.index, columns=names))
+                for name, load in mapping['injections'].items():
+                    values[name] = -reduced.loads_t.p[load] if load in reduced.loads_t.p else -reduced.loads_t.p_set[load]
+            pnl[attr] = values.reindex(columns=original.index, fill_value=0.)
+
+        nominal = NOMINAL_ATTRS.get(component)
+        if nominal is not None:
+            optimal = solved[f"{nominal}_opt"].copy()
+            if component == 'Generator':
+                for merged, names in mapping['merged']['Generator'].items():
+                    optimal = pd.concat([optimal.drop(merged), original.loc[names, nominal]])
+            optimal = optimal.reindex(original.index)
+            original[f"{nominal}_opt"] = optimal.fillna(original[nominal])
+
+    network.global_constraints['mu'] = reduced.global_constraints.mu.reindex(network.global_constraints.index)
+    set_objective(network, reduced.objective, reduced.objective_constant)
+    return network
+
+
+def optimize_reduced(network: pypsa.Network, must_take: bool = False, **kwargs):
+    """
+    Reduce, optimise and map the solution back onto the original network.
+    The result is exact unless must_take=True.
+    """
+    reduced, mapping = reduce_network(network, must_take)
+    status, condition = reduced.optimize(**kwargs)
+    if status == "ok":
+        restore_solution(network, reduced, mapping)
+    return status, condition
+
+
+if __name__ == "__main__":
+    import time
+    from data_loader import DataLoader
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+    from f import add_neighbors
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+
+    network = create_network(data)
+    network = add_storage(network, data)
+    network = add_co2_constraint(network, 0)
+    network = add_neighbors(network, data)
+
+    reduced, mapping = reduce_network(network)
+    print(mapping)
+    print(size_report(network, reduced))
+
+    start = time.perf_counter()
+    network.optimize()
+    print(f"Original: {network.objective/1e6:.1f} M€ in {time.perf_counter() - start:.1f} s")
+
+    restored = network.copy()
+    start = time.perf_counter()
+    optimize_reduced(restored)
+    print(f"Reduced:  {restored.objective/1e6:.1f} M€ in {time.perf_counter() - start:.1f} s")
+    print(pd.DataFrame({'original': network.generators.p_nom_opt, 'reduced': restored.generators.p_nom_opt}).div(1e3))
@@ -0,0 +1,135 @@
+import pandas as pd
+import pypsa
+from model_cache import set_objective
+
+# Factors from the model units (MW, EUR, t) to the scaled units (GW, kEUR, Mt).
+# EUR/MW and EUR/MWh become kEUR/GW and kEUR/GWh, which keep their values.
+UNIT_FACTORS = {
+    'MW'          : 1e-3,
+    'MWh'         : 1e-3,
+    'MVA'         : 1e-3,
+    'MVar'        : 1e-3,
+    'currency'    : 1e-3,
+}
+CO2_FACTOR = 1e-6       # t -> Mt
+CO2_INTENSITY_FACTOR = CO2_FACTOR / UNIT_FACTORS['MWh'] # t/MWh -> Mt/GWh
+
+
+def _attribute_factors(component):
+    """ Scaling factor of every attribute of a component whose unit is scaled """
+    if component.name == "GlobalConstraint": # units depend on the constraint type, see _scale
+        return pd.Series(dtype=float)
+    units = component.attrs['unit'].fillna('')
+    factors = units.map(UNIT_FACTORS).dropna()
+    if component.name == "Carrier":
+        factors['co2_emissions'] = CO2_INTENSITY_FACTOR
+    return factors
+
+
+def _scale(network: pypsa.Network, inverse: bool = False, outputs: bool = False):
+    """ Scale the inputs (or outputs) of a network in place """
+    for component in network.iterate_components():
+        factors = _attribute_factors(component)
+        status = component.attrs['status'].reindex(factors.index).fillna('')
+        factors = factors[(status == "Output") == outputs]
+        for attr, factor in factors.items():
+            factor = 1 / factor if inverse else factor
+            if attr in component.df:
+                component.df[attr] = component.df[attr] * factor
+            if attr in component.pnl and not component.pnl[attr].empty:
+                component.pnl[attr] = component.pnl[attr] * factor
+
+    if not outputs:
+        gc = network.global_constraints
+        primary = gc.type == "primary_energy" # constants in t_CO2
+        gc.loc[primary, 'constant'] *= 1 / CO2_FACTOR if inverse else CO2_FACTOR
+    return network
+
+
+def scale_network(network: pypsa.Network):
+    """
+    Copy of a network in GW, GWh, kEUR and Mt.
+
+    Capital and marginal costs keep their values (kEUR/GW = EUR/MW), while capacities,
+    loads, storage sizes and the CO2 limit shrink by 1e3 to 1e6, which brings the
+    coefficients and bounds of the model close to 1.
+    """
+    return _scale(network.copy())
+
+
+def unscale_results(scaled: pypsa.Network, network: pypsa.Network):
+    """ Write the results of a solved scaled network back to the original network, in MW, EUR and t """
+    _scale(scaled, inverse=True, outputs=True)
+    for component in scaled.iterate_components():
+        original = network.df(component.name)
+        output = component.attrs.index[component.attrs['status'] == "Output"]
+        for attr in output:
+            if attr in component.df and attr in original:
+                original[attr] = component.df[attr].reindex(original.index)
+            if attr in component.pnl:
+                network.pnl(component.name)[attr] = component.pnl[attr]
+
+    # The duals of the CO2 limits are in kEUR/Mt, 1 kEUR/Mt = 1e-3 EUR/t
+    primary = network.global_constraints.type == "primary_energy"
+    network.global_constraints.loc[primary, 'mu'] *= CO2_FACTOR / UNIT_FACTORS['currency']
+    constant = scaled.objective_constant
+    set_objective(network, scaled.objective / UNIT_FACTORS['currency'],
+                  constant / UNIT_FACTORS['currency'] if constant is not None else None)
+    return network
+
+
+def optimize_scaled(network: pypsa.Network, **kwargs):
+    """
+    network.optimize() on the scaled network, with the results unscaled into the original.
+
+    Returns:
+        str, str: Status and condition of the solve.
+        pypsa.Network: The solved scaled network, which holds the linopy model.
+    """
+    scaled = scale_network(network)
+    status, condition = scaled.optimize(**kwargs)
+    if status == "ok":
+        unscale_results(scaled, network)
+    return status, condition, scaled
+
+
+if __name__ == "__main__":
+    import time
+    import numpy as np
+    from data_loader import DataLoader
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+    from warm_start import solver_statistics
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+
+    # The storage case of e.py, where the 0 Mt point gave an unreasonable CO2 price
+    rows = []
+    for co2_limit in np.array([3, 2, 1, 0]) * 1e6:
+        for scaled in [False, True]:
+            network = create_network(data)
+            network = add_storage(network, data)
+            network = add_co2_constraint(network, co2_limit)
+            start = time.perf_counter()
+            kwargs = dict(solver_name="highs", solver_options={"solver": "ipm"})
+            if scaled:
+                status, _, solved = optimize_scaled(network, **kwargs)
+            else:
+                status, _ = network.optimize(**kwargs)
+                solved = network
+            rows.append({
+                'co2 limit [Mt]' : co2_limit / 1e6,
+                'scaled'         : scaled,
+                'status'         : status,
+                'time [s]'       : time.perf_counter() - start,
+                'objective [M€]' : network.objective / 1e6,
+                'co2 price [€/t]': -network.global_constraints.mu.iloc[0],
+                **solver_statistics(solved),
+            })
+
+    pd.set_option('display.width', 200)
+    report = pd.DataFrame(rows).set_index(['co2 limit [Mt]', 'scaled'])
+    print(report)
+    objectives = report['objective [M€]'].unstack()
+    print("Largest relative objective difference:", ((objectives[True] - objectives[False]).abs() / objectives[False]).max())
@@ -0,0 +1,207 @@
+import pandas as pd
+import pypsa
+import xarray as xr
+from model_cache import set_objective
+from weather_years import k_medoids
+
+# Stores whose state of charge is tracked across the whole horizon; all other stores
+# are cyclic within each representative day
+SEASONAL_STORES = ['DamReservoir', 'H2 Storage']
+
+
+def daily_features(network: pypsa.Network):
+    """ One row per day: the normalised input time series (availability, loads, inflow) of its hours """
+    days = network.snapshots.normalize()
+    series = []
+    for component in network.iterate_components():
+        for attr, df in component.pnl.items():
+            if df.empty or attr not in ("p_max_pu", "p_min_pu", "p_set", "inflow"):
+                continue
+            scaled = df / df.abs().max().replace(0, 1)
+            series.append(scaled)
+    values = pd.concat(series, axis=1)
+    hours = network.snapshots.hour
+    return values.set_index([days, hours]).unstack(level=1).fillna(0)
+
+
+def select_periods(network: pypsa.Network, n_periods: int, seed: int = 0):
+    """
+    Representative days of a network with k-medoids on the daily input profiles.
+
+    Returns:
+        pd.Series: Representative day (a real day of the horizon) of every day, indexed by day.
+    """
+    features = daily_features(network)
+    medoids, labels = k_medoids(features.values, n_periods, seed=seed)
+    return pd.Series(features.index[medoids][labels], index=features.index, name='period')
+
+
+def representative_network(network: pypsa.Network, assignment: pd.Series, seasonal: list = SEASONAL_STORES):
+    """
+    Network on the hours of the representative days, each weighted by the days it represents.
+
+    The stores keep an hourly time step (stores weighting 1) while generation, emissions and
+    costs are weighted by the cluster size. The store energy balances are replaced by
+    add_multi_resolution_storage after create_model.
+    """
+    periods = assignment.value_counts().sort_index()
+    days = network.snapshots.normalize()
+    snapshots = network.snapshots[days.isin(periods.index)]
+    reduced = network.copy(snapshots=snapshots)
+
+    weight = pd.Series(periods.reindex(snapshots.normalize()).values, index=snapshots, dtype=float)
+    reduced.snapshot_weightings['objective'] = weight
+    reduced.snapshot_weightings['generators'] = weight
+    reduced.snapshot_weightings['stores'] = 1.
+
+    reduced.stores['e_cyclic'] = False
+    # Seasonal stores carry the change of energy within the day, which may be negative
+    reduced.stores.loc[reduced.stores.index.intersection(seasonal), 'e_min_pu'] = -1
+    return reduced
+
+
+def add_multi_resolution_storage(network: pypsa.Network, assignment: pd.Series, seasonal: list = SEASONAL_STORES):
+    """
+    Store energy balances of the representative-day model (Kotzur et al., 2018).
+
+    Short-term stores are cyclic within every representative day. Seasonal stores have an
+    intra-day profile starting at zero and an inter-day state of charge per day of the horizon,
+    which advances by the intra-day change of the day's representative period:
+
+        soc[d+1] = soc[d] + e[period(d), last hour]
+        0 <= soc[d] + e[period(d), h] <= e_nom     (through the min and max of e per period)
+
+    Call after network.optimize.create_model(), then solve with network.optimize.solve_model().
+    """
+    model = network.model
+    model.remove_constraints("Store-energy_balance")
+    e, p = model.variables["Store-e"], model.variables["Store-p"]
+    stores = network.stores.index
+    seasonal = list(stores.intersection(seasonal))
+    periods = assignment.unique()
+    hours = network.snapshots.to_series().groupby(network.snapshots.normalize())
+
+    for period in sorted(periods):
+        snapshots = hours.get_group(period).index
+        e_p, p_p = e.sel(snapshot=snapshots), p.sel(snapshot=snapshots)
+        short = list(stores.difference(seasonal))
+        if short:
+            # Cyclic within the day
+            lhs = e_p.sel(Store=short) - e_p.sel(Store=short).roll(snapshot=1) + p_p.sel(Store=short)
+            model.add_constraints(lhs == 0, name=f"Store-energy_balance-{period:%Y-%m-%d}")
+        if seasonal:
+            # Starts from zero: the first hour has no previous term
+            e_s, p_s = e_p.sel(Store=seasonal), p_p.sel(Store=seasonal)
+            first, rest = snapshots[:1], snapshots[1:]
+            lhs = e_s.sel(snapshot=rest) - e_s.shift(snapshot=1).sel(snapshot=rest) + p_s.sel(snapshot=rest)
+            model.add_constraints(lhs == 0, name=f"Store-intra_balance-{period:%Y-%m-%d}")
+            model.add_constraints(e_s.sel(snapshot=first) + p_s.sel(snapshot=first) == 0,
+                                  name=f"Store-intra_start-{period:%Y-%m-%d}")
+
+    if not seasonal:
+        return model
+
+    days = pd.Index(assignment.index, name='day')
+    period_index = pd.Index(sorted(periods), name='period')
+    last_hour = {period: hours.get_group(period).index[-1] for period in period_index}
+
+    e_seasonal = e.sel(Store=seasonal)
+    e_max = model.add_variables(coords=[period_index, pd.Index(seasonal, name='Store')], name="Store-e_intra_max")
+    e_min = model.add_variables(coords=[period_index, pd.Index(seasonal, name='Store')], name="Store-e_intra_min")
+    for period in period_index:
+        e_day = e_seasonal.sel(snapshot=hours.get_group(period).index)
+        model.add_constraints(e_max.sel(period=period) - e_day >= 0, name=f"Store-e_intra_max-{period:%Y-%m-%d}")
+        model.add_constraints(e_min.sel(period=period) - e_day <= 0, name=f"Store-e_intra_min-{period:%Y-%m-%d}")
+
+    soc = model.add_variables(lower=0, coords=[pd.Index(days, name='day'), pd.Index(seasonal, name='Store')], name="Store-soc_inter")
+    # Change of energy over each day, taken from its representative period
+    change = e_seasonal.sel(snapshot=xr.DataArray([last_hour[period] for period in assignment.values], coords={'day': days}, dims='day'))
+    model.add_constraints(soc.roll(day=-1) - soc - change == 0, name="Store-soc_inter_balance") # cyclic over the horizon
+
+    to_period = xr.DataArray(assignment.values, coords={'day': days}, dims='day')
+    e_nom = network.stores.e_nom.loc[seasonal].copy()
+    extendable = [s for s in seasonal if network.stores.at[s, 'e_nom_extendable']]
+    upper = soc + e_max.sel(period=to_period)
+    model.add_constraints(soc + e_min.sel(period=to_period) >= 0, name="Store-soc_inter_lower")
+    for store in seasonal:
+        if store in extendable:
+            e_nom_var = model.variables["Store-e_nom"].sel({"Store-ext": store})
+            model.add_constraints(upper.sel(Store=store) - e_nom_var <= 0, name=f"Store-soc_inter_upper-{store}")
+        else:
+            model.add_constraints(upper.sel(Store=store) <= e_nom[store], name=f"Store-soc_inter_upper-{store}")
+    return model
+
+
+def optimize_multi_resolution(network: pypsa.Network, n_periods: int = 24, seasonal: list = SEASONAL_STORES,
+                              seed: int = 0, **kwargs):
+    """
+    Optimise a network on representative days with seasonal storage linked across the horizon.
+    Keyword arguments are passed to network.optimize.solve_model().
+
+    Returns:
+        pypsa.Network: The solved reduced network.
+        pd.Series: Representative day of every day of the horizon.
+    """
+    assignment = select_periods(network, n_periods, seed)
+    reduced = representative_network(network, assignment, seasonal)
+    reduced.optimize.create_model()
+    add_multi_resolution_storage(reduced, assignment, seasonal)
+    reduced.optimize.solve_model(**kwargs)
+    return reduced, assignment
+
+
+def expand_to_horizon(reduced: pypsa.Network, network: pypsa.Network, assignment: pd.Series,
+                      seasonal: list = SEASONAL_STORES):
+    """
+    Write the solution of the reduced network into the full-horizon network: every day takes
+    the hourly results of its representative day, and seasonal stores their inter-day state of
+    charge plus the intra-day profile, so the results_plotter functions work unchanged.
+    """
+    day_of = network.snapshots.normalize()
+    representative = assignment.reindex(day_of).values + (network.snapshots - day_of)
+
+    for component in reduced.iterate_components():
+        df = network.df(component.name)
+        output = component.attrs.index[component.attrs['status'] == "Output"]
+        for attr in output:
+            if attr in component.df and attr in df:
+                df[attr] = component.df[attr].reindex(df.index)
+            if attr in component.pnl and not component.pnl[attr].empty:
+                network.pnl(component.name)[attr] = component.pnl[attr].reindex(representative).set_axis(network.snapshots)
+
+    stores = reduced.stores.index.intersection(seasonal)
+    if len(stores):
+        soc = reduced.model.variables["Store-soc_inter"].solution.to_pandas()
+        network.stores_t.e[stores] = network.stores_t.e[stores].values + soc.reindex(day_of)[stores].values
+    set_objective(network, reduced.objective, reduced.objective_constant)
+    return network
+
+
+if __name__ == "__main__":
+    import time
+    from data_loader import DataLoader
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+    from compact_storage import model_size
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+
+    def build():
+        return add_co2_constraint(add_storage(create_network(data), data), 0)
+
+    network = build()
+    size = model_size(network)
+    start = time.perf_counter()
+    network.optimize()
+    print(f"hourly: {size}, {time.perf_counter() - start:.1f} s, {network.objective/1e6:.1f} M€")
+
+    for n_periods in [12, 24, 48]:
+        network = build()
+        start = time.perf_counter()
+        reduced, assignment = optimize_multi_resolution(network, n_periods)
+        elapsed = time.perf_counter() - start
+        expand_to_horizon(reduced, network, assignment)
+        print(f"{n_periods} days: {reduced.model.nvars} variables, {reduced.model.ncons} constraints, "
+              f"{elapsed:.1f} s, {network.objective/1e6:.1f} M€")
+        print(network.stores.e_nom_opt.div(1e3).round(1).to_dict())
@@ -0,0 +1,174 @@
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pypsa
+from concurrent.futures import ProcessPoolExecutor
+from data_loader import DataLoader
+from snapshot_calendar import hourly_offsets
+from coarse_to_fine import extendable_capacities, apply_capacities
+
+VALUE_OF_LOST_LOAD = 10000 # EUR/MWh
+WEATHER_YEARS = range(1985, 2016)
+
+
+def freeze_capacities(network: pypsa.Network, keep_global_constraints: bool = True):
+    """
+    Dispatch-only copy of a solved network: the optimal capacities are fixed and every
+    bus with a load gets a load-shedding generator at the value of lost load.
+    """
+    frozen = apply_capacities(network.copy(), extendable_capacities(network), mode="fix")
+    if not keep_global_constraints:
+        frozen.remove("GlobalConstraint", frozen.global_constraints.index)
+
+    frozen.add("Carrier", "load shedding")
+    loads = frozen.get_switchable_as_dense("Load", "p_set")
+    for bus, peak in loads.T.groupby(frozen.loads.bus).sum().T.max().items():
+        frozen.add(
+            "Generator",
+            f"{bus} load shedding",
+            bus=bus,
+            carrier="load shedding",
+            p_nom=peak,
+            marginal_cost=VALUE_OF_LOST_LOAD,
+        )
+    return frozen
+
+
+def weather_profiles(data: DataLoader, years=WEATHER_YEARS):
+    """
+    Capacity factors and hydro inflow of the country for several weather years.
+
+    Each source file is read once and sliced per year with the cached row offsets,
+    instead of building one DataLoader per year.
+    """
+    columns = {'onshore wind': 'onshore_wind_1979-2017.csv', 'solar': 'pv_optimal.csv'}
+    series = {name: pd.read_csv(data.path + 'data/' + filename, sep=';', usecols=[data.country])[data.country].values
+              for name, filename in columns.items()}
+    profiles = {}
+    for year in years:
+        profiles[year] = {
+            name: values[hourly_offsets(data.path + 'data/' + columns[name], year)]
+            for name, values in series.items()
+        }
+        profiles[year]['Rain to DamWater'] = data.read_inflow_cycle('data/Hydro_Inflow_ES.csv', anchor='1983-01-01', year=year).values
+    return profiles
+
+
+def set_weather(network: pypsa.Network, profile: dict):
+    """ Patch the weather-dependent availability of a.create_network with one year's profiles """
+    for name in ['onshore wind', 'solar']:
+        network.generators_t.p_max_pu[name] = profile[name]
+    inflow = profile['Rain to DamWater']
+    network.generators.at['Rain to DamWater', 'p_nom'] = inflow.max()
+    network.generators_t.p_max_pu['Rain to DamWater'] = inflow / inflow.max()
+    return network
+
+
+def reliability(network: pypsa.Network):
+    """ Unserved energy, gas use and storage stress of a solved dispatch-only network """
+    weights = network.snapshot_weightings.generators
+    p = network.generators_t.p
+    shedding = p.loc[:, network.generators.carrier == "load shedding"].sum(axis=1)
+    demand = network.get_switchable_as_dense("Load", "p_set").sum(axis=1).mul(weights).sum()
+    gas = network.generators.index[network.generators.carrier == "gas"]
+    gas_use = p[gas].mul(weights, axis=0).sum().div(network.generators.efficiency[gas]).sum()
+
+    e = network.stores_t.e
+    e_nom = network.stores.e_nom_opt.where(network.stores.e_nom_opt > 0)
+    state = e.div(e_nom)
+    row = {
+        'unserved energy [MWh]'  : shedding.mul(weights).sum(),
+        'unserved share'         : shedding.mul(weights).sum() / demand,
+        'hours with shedding'    : int((shedding > 1e-3).sum()),
+        'peak shedding [MW]'     : shedding.max(),
+        'gas use [MWh_th]'       : gas_use,
+        'co2 [t]'                : gas_use * network.carriers.at["gas", "co2_emissions"],
+        'operating cost [M€]'    : network.objective / 1e6,
+    }
+    for store in state.columns[state.notna().any()]:
+        row[f"{store} min state"] = state[store].min()
+        row[f"{store} hours empty"] = int((state[store] < 0.01).sum())
+    return row
+
+
+def _validate_years(network_file: str, profiles: dict, solver_name: str, solver_options: dict):
+    """ Worker: load the frozen network once and solve the dispatch of every year of the chunk """
+    template = pypsa.Network(network_file)
+    rows = {}
+    for year, profile in profiles.items():
+        network = set_weather(template.copy(), profile)
+        start = time.perf_counter()
+        status, condition = network.optimize(solver_name=solver_name, solver_options=solver_options)
+        rows[year] = {'status': status, 'time [s]': time.perf_counter() - start}
+        if status == "ok":
+            rows[year].update(reliability(network))
+        else:
+            rows[year]['status'] = condition
+    return rows
+
+
+def validate_weather_years(
+        network: pypsa.Network,
+        data: DataLoader,
+        years=WEATHER_YEARS,
+        keep_global_constraints: bool = True,
+        n_workers: int | None = None,
+        solver_name: str = "highs",
+        solver_options: dict | None = None,
+    ):
+    """
+    Operate the fleet of a solved network through other weather years.
+
+    Parameters:
+        network (pypsa.Network): Network solved with capacity expansion, e.g. d.py for 2015.
+        data (DataLoader): Data the network was built with; its files provide the weather years.
+        years: Weather years to validate.
+        keep_global_constraints (bool): Keep the CO2 limit; load shedding then also covers
+                                        hours the gas fleet could serve but may not.
+
+    Returns:
+        pd.DataFrame: Reliability indicators per weather year.
+    """
+    frozen = freeze_capacities(network, keep_global_constraints)
+    profiles = weather_profiles(data, years)
+    n_workers = n_workers or os.cpu_count()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        network_file = os.path.join(tmpdir, "frozen.nc")
+        frozen.export_to_netcdf(network_file)
+
+        chunks = [chunk for chunk in np.array_split(np.array(list(years)), n_workers) if len(chunk) > 0]
+        # Spawned workers: forking a parent that has solved the network deadlocks in linopy's LP writer
+        with ProcessPoolExecutor(max_workers=len(chunks), mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(_validate_years, network_file, {int(y): profiles[int(y)] for y in chunk}, solver_name, solver_options or {})
+                for chunk in chunks
+            ]
+            rows = {year: row for future in futures for year, row in future.result().items()}
+
+    return pd.DataFrame.from_dict(rows, orient='index').rename_axis('weather year').sort_index()
+
+
+if __name__ == "__main__":
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+    network = create_network(data)
+    network = add_storage(network, data)
+    network = add_co2_constraint(network, 0)
+
+    start = time.perf_counter()
+    network.optimize()
+    print(f"Capacity expansion for 2015: {time.perf_counter() - start:.1f} s")
+
+    start = time.perf_counter()
+    table = validate_weather_years(network, data, keep_global_constraints=False)
+    print(f"Operational validation of {len(table)} weather years: {time.perf_counter() - start:.1f} s")
+
+    pd.set_option('display.width', 200)
+    print(table.round(3))
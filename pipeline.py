@@ -0,0 +1,252 @@
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import pathlib
+import sys
+import numpy as np
+import pypsa
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from data_loader import DataLoader
+from a import create_network
+from b import add_co2_constraint, create_co2_limits
+from d import add_storage
+from f import add_neighbors
+from references import REFERENCES
+from bound_tightening import optimize_tightened
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning, module="pypsa")
+
+PIPELINE_DIR = pathlib.Path(__file__).parent.resolve() / "cache" / "pipeline"
+
+
+def _heat_network(network: pypsa.Network, data: DataLoader):
+    """ Electricity and heat network of g.py, before coupling the sectors """
+    from g import load_heating_demand_data, load_temperature_data, create_heating_demand_profile, create_non_coupled_el_and_heat_network
+    _, annual_space_heating, annual_hot_water = load_heating_demand_data()
+    heating_demand_profile = create_heating_demand_profile(load_temperature_data(), annual_space_heating, annual_hot_water)
+    return create_non_coupled_el_and_heat_network(data, heating_demand_profile)
+
+
+def _couple_heat(network: pypsa.Network, data: DataLoader):
+    from g import couple_el_and_heat_sector
+    return couple_el_and_heat_sector(network, data)
+
+
+# Builder steps a scenario recipe can use: name -> function(network, data, *args)
+STEPS = {
+    'create_network'     : lambda network, data: create_network(data),
+    'add_storage'        : lambda network, data: add_storage(network, data),
+    'add_co2_constraint' : lambda network, data, co2_limit: add_co2_constraint(network, co2_limit),
+    'add_neighbors'      : lambda network, data: add_neighbors(network, data),
+    'heat_network'       : _heat_network,
+    'couple_heat'        : _couple_heat,
+}
+
+
+def _number(value, like=0.):
+    """ Numbers as the type of `like` (float by default), so 0 and 0. give the same recipe """
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(like, (int, float)):
+        return type(like)(value)
+    return value
+
+
+def scenario(steps: list, **data_kwargs):
+    """
+    Scenario recipe: DataLoader arguments plus builder steps as names or (name, *args).
+
+    Every DataLoader argument is filled in with its default and numbers are cast to the type
+    of the default (step arguments to float), so equal networks have equal recipes.
+    """
+    defaults = {name: p.default for name, p in inspect.signature(DataLoader.__init__).parameters.items()
+                if p.default is not inspect.Parameter.empty}
+    data = dict(defaults, country="ESP", discount_rate=0.07)
+    data.update({name: _number(value, defaults.get(name)) for name, value in data_kwargs.items()})
+    steps = [list(step) if isinstance(step, (tuple, list)) else [step] for step in steps]
+    steps = [[name, *[_number(arg) for arg in args]] for name, *args in steps]
+    return json.loads(json.dumps({'data': data, 'steps': steps})) # tuples as lists, as in the hash
+
+
+BASE = ['create_network']
+STORAGE = BASE + ['add_storage']
+
+# All scenarios of the study, named by the stage that first needs them. Identical recipes
+# requested by several stages (e.g. "Storage + CO2" in d.py and f.py) are solved once.
+SCENARIOS = {
+    'base'                   : scenario(BASE),
+    'storage'                : scenario(STORAGE),
+    'interconnected co2=0'   : scenario(STORAGE + [('add_co2_constraint', 0.), 'add_neighbors']),
+    'heat coupled'           : scenario(['heat_network', 'couple_heat']),
+    **{f'base co2={limit/1e6:g}' : scenario(BASE + [('add_co2_constraint', float(limit))]) for limit in create_co2_limits()},
+    **{f'storage co2={limit/1e6:g}' : scenario(STORAGE + [('add_co2_constraint', float(limit))]) for limit in [3e6, 2e6, 1e6, 0]},
+    **{f'weather {year}' : scenario(BASE, weather_year=year) for year in range(1985, 2016)},
+}
+
+
+def _plot_co2_sweep(networks: dict, filename: str):
+    import results_plotter as plot
+    limits = np.array([n.global_constraints.constant.iloc[0] for n in networks.values()])
+    mixes = [list(n.generators.p_nom_opt[REFERENCES['GENERATORS']]) + list(n.links.p_nom_opt[REFERENCES['LINKS']])
+             for n in networks.values()]
+    plot.plot_capacity_variation_under_varying_co2_limits(mixes, limits, [n.objective/1e6 for n in networks.values()], filename=filename)
+
+
+def _plot_weather(networks: dict, filename: str):
+    import results_plotter as plot
+    mixes = [list(n.generators.p_nom_opt[REFERENCES['GENERATORS']]) + list(n.links.p_nom_opt[REFERENCES['LINKS']])
+             for n in networks.values()]
+    plot.plot_weather_variability(mixes, filename=filename)
+
+
+def _plot_co2_prices(networks: dict, filename: str):
+    import results_plotter as plot
+    limits = np.array([n.global_constraints.constant.iloc[0] for n in networks.values()])
+    prices = np.array([-n.global_constraints.mu.iloc[0] for n in networks.values()])
+    plot.plot_co2_limit_vs_price(co2_limits={"storage": limits}, co2_prices={"storage": prices}, filename=filename)
+
+
+def _plotter(name: str):
+    """ Plot on a single network, the first scenario of the task """
+    def plot_first(networks: dict, **kwargs):
+        import results_plotter as plot
+        return getattr(plot, name)(next(iter(networks.values())), **kwargs)
+    return plot_first
+
+
+def _compare(networks: dict, filename: str):
+    import results_plotter as plot
+    plot.capacity_mixes_storage(networks, filename)
+
+
+# Plot tasks: name -> (function(networks, **kwargs), {label: scenario}, kwargs)
+PLOTS = {
+    'a_series_summer'    : (_plotter('plot_series'), {'base': 'base'}, {'ts': 179*24, 'filename': "a_series_summer.png"}),
+    'a_series_winter'    : (_plotter('plot_series'), {'base': 'base'}, {'ts': 11*24, 'filename': "a_series_winter.png"}),
+    'a_electricity_mix'  : (_plotter('plot_electricity_mix'), {'base': 'base'}, {'filename': "a_electricity_mix.png"}),
+    'a_duration_curves'  : (_plotter('plot_duration_curves'), {'base': 'base'}, {'filename': "a_duration_curves.png"}),
+    'b_co2_limit'        : (_plot_co2_sweep, {k: k for k in SCENARIOS if k.startswith('base co2=')}, {'filename': "b_co2_limit.png"}),
+    'c_weather'          : (_plot_weather, {k: k for k in SCENARIOS if k.startswith('weather ')}, {'filename': "c_weather_variability.png"}),
+    'd_storage_day'      : (_plotter('plot_storage_day'), {'d': 'storage co2=0'}, {'filename': "d_storage_day_plot.png"}),
+    'd_storage_season'   : (_plotter('plot_storage_season'), {'d': 'storage co2=0'}, {'filename': "d_storage_season_plot.png"}),
+    'd_electricity_mix'  : (_plotter('plot_electricity_mix'), {'d': 'storage co2=0'}, {'filename': "d_electricity_mix_plot.png"}),
+    'd_capacity_mix'     : (_compare, {'Base': 'base', 'Storage': 'storage', 'Storage + CO2': 'storage co2=0'},
+                            {'filename': "d_capacity_mix_plot.png"}),
+    'e_co2_price'        : (_plot_co2_prices, {k: k for k in SCENARIOS if k.startswith('storage co2=')}, {'filename': "e_co2_limit_vs_price.png"}),
+    'f_capacity_mix'     : (_compare, {'Base': 'base', 'Storage + CO2': 'storage co2=0',
+                                       'Storage + 0 CO2 + interconnections': 'interconnected co2=0'},
+                            {'filename': "f_capacity_mix_plot.png"}),
+    'f_storage_neighbors': (_plotter('plot_storage_day_neighbor'), {'f': 'interconnected co2=0'}, {'filename': "storge_with_interconnectors.png"}),
+    'f_mix_fra'          : (_plotter('plot_electricity_mix_neighbor_fra'), {'f': 'interconnected co2=0'}, {'filename': "electricity_mix_neighborFRA.png"}),
+    'f_mix_prt'          : (_plotter('plot_electricity_mix_neighbor_prt'), {'f': 'interconnected co2=0'}, {'filename': "electricity_mix_neighbor_prt.png"}),
+    'g_storage_season'   : (_plotter('plot_storage_season'), {'g': 'heat coupled'}, {'filename': "g_storage_season_plot.png"}),
+}
+
+
+def recipe_hash(recipe: dict):
+    """ Content hash of a scenario recipe, identical recipes share build and solve tasks """
+    return hashlib.sha256(json.dumps(recipe, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def build_task(recipe: dict, path: str):
+    """ Build the network of a recipe and store it as netCDF """
+    data = DataLoader(**recipe['data'])
+    network = None
+    for name, *args in recipe['steps']:
+        network = STEPS[name](network, data, *args)
+    network.export_to_netcdf(path)
+    return path
+
+
+def solve_task(build_path: str, path: str, solver_name: str = "highs", tighten: bool = False):
+    """ Solve a built network, optionally with derived capacity bounds, and store the solved network as netCDF """
+    network = pypsa.Network(build_path)
+    if tighten:
+        status, condition = optimize_tightened(network, solver_name=solver_name)
+    else:
+        status, condition = network.optimize(solver_name=solver_name)
+    if status != "ok":
+        raise RuntimeError(f"{build_path}: {status} ({condition})")
+    network.export_to_netcdf(path)
+    return path
+
+
+def create_graph(plots: list, scenarios: dict = SCENARIOS):
+    """
+    Dependency graph of the build, solve and plot tasks needed for the given plots.
+
+    Returns:
+        dict: Task name -> {'kind', 'deps', 'output', ...}. Build and solve tasks are named
+              by recipe hash, so scenarios with identical recipes map to the same tasks.
+    """
+    graph = {}
+    for plot in plots:
+        function, labels, kwargs = PLOTS[plot]
+        solves = {}
+        for label, name in labels.items():
+            key = recipe_hash(scenarios[name])
+            build, solve = f"build:{key}", f"solve:{key}"
+            graph.setdefault(build, {'kind': 'build', 'deps': [], 'recipe': scenarios[name],
+                                     'output': str(PIPELINE_DIR / f"build-{key}.nc")})
+            graph.setdefault(solve, {'kind': 'solve', 'deps': [build],
+                                     'output': str(PIPELINE_DIR / f"solve-{key}.nc")})
+            solves[label] = solve
+        graph[f"plot:{plot}"] = {'kind': 'plot', 'deps': list(dict.fromkeys(solves.values())), 'solves': solves,
+                                 'function': function, 'kwargs': kwargs}
+    return graph
+
+
+def _run_plot(graph: dict, task: dict):
+    """ Draw a plot from its solved networks; results_plotter skips figures whose inputs are unchanged """
+    networks = {label: pypsa.Network(graph[solve]['output']) for label, solve in task['solves'].items()}
+    task['function'](networks, **task['kwargs'])
+
+
+def run(plots: list | None = None, n_workers: int | None = None, solver_name: str = "highs", tighten: bool = False):
+    """
+    Run the study pipeline: every distinct scenario is built and solved once, in parallel,
+    and cached across runs. Plots run in the main process once their solves are available;
+    the content-hash figure cache of results_plotter decides whether a figure is redrawn.
+    With `tighten`, the solves use the derived capacity bounds of bound_tightening.
+    """
+    import matplotlib
+    matplotlib.use("Agg") # plt.show() must not block the pipeline
+
+    PIPELINE_DIR.mkdir(parents=True, exist_ok=True)
+    graph = create_graph(plots or list(PLOTS))
+    done = {name for name, task in graph.items() if task['kind'] != 'plot' and os.path.exists(task['output'])}
+    pending = {name: task for name, task in graph.items() if name not in done}
+    running = {}
+
+    n_solves = sum(task['kind'] == 'solve' for task in graph.values())
+    print(f"{len(plots or PLOTS)} plots need {n_solves} distinct solves, {sum(n.startswith('solve') for n in done)} cached")
+
+    # Spawned workers: the parent imports pypsa/linopy and draws plots, forking it can deadlock the solves
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        while pending or running:
+            ready = [name for name, task in pending.items() if all(dep in done for dep in task['deps'])]
+            for name in ready:
+                task = pending.pop(name)
+                if task['kind'] == 'build':
+                    running[pool.submit(build_task, task['recipe'], task['output'])] = name
+                elif task['kind'] == 'solve':
+                    build_path = graph[task['deps'][0]]['output']
+                    running[pool.submit(solve_task, build_path, task['output'], solver_name, tighten)] = name
+                else:
+                    _run_plot(graph, task)
+                    done.add(name)
+            if not running:
+                if pending and not ready:
+                    raise RuntimeError(f"Unresolvable dependencies: {sorted(pending)}")
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                future.result()
+                done.add(name)
+                print(f"done {name}")
+
+
+if __name__ == "__main__":
+    # e.g. python pipeline.py d_capacity_mix f_capacity_mix
+    run(sys.argv[1:] or None)
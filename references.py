@@ -0,0 +1,41 @@
+# Component names, colors and labels shared by the model builders and results_plotter.
+# Kept free of plotting imports so solver processes can use them cheaply.
+
+REFERENCES  = {'GENERATORS' : ['onshore wind', 'solar', 'OCGT'],
+               'LINKS'      : ['HDAM'],
+               'LOADS'      : ['load']
+               }
+COLORS      = {'GENERATORS' : ['green', 'orange', 'brown'],
+               'LINKS'      : ['blue'],
+               'LOADS'      : ['black']
+               }
+LABELS      = {'GENERATORS' : ['Onshore Wind', 'Solar', 'Gas (OCGT)'],
+               'LINKS'      : ['Hydro (Dam)'],
+               'LOADS'      : ['Demand']
+               }
+
+REFERENCES_FRA  = {'GENERATORS' : ['FRA wind', 'FRA solar', 'FRA nuke'],
+               'LOADS'      : ['FRA load']
+               }
+COLORS_FRA      = {'GENERATORS' : ['green', 'orange', 'purple'],
+               'LOADS'      : ['black']
+               }
+LABELS_FRA      = {'GENERATORS' : ['Onshore Wind', 'Solar', 'Nuclear'],
+               'LOADS'      : ['Demand France']
+               }
+
+REFERENCES_PRT  = {'GENERATORS' : ['PRT wind', 'PRT solar', 'PRT gas'],
+               'LINKS'      : ['PRT HDAM'],
+               'LOADS'      : ['PRT load']
+               }
+COLORS_PRT      = {'GENERATORS' : ['green', 'orange', 'brown'],
+               'LINKS'      : ['blue'],
+               'LOADS'      : ['black']
+               }
+LABELS_PRT      = {'GENERATORS' : ['Onshore Wind', 'Solar', 'Gas (OCGT)'],
+               'LINKS'      : ['Hydro (Dam)'],
+               'LOADS'      : ['Demand Portugal']
+               }
+
+# Nominal (capacity) attribute of every component with an optimised capacity
+NOMINAL_ATTRS = {'Generator': 'p_nom', 'Link': 'p_nom', 'Store': 'e_nom', 'Line': 's_nom', 'StorageUnit': 'p_nom'}
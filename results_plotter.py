@@ -1,10 +1,13 @@
+import functools
+import hashlib
+import inspect
+import json
 import matplotlib.pyplot as plt
 import pathlib
 import numpy as np
 import pandas as pd
 import pypsa
 from typing import List, Dict
-from brokenaxes import brokenaxes
 
 import seaborn as sns
 
@@ -16,47 +19,116 @@ plt.rcParams['axes.labelsize'] = 12
 plt.rcParams['xtick.labelsize'] = 10
 plt.rcParams['ytick.labelsize'] = 10
 
-REFERENCES  = {'GENERATORS' : ['onshore wind', 'solar', 'OCGT'],
-               'LINKS'      : ['HDAM'],
-               'LOADS'      : ['load']
-               }
-COLORS      = {'GENERATORS' : ['green', 'orange', 'brown'],
-               'LINKS'      : ['blue'],
-               'LOADS'      : ['black']
-               }
-LABELS      = {'GENERATORS' : ['Onshore Wind', 'Solar', 'Gas (OCGT)'],
-               'LINKS'      : ['Hydro (Dam)'],
-               'LOADS'      : ['Demand']
-               }
-
-REFERENCES_FRA  = {'GENERATORS' : ['FRA wind', 'FRA solar', 'FRA nuke'],
-               'LOADS'      : ['FRA load']
-               }
-COLORS_FRA      = {'GENERATORS' : ['green', 'orange', 'purple'],
-               'LOADS'      : ['black']
-               }
-LABELS_FRA      = {'GENERATORS' : ['Onshore Wind', 'Solar', 'Nuclear'],
-               'LOADS'      : ['Demand France']
-               }
-
-REFERENCES_PRT  = {'GENERATORS' : ['PRT wind', 'PRT solar', 'PRT gas'],
-               'LINKS'      : ['PRT HDAM'],
-               'LOADS'      : ['PRT load']
-               }
-COLORS_PRT      = {'GENERATORS' : ['green', 'orange', 'brown'],
-               'LINKS'      : ['blue'],
-               'LOADS'      : ['black']
-               }
-LABELS_PRT      = {'GENERATORS' : ['Onshore Wind', 'Solar', 'Gas (OCGT)'],
-               'LINKS'      : ['Hydro (Dam)'],
-               'LOADS'      : ['Demand Portugal']
-               }
+from references import (
+    REFERENCES, COLORS, LABELS,
+    REFERENCES_FRA, COLORS_FRA, LABELS_FRA,
+    REFERENCES_PRT, COLORS_PRT, LABELS_PRT,
+)
+
+RESULTS_DIR = pathlib.Path(__file__).parent.resolve() / "results"
+FIGURE_MANIFEST = RESULTS_DIR / "figures.json"
+FIGURE_CACHE = True # set to False to re-render every figure
 
 def save_figure(filename):
-    filepath = str(pathlib.Path(__file__).parent.resolve()) + "/results/" + filename
+    filepath = str(RESULTS_DIR / filename)
     plt.tight_layout()
     plt.savefig(filepath, dpi=300)
 
+def _digest(value, hasher):
+    """ Feed a (nested) plot input to a hash object """
+    if isinstance(value, pd.DataFrame):
+        hasher.update(str(list(value.columns)).encode())
+        hasher.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, pd.Series):
+        hasher.update(str(value.name).encode())
+        hasher.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        hasher.update(f"{value.shape}{value.dtype}".encode())
+        hasher.update(np.ascontiguousarray(value).tobytes() if value.dtype != object else repr(value.tolist()).encode())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            hasher.update(str(key).encode())
+            _digest(value[key], hasher)
+    elif isinstance(value, (list, tuple)):
+        hasher.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _digest(item, hasher)
+    else:
+        hasher.update(repr(value).encode())
+
+def figure_hash(plot, inputs, reduce=None):
+    """
+    Content hash of a figure: the source of its plot function and of its `reduce`, the shared
+    names, colors and labels and the helpers in FIGURE_HELPERS, and its reduced inputs.
+    """
+    hasher = hashlib.sha256()
+    for function in [plot, reduce, *FIGURE_HELPERS]:
+        if function is not None:
+            hasher.update(inspect.getsource(function).encode())
+    _digest(FIGURE_STYLES, hasher)
+    _digest(inputs, hasher)
+    return hasher.hexdigest()[:16]
+
+def cached_figure(reduce):
+    """
+    Skip rendering a figure whose file is up to date.
+
+    `reduce` takes the arguments of the plot function (without filename) and returns the plot
+    parameters and the part of the data the figure is drawn from, e.g. hourly means instead of
+    the full time series. When a filename is given and the hash of these inputs matches the
+    entry of the figure in results/figures.json and the file exists, the plot is not drawn.
+    """
+    def decorator(plot):
+        signature = inspect.signature(plot)
+
+        @functools.wraps(plot)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            filename = bound.arguments.pop('filename', None)
+            if filename is None or not FIGURE_CACHE:
+                return plot(*args, **kwargs)
+
+            key = figure_hash(plot, reduce(**bound.arguments), reduce)
+            manifest = json.loads(FIGURE_MANIFEST.read_text()) if FIGURE_MANIFEST.exists() else {}
+            if manifest.get(filename) == key and (RESULTS_DIR / filename).exists():
+                return
+            result = plot(*args, **kwargs)
+            manifest = json.loads(FIGURE_MANIFEST.read_text()) if FIGURE_MANIFEST.exists() else {}
+            manifest[filename] = key
+            FIGURE_MANIFEST.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+            return result
+        return wrapper
+    return decorator
+
+def _hourly(df):
+    """ Mean profile over the hours of the day """
+    return df.groupby(df.index.hour).mean()
+
+def _storage_day_inputs(network):
+    return {
+        'generators' : _hourly(network.generators_t.p[REFERENCES['GENERATORS']]),
+        'links p0'   : _hourly(network.links_t.p0),
+        'links p1'   : _hourly(network.links_t.p1),
+        'load'       : _hourly(network.loads_t.p[['load']]),
+        'links'      : network.links[['bus0', 'bus1']],
+    }
+
+# Shared by the plot functions: a change to any of them invalidates every cached figure
+FIGURE_HELPERS = [save_figure, _hourly, _storage_day_inputs]
+FIGURE_STYLES = {
+    'REFERENCES' : REFERENCES, 'COLORS' : COLORS, 'LABELS' : LABELS,
+    'REFERENCES_FRA' : REFERENCES_FRA, 'COLORS_FRA' : COLORS_FRA, 'LABELS_FRA' : LABELS_FRA,
+    'REFERENCES_PRT' : REFERENCES_PRT, 'COLORS_PRT' : COLORS_PRT, 'LABELS_PRT' : LABELS_PRT,
+}
+
+@cached_figure(lambda network, ts: {
+    'ts'         : ts,
+    'loads'      : network.loads_t.p[REFERENCES['LOADS']].iloc[ts:ts + 7*24],
+    'generators' : network.generators_t.p[REFERENCES['GENERATORS']].iloc[ts:ts + 7*24],
+    'links'      : network.links_t.p1[REFERENCES['LINKS']].iloc[ts:ts + 7*24],
+    'peak'       : network.loads_t.p[REFERENCES['LOADS']].max(),
+})
 def plot_series(network, ts: int = 0, filename: str | None = None):
     te = ts + 7*24
     plt.figure(figsize=(10, 2.5))
@@ -76,6 +148,10 @@ def plot_series(network, ts: int = 0, filename: str | None = None):
 
     plt.show()
 
+@cached_figure(lambda network: [
+    network.generators_t.p[REFERENCES['GENERATORS']].sum(),
+    network.links_t.p1[REFERENCES['LINKS']].sum(),
+])
 def plot_electricity_mix(network, filename: str | None = None):
     # Plot the electricity mix
     sizes = []
@@ -103,6 +179,7 @@ def plot_electricity_mix(network, filename: str | None = None):
 
     plt.show()
 
+@cached_figure(lambda network: network.generators_t.p[REFERENCES_FRA['GENERATORS']].sum())
 def plot_electricity_mix_neighbor_fra(network, filename: str | None = None):
     # Plot the electricity mix
     sizes = []
@@ -126,6 +203,10 @@ def plot_electricity_mix_neighbor_fra(network, filename: str | None = None):
 
     plt.show()
 
+@cached_figure(lambda network, neighbor: [
+    network.generators_t.p[REFERENCES_PRT['GENERATORS']].sum(),
+    network.links_t.p1[REFERENCES_PRT['LINKS']].sum(),
+])
 def plot_electricity_mix_neighbor_prt(network, filename: str | None = None, neighbor: str = "PRT"):
     # Plot the electricity mix
     sizes = []
@@ -153,6 +234,11 @@ def plot_electricity_mix_neighbor_prt(network, filename: str | None = None, neig
 
     plt.show()
 
+@cached_figure(lambda network: [
+    network.loads_t.p[REFERENCES['LOADS']],
+    network.generators_t.p[REFERENCES['GENERATORS']],
+    network.links_t.p1[REFERENCES['LINKS']],
+])
 def plot_duration_curves(network, filename: str | None = None):
     dur_curves = []
     colors = []
@@ -185,6 +271,7 @@ def plot_duration_curves(network, filename: str | None = None):
 
     plt.show()
 
+@cached_figure(lambda network_sols, co2_limits, system_costs: [network_sols, co2_limits, system_costs])
 def plot_capacity_variation_under_varying_co2_limits(network_sols, co2_limits, system_costs, filename: str | None = None):
     mixes = np.array(network_sols).T*1e-3 # in GW
     
@@ -239,6 +326,7 @@ def plot_capacity_variation_under_varying_co2_limits(network_sols, co2_limits, s
 
     plt.show() 
 
+@cached_figure(lambda network_sols: network_sols)
 def plot_weather_variability(network_sols, filename: str = None):
     colors = []
     labels = []
@@ -287,6 +375,51 @@ def plot_weather_variability(network_sols, filename: str = None):
     plt.show()
 
 
+@cached_figure(lambda full_mixes, subset_mixes, weights: [full_mixes, subset_mixes, weights])
+def plot_weather_selection(full_mixes, subset_mixes, weights, filename: str | None = None):
+    """ Capacity distribution of all weather years next to the selected, weighted years """
+    colors = []
+    labels = []
+    for ix, gen in enumerate(REFERENCES['GENERATORS']):
+        colors += [COLORS['GENERATORS'][ix]]
+        labels += [LABELS['GENERATORS'][ix]]
+    full_mixes = np.array(full_mixes)
+    subset_mixes = np.array(subset_mixes)
+    weights = np.array(weights)
+
+    fig, ax = plt.subplots()
+
+    for i, color in enumerate(colors):
+        ax.boxplot(
+            full_mixes[:, i],
+            positions=[i + 1],
+            patch_artist=True,
+            boxprops=dict(facecolor=color, color=color, alpha=0.5),
+            medianprops=dict(color='red'),
+        )
+        ax.scatter(
+            np.full(len(subset_mixes), i + 1.3),
+            subset_mixes[:, i],
+            s=20 + 300 * weights,
+            color=color,
+            edgecolor='black',
+            label='Selected years' if i == 0 else None,
+        )
+        ax.plot(i + 1.3, np.average(subset_mixes[:, i], weights=weights), marker='o', color='blue',
+                markeredgecolor='black', label='Weighted mean' if i == 0 else None)
+
+    plt.xticks(ticks=range(1, len(labels) + 1), labels=labels)
+    plt.ylim(0, 1.05 * max(full_mixes[:, :len(labels)].flatten()))
+    plt.xlabel(r"Generator technology")
+    plt.ylabel(r"Capacity Variation (MW)")
+    plt.legend(loc='best', fancybox=True, shadow=True)
+    plt.title(r'All weather years vs. representative selection')
+
+    if filename is not None: save_figure(filename)
+    plt.show()
+
+
+@cached_figure(_storage_day_inputs)
 def plot_storage_day(network: pypsa.Network, filename: str | None = None):
     network.generators_t.p[REFERENCES['GENERATORS']].groupby(network.snapshots.hour).mean().div(1e3).reindex(np.arange(0,25)).ffill().plot(drawstyle="steps-post")
     # (- network.links_t.p1["HDAM"]).groupby(network.snapshots.hour).mean().div(1e3).reindex(np.arange(0,25)).ffill().plot(drawstyle="steps-post", label="Dam Hydro")
@@ -327,6 +460,7 @@ def plot_storage_day(network: pypsa.Network, filename: str | None = None):
 
     plt.show()
 
+@cached_figure(lambda network: network.stores_t.e.groupby(network.stores_t.e.index.month).mean())
 def plot_storage_season(network: pypsa.Network, filename: str | None = None):
     network.stores_t.e.groupby(network.stores_t.e.index.month).mean().div(1e3).plot()
     plt.legend(fancybox=True, shadow=True, loc='best')
@@ -339,6 +473,9 @@ def plot_storage_season(network: pypsa.Network, filename: str | None = None):
 
     plt.show()
 
+@cached_figure(lambda networks: {
+    name: [network.generators.p_nom_opt[REFERENCES['GENERATORS']], network.objective] for name, network in networks.items()
+})
 def capacity_mixes_storage(networks: Dict[str, pypsa.Network], filename: str | None = None):    
     # Create dataframe for the capacity mixes
     gen_capacities = pd.DataFrame(index=REFERENCES['GENERATORS'])
@@ -364,6 +501,7 @@ def capacity_mixes_storage(networks: Dict[str, pypsa.Network], filename: str | N
 
     plt.show()
 
+@cached_figure(lambda co2_limits, co2_prices: [co2_limits, co2_prices])
 def plot_co2_limit_vs_price(co2_limits: dict, co2_prices: dict, filename: str | None = None):
     for label in co2_limits.keys():
         plt.plot(co2_limits[label]/1e6, co2_prices[label], 'o-', label=label)
@@ -381,6 +519,11 @@ def plot_co2_limit_vs_price(co2_limits: dict, co2_prices: dict, filename: str |
     plt.show()
 
 
+@cached_figure(lambda network: {
+    **_storage_day_inputs(network),
+    'lines'      : network.lines[['bus0', 'bus1']],
+    'lines p0'   : _hourly(network.lines_t.p0),
+})
 def plot_storage_day_neighbor(network: pypsa.Network, filename: str | None = None):
     network.generators_t.p[REFERENCES['GENERATORS']].groupby(network.snapshots.hour).mean().reindex(np.arange(0,25)).ffill().plot(drawstyle="steps-post")
     
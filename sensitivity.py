@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+import pypsa
+from data_loader import DataLoader, annuity
+from references import NOMINAL_ATTRS
+
+# Cost rows of data.costs behind the capital costs of the extendable components: (row, share of the cost)
+TECHNOLOGY_COSTS = {
+    ('Generator', 'onshore wind')    : ('onwind', 1),
+    ('Generator', 'solar')           : ('solar', 1),
+    ('Generator', 'OCGT')            : ('OCGT', 1),
+    ('Store', 'H2 Storage')          : ('hydrogen storage underground', 1),
+    ('Link', 'H2 Electrolysis')      : ('electrolysis', 1),
+    ('Link', 'H2 Fuel Cell')         : ('fuel cell', 1),
+    ('Store', 'Battery')             : ('battery storage', 1),
+    ('Link', 'AC-DC Converter')      : ('battery inverter', 0.5),
+    ('Link', 'DC-AC Inverter')       : ('battery inverter', 0.5),
+}
+
+
+def optimize_with_sensitivities(network: pypsa.Network, solver_name: str = "highs", **kwargs):
+    """
+    Optimise with all duals assigned and the solver model kept for ranging.
+
+    The direct API keeps the solver columns and rows in the order of the linopy matrices,
+    which is used to map the ranging information back to the components.
+    """
+    return network.optimize(solver_name=solver_name, io_api="direct", assign_all_duals=True, **kwargs)
+
+
+def _solver_ranging(network: pypsa.Network):
+    """
+    Reduced costs and ranging of the last solve as tables indexed by linopy labels.
+
+    Returns:
+        pd.DataFrame: Per variable: reduced cost and the valid ranges of its cost and bound.
+        pd.DataFrame: Per constraint: dual and the valid range of its right-hand side.
+    """
+    model = network.model
+    solver_model = getattr(model, "solver_model", None)
+    vlabels, clabels = model.matrices.vlabels, model.matrices.clabels
+    columns = pd.DataFrame(np.nan, index=vlabels, columns=['reduced cost', 'cost lower', 'cost upper', 'bound lower', 'bound upper'])
+    rows = pd.DataFrame(np.nan, index=clabels, columns=['dual', 'rhs lower', 'rhs upper'])
+
+    if hasattr(solver_model, "getRanging"): # HiGHS
+        # Some highspy versions return longer arrays (columns and rows), keep the leading entries
+        n_cols, n_rows = solver_model.getNumCol(), solver_model.getNumRow()
+        solution = solver_model.getSolution()
+        columns['reduced cost'] = np.array(solution.col_dual)[:n_cols]
+        rows['dual'] = np.array(solution.row_dual)[:n_rows]
+        ranging = solver_model.getRanging()
+        ranging = ranging[1] if isinstance(ranging, tuple) else ranging
+        columns['cost lower'] = np.array(ranging.col_cost_dn.value_)[:n_cols]
+        columns['cost upper'] = np.array(ranging.col_cost_up.value_)[:n_cols]
+        columns['bound lower'] = np.array(ranging.col_bound_dn.value_)[:n_cols]
+        columns['bound upper'] = np.array(ranging.col_bound_up.value_)[:n_cols]
+        rows['rhs lower'] = np.array(ranging.row_bound_dn.value_)[:n_rows]
+        rows['rhs upper'] = np.array(ranging.row_bound_up.value_)[:n_rows]
+    elif hasattr(solver_model, "getAttr"): # Gurobi
+        variables, constraints = solver_model.getVars(), solver_model.getConstrs()
+        columns['reduced cost'] = solver_model.getAttr("RC", variables)
+        columns['cost lower'] = solver_model.getAttr("SAObjLow", variables)
+        columns['cost upper'] = solver_model.getAttr("SAObjUp", variables)
+        columns['bound lower'] = solver_model.getAttr("SALBLow", variables)
+        columns['bound upper'] = solver_model.getAttr("SAUBUp", variables)
+        rows['dual'] = solver_model.getAttr("Pi", constraints)
+        rows['rhs lower'] = solver_model.getAttr("SARHSLow", constraints)
+        rows['rhs upper'] = solver_model.getAttr("SARHSUp", constraints)
+    return columns, rows
+
+
+def capacity_sensitivities(network: pypsa.Network, columns: pd.DataFrame):
+    """ Capital cost and capacity sensitivities of the extendable components """
+    model = network.model
+    records = []
+    for component, attr in NOMINAL_ATTRS.items():
+        df = network.df(component)
+        ext_i = df.index[df[f"{attr}_extendable"]]
+        if len(ext_i) == 0:
+            continue
+        labels = model.variables[f"{component}-{attr}"].labels.sel({f"{component}-ext": ext_i}).values
+        ranges = columns.reindex(labels)
+        for name, (_, r) in zip(ext_i, ranges.iterrows()):
+            capacity = df.at[name, f"{attr}_opt"]
+            records.append({
+                'parameter'   : f"{component} {name} capital_cost",
+                'value'       : df.at[name, 'capital_cost'],
+                'sensitivity' : capacity, # d objective / d capital cost, EUR per EUR/MW
+                'lower'       : r['cost lower'],
+                'upper'       : r['cost upper'],
+            })
+            records.append({
+                'parameter'   : f"{component} {name} {attr}",
+                'value'       : capacity,
+                'sensitivity' : r['reduced cost'], # d objective / d forced capacity, EUR/MW
+                'lower'       : r['bound lower'],
+                'upper'       : r['bound upper'],
+            })
+    return records
+
+
+def global_constraint_sensitivities(network: pypsa.Network, rows: pd.DataFrame):
+    """ Duals and valid right-hand-side ranges of the global constraints (e.g. the CO2 limit) """
+    records = []
+    for name, gc in network.global_constraints.iterrows():
+        label = network.model.constraints[f"GlobalConstraint-{name}"].labels.item()
+        r = rows.reindex([label]).iloc[0]
+        records.append({
+            'parameter'   : f"GlobalConstraint {name} constant",
+            'value'       : gc.constant,
+            'sensitivity' : gc.mu, # d objective / d constant, e.g. EUR/tCO2
+            'lower'       : r['rhs lower'],
+            'upper'       : r['rhs upper'],
+        })
+    return records
+
+
+def cost_input_sensitivities(network: pypsa.Network, data: DataLoader, technologies: dict = TECHNOLOGY_COSTS):
+    """
+    Local sensitivities to the inputs of read_costs: OCGT fuel price and discount rate.
+
+    Both move many objective coefficients at once, so no solver range is available;
+    the sensitivities follow from the envelope theorem.
+    """
+    weights = network.snapshot_weightings.objective
+    ocgt = network.generators.loc["OCGT"]
+    gas_use = network.generators_t.p["OCGT"].mul(weights).sum() / ocgt.efficiency
+    records = [{
+        'parameter'   : "OCGT fuel",
+        'value'       : data.costs.at["OCGT", "fuel"],
+        'sensitivity' : gas_use, # d objective / d fuel price, MWh_th
+        'lower'       : np.nan,
+        'upper'       : np.nan,
+    }]
+
+    # d objective / d discount rate through the annuities of all extendable components
+    dr = 1e-4
+    sensitivity = 0.
+    for (component, name), (row, share) in technologies.items():
+        df = network.df(component)
+        attr = NOMINAL_ATTRS[component]
+        if name not in df.index or not df.at[name, f"{attr}_extendable"]:
+            continue
+        r, n = data.costs.at[row, "discount rate"], data.costs.at[row, "lifetime"]
+        d_annuity = (annuity(r + dr, n) - annuity(r - dr, n)) / (2 * dr)
+        sensitivity += df.at[name, f"{attr}_opt"] * share * data.costs.at[row, "investment"] * d_annuity
+    records.append({
+        'parameter'   : "discount rate",
+        'value'       : data.costs.loc[[row for row, _ in technologies.values()], "discount rate"].mean(),
+        'sensitivity' : sensitivity, # d objective / d discount rate, EUR per unit rate
+        'lower'       : np.nan,
+        'upper'       : np.nan,
+    })
+    return records
+
+
+def sensitivity_report(network: pypsa.Network, data: DataLoader | None = None):
+    """
+    Local sensitivities of the total system cost from a single solve.
+
+    Parameters:
+        network (pypsa.Network): Network solved with optimize_with_sensitivities.
+        data (DataLoader): Data used to build the network, for the cost-input sensitivities.
+
+    Returns:
+        pd.DataFrame: Per parameter its value, d objective / d parameter, the range over which
+                      the current solution stays optimal (where the solver reports it) and the
+                      first-order objective change for a 1% change of the parameter.
+    """
+    columns, rows = _solver_ranging(network)
+    records = capacity_sensitivities(network, columns) + global_constraint_sensitivities(network, rows)
+    if data is not None:
+        records += cost_input_sensitivities(network, data)
+
+    report = pd.DataFrame(records).set_index('parameter')
+    report['objective change per 1%'] = 0.01 * report['value'] * report['sensitivity']
+    return report
+
+
+if __name__ == "__main__":
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+
+    network = create_network(data)
+    network = add_storage(network, data)
+    network = add_co2_constraint(network, 4e6)
+    optimize_with_sensitivities(network)
+
+    report = sensitivity_report(network, data)
+    pd.set_option('display.width', 200)
+    print(report)
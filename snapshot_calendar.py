@@ -0,0 +1,83 @@
+import functools
+import hashlib
+import pathlib
+import numpy as np
+import pandas as pd
+
+CALENDAR_DIR = pathlib.Path(__file__).parent.resolve() / "cache" / "calendar"
+
+
+@functools.lru_cache(maxsize=None)
+def year_hours(year: int, drop_leap_day: bool = True):
+    """ Hourly UTC timestamps of a year, without 29 February by default """
+    hours = pd.date_range(f'{year}-01-01 00:00Z', f'{year}-12-31 23:00Z', freq='h')
+    if drop_leap_day:
+        hours = hours[~((hours.month == 2) & (hours.day == 29))]
+    return hours
+
+
+@functools.lru_cache(maxsize=None)
+def _leap_day_mask(year: int):
+    """ Boolean mask of the hours of a full year that are not on 29 February """
+    hours = year_hours(year, drop_leap_day=False)
+    return ~((hours.month == 2) & (hours.day == 29))
+
+
+def _source_key(path: pathlib.Path):
+    """ Cache key of a source file: its name, size and modification time """
+    stat = path.stat()
+    return hashlib.sha1(f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def _hourly_calendar(path: str, sep: str):
+    """
+    Row offsets of every year of an hourly CSV file, leap days dropped.
+
+    The timestamps are parsed once per file version and cached on disk, later
+    calls only load the integer offsets.
+    """
+    path = pathlib.Path(path)
+    cache_file = CALENDAR_DIR / f"{path.stem}_{_source_key(path)}.npz"
+    if cache_file.exists():
+        with np.load(cache_file) as offsets:
+            return {int(year): offsets[year] for year in offsets.files}
+
+    index = pd.to_datetime(pd.read_csv(path, sep=sep, usecols=[0]).iloc[:, 0], utc=True)
+    rows = np.arange(len(index))
+    keep = ~((index.dt.month == 2) & (index.dt.day == 29)).values
+    years = index.dt.year.values
+    offsets = {int(year): rows[keep & (years == year)].astype(np.int32) for year in np.unique(years)}
+
+    CALENDAR_DIR.mkdir(parents=True, exist_ok=True)
+    np.savez(cache_file, **{str(year): value for year, value in offsets.items()})
+    return offsets
+
+
+def hourly_offsets(path: str | pathlib.Path, year: int, sep: str = ';'):
+    """ Integer row offsets of a year in an hourly CSV file, without 29 February """
+    offsets = _hourly_calendar(str(path), sep).get(year)
+    if offsets is None or len(offsets) != len(year_hours(year)):
+        raise KeyError(f"{path} does not cover all hours of {year}")
+    return offsets
+
+
+def read_hourly_year(path: str | pathlib.Path, columns: list, year: int, sep: str = ';'):
+    """ Hourly values of the given columns for one year, without 29 February """
+    offsets = hourly_offsets(path, year, sep)
+    values = pd.read_csv(path, sep=sep, usecols=columns)[columns].values[offsets]
+    return pd.DataFrame(values, index=year_hours(year), columns=columns)
+
+
+def cyclic_offsets(anchor: str, cycle_length: int, year: int):
+    """
+    Offsets into a repeated hourly cycle that starts at `anchor`, for one year without 29 February.
+
+    Equivalent to indexing `np.tile(cycle, repeats)` placed on an hourly index starting
+    at `anchor`, without building that index.
+    """
+    start = (pd.Timestamp(f'{year}-01-01 00:00', tz='UTC') - pd.Timestamp(anchor, tz='UTC')) // pd.Timedelta(hours=1)
+    if start < 0:
+        raise KeyError(f"{year} is before the start of the cycle ({anchor})")
+    hours = start + np.arange(len(year_hours(year, drop_leap_day=False)))
+    return (hours % cycle_length)[_leap_day_mask(year)]
@@ -0,0 +1,299 @@
+import numpy as np
+import pandas as pd
+import pypsa
+from data_loader import DataLoader
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning, module="pypsa")
+
+# The demand data is national. Population of the largest metropolitan areas of mainland
+# Spain (millions, approximate) is used as the proxy that places the demand in space.
+DEMAND_CENTRES = pd.DataFrame(
+    [
+        ("Madrid",      40.42, -3.70, 6.8),
+        ("Barcelona",   41.39,  2.17, 5.7),
+        ("Valencia",    39.47, -0.38, 1.6),
+        ("Sevilla",     37.39, -5.98, 1.5),
+        ("Bilbao",      43.26, -2.93, 1.0),
+        ("Malaga",      36.72, -4.42, 1.0),
+        ("Asturias",    43.46, -5.84, 0.8),
+        ("Alicante",    38.35, -0.49, 0.8),
+        ("Zaragoza",    41.65, -0.89, 0.8),
+        ("Murcia",      37.99, -1.13, 0.7),
+        ("Vigo",        42.24, -8.72, 0.5),
+        ("Granada",     37.18, -3.60, 0.5),
+        ("A Coruna",    43.36, -8.41, 0.4),
+        ("Valladolid",  41.65, -4.72, 0.4),
+        ("Cadiz",       36.53, -6.29, 0.6),
+        ("San Sebastian", 43.32, -1.98, 0.4),
+    ],
+    columns=['name', 'lat', 'lon', 'population'],
+).set_index('name')
+
+LINK_COST_PER_KM = 442.1414 # EUR/(MW*km), as the interconnectors in f.py
+EARTH_RADIUS = 6371 # km
+
+
+def read_plants(data: DataLoader):
+    """ Hydro plants of the country with coordinates, as summed up by DataLoader.read_hydro_capacities """
+    plants = pd.read_csv(data.path + 'data/jrc-hydro-power-plant-database.csv', sep=',')
+    plants = plants[plants['country_code'] == data.country[:2]]
+    plants = plants[['name', 'installed_capacity_MW', 'type', 'storage_capacity_MWh', 'lat', 'lon']]
+    return plants.dropna(subset=['lat', 'lon']).fillna({'installed_capacity_MW': 0, 'storage_capacity_MWh': 0})
+
+
+def haversine(lat0, lon0, lat1, lon1):
+    """ Great-circle distance in km, element-wise """
+    lat0, lon0, lat1, lon1 = map(np.radians, (lat0, lon0, lat1, lon1))
+    a = np.sin((lat1 - lat0) / 2)**2 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2)**2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def _planar(lat, lon):
+    """ Equirectangular projection in km, good enough to cluster within one country """
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    scale = np.cos(np.radians(lat.mean())) if lat.size else 1.
+    return np.radians(np.column_stack([lon * scale, lat])) * EARTH_RADIUS
+
+
+def kmeans(points: np.ndarray, k: int, weights: np.ndarray | None = None, n_init: int = 10,
+           max_iter: int = 100, seed: int = 0):
+    """
+    Weighted k-means, vectorised over points and centres.
+
+    Parameters:
+        points (np.ndarray): Points x dimensions.
+        k (int): Number of clusters.
+        weights (np.ndarray): Weight of every point, equal weights by default.
+        n_init (int): Number of k-means++ initialisations, the lowest inertia is kept.
+
+    Returns:
+        np.ndarray: Cluster of every point.
+        np.ndarray: Cluster centres (k x dimensions).
+    """
+    rng = np.random.default_rng(seed)
+    weights = np.ones(len(points)) if weights is None else np.asarray(weights, dtype=float)
+    best = (np.inf, None, None)
+    for _ in range(n_init):
+        # k-means++ seeding, weighted by the point weights
+        centres = points[[rng.choice(len(points), p=weights / weights.sum())]]
+        for _ in range(1, k):
+            d2 = ((points[:, None, :] - centres[None, :, :])**2).sum(-1).min(1) * weights
+            centres = np.vstack([centres, points[rng.choice(len(points), p=d2 / d2.sum())]])
+
+        for _ in range(max_iter):
+            d2 = ((points[:, None, :] - centres[None, :, :])**2).sum(-1)
+            labels = d2.argmin(1)
+            one_hot = np.eye(k)[labels] * weights[:, None]
+            mass = one_hot.sum(0)
+            # Empty clusters keep their centre
+            updated = np.where(mass[:, None] > 0, one_hot.T @ points / np.maximum(mass, 1e-12)[:, None], centres)
+            if np.allclose(updated, centres):
+                break
+            centres = updated
+
+        inertia = (d2[np.arange(len(points)), labels] * weights).sum()
+        if inertia < best[0]:
+            best = (inertia, labels, centres)
+    return best[1], best[2]
+
+
+def cluster_regions(data: DataLoader, n_regions: int, demand_centres: pd.DataFrame = DEMAND_CENTRES, seed: int = 0):
+    """
+    Cluster the hydro plants and demand centres of the country into regions.
+
+    Plants (weighted by installed capacity) and demand centres (weighted by population)
+    carry the same total weight, so both the supply and the demand shape the regions.
+
+    Returns:
+        pd.DataFrame: Plants with their region.
+        pd.DataFrame: Demand centres with their region.
+        pd.DataFrame: Per region its centre (lat, lon), load share and hydro capacities.
+    """
+    plants, centres = read_plants(data).copy(), demand_centres.copy()
+    lat = np.concatenate([plants.lat.values, centres.lat.values])
+    lon = np.concatenate([plants.lon.values, centres.lon.values])
+    capacity = plants.installed_capacity_MW.values.astype(float) + 1 # plants without capacity still count
+    population = centres.population.values.astype(float)
+    weights = np.concatenate([capacity / capacity.sum(), population / population.sum()])
+
+    labels, _ = kmeans(_planar(lat, lon), n_regions, weights, seed=seed)
+    plants['region'], centres['region'] = labels[:len(plants)], labels[len(plants):]
+
+    # Weighted geographic centre of every region
+    regions = pd.DataFrame({'lat': lat, 'lon': lon, 'weight': weights, 'region': labels})
+    regions[['lat', 'lon']] = regions[['lat', 'lon']].mul(regions.weight, axis=0)
+    regions = regions.groupby('region').sum()
+    regions[['lat', 'lon']] = regions[['lat', 'lon']].div(regions.weight, axis=0)
+    regions = regions.drop(columns='weight').reindex(range(n_regions))
+
+    regions['load_share'] = centres.groupby('region').population.sum().reindex(regions.index).fillna(0) / population.sum()
+    for kind, name in [('HDAM', 'dammed_hydro'), ('HPHS', 'pumped_hydro')]:
+        by_region = plants[plants.type == kind].groupby('region')
+        regions[f'{name}_power'] = by_region.installed_capacity_MW.sum().reindex(regions.index).fillna(0)
+        regions[f'{name}_storage'] = by_region.storage_capacity_MWh.sum().reindex(regions.index).fillna(0)
+    return plants, centres, regions.dropna(subset=['lat', 'lon'])
+
+
+def neighbouring_regions(regions: pd.DataFrame):
+    """ Pairs of regions sharing an edge of the Delaunay triangulation of their centres """
+    index = list(regions.index)
+    if len(index) < 2:
+        return []
+    if len(index) < 4:
+        return [(a, b) for i, a in enumerate(index) for b in index[i+1:]]
+    from scipy.spatial import Delaunay
+    triangulation = Delaunay(_planar(regions.lat.values, regions.lon.values))
+    pairs = {tuple(sorted((index[a], index[b]))) for simplex in triangulation.simplices
+             for a, b in [(simplex[0], simplex[1]), (simplex[1], simplex[2]), (simplex[0], simplex[2])]}
+    return sorted(pairs)
+
+
+def create_clustered_network(data: DataLoader, n_regions: int, seed: int = 0):
+    """
+    N-bus version of a.create_network with extendable inter-regional links.
+
+    Every region gets a share of the national load, its own extendable wind, solar and OCGT
+    and the dammed hydro plants located in it. Capacity factors and hydro inflow are only
+    available nationally; the inflow is split in proportion to the dammed hydro power.
+    With n_regions=1 the network matches a.create_network up to component names.
+    """
+    _, _, regions = cluster_regions(data, n_regions, seed=seed)
+
+    network = pypsa.Network()
+    network.set_snapshots(data.dates.values)
+
+    network.add("Carrier", "gas", co2_emissions=0.198) # in t_CO2/MWh_th
+    network.add("Carrier", "AC", co2_emissions=0)
+    network.add("Carrier", "onshore wind")
+    network.add("Carrier", "solar")
+    network.add("Carrier", "Water")
+
+    hydro_share = regions.dammed_hydro_power / regions.dammed_hydro_power.sum()
+    inflow = data.cf_hydro.values
+    for region, r in regions.iterrows():
+        bus = f"electricity bus {region}"
+        network.add("Bus", bus, y=r.lat, x=r.lon, carrier="AC")
+        network.add("Load", f"load {region}", bus=bus, p_set=r.load_share * data.p_d[data.country].values)
+
+        for name, carrier, cost, cf in [
+            ("onshore wind", "onshore wind", "onwind", data.cf_onw[data.country].values),
+            ("solar", "solar", "solar", data.cf_solar[data.country].values),
+        ]:
+            network.add(
+                "Generator",
+                f"{name} {region}",
+                bus=bus,
+                p_nom_extendable=True,
+                carrier=carrier,
+                capital_cost=data.costs.at[cost, "capital_cost"],
+                marginal_cost=data.costs.at[cost, "marginal_cost"],
+                p_max_pu=cf,
+            )
+        network.add(
+            "Generator",
+            f"OCGT {region}",
+            bus=bus,
+            p_nom_extendable=True,
+            carrier="gas",
+            capital_cost=data.costs.at["OCGT", "capital_cost"],
+            marginal_cost=data.costs.at["OCGT", "marginal_cost"],
+            efficiency=data.costs.at["OCGT", "efficiency"],
+        )
+
+        if r.dammed_hydro_power == 0:
+            continue
+        network.add("Bus", f"DamWater {region}", y=r.lat, x=r.lon, carrier="Water")
+        network.add(
+            "Generator",
+            f"Rain to DamWater {region}",
+            bus=f"DamWater {region}",
+            p_nom=hydro_share[region] * max(inflow),
+            carrier="Water",
+            p_max_pu=inflow / max(inflow),
+        )
+        network.add("Store", f"DamReservoir {region}", bus=f"DamWater {region}", e_nom=r.dammed_hydro_storage, e_cyclic=True)
+        network.add(
+            "Link",
+            f"HDAM {region}",
+            bus0=f"DamWater {region}",
+            bus1=bus,
+            p_nom=r.dammed_hydro_power,
+            capital_cost=data.costs.at["hydro", "capital_cost"],
+            marginal_cost=data.costs.at["hydro", "marginal_cost"],
+            efficiency=data.costs.at["hydro", "efficiency"],
+        )
+
+    for a, b in neighbouring_regions(regions):
+        length = haversine(regions.at[a, 'lat'], regions.at[a, 'lon'], regions.at[b, 'lat'], regions.at[b, 'lon'])
+        network.add(
+            "Link",
+            f"interconnector {a}-{b}",
+            bus0=f"electricity bus {a}",
+            bus1=f"electricity bus {b}",
+            p_nom_extendable=True,
+            p_min_pu=-1, # transport model, flows in both directions
+            length=length,
+            capital_cost=LINK_COST_PER_KM * length,
+            carrier="AC",
+        )
+    return network
+
+
+def _benchmark_one(n_regions: int, solver_name: str):
+    """ Build and solve one resolution, in its own process so the peak memory is its own """
+    import resource
+    import time
+    data = DataLoader(country="ESP", discount_rate=0.07)
+    start = time.perf_counter()
+    network = create_clustered_network(data, n_regions)
+    build_time = time.perf_counter() - start
+    model = network.optimize.create_model()
+    n_variables, n_constraints = model.nvars, model.ncons
+    start = time.perf_counter()
+    status, _ = network.optimize.solve_model(solver_name=solver_name)
+    solve_time = time.perf_counter() - start
+    return {
+        'regions'          : n_regions,
+        'buses'            : len(network.buses),
+        'interconnectors'  : network.links.index.str.startswith("interconnector").sum(),
+        'variables'        : n_variables,
+        'constraints'      : n_constraints,
+        'build [s]'        : build_time,
+        'solve [s]'        : solve_time,
+        'peak memory [MB]' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'status'           : status,
+        'objective [M€]'   : network.objective / 1e6 if status == "ok" else np.nan,
+    }
+
+
+def benchmark_resolutions(resolutions: tuple = (1, 2, 4, 8, 16), solver_name: str = "highs", budget: float | None = None):
+    """
+    Solve time and peak memory of the clustered network as the number of regions grows.
+
+    Parameters:
+        resolutions (tuple): Numbers of regions to benchmark, in increasing order.
+        budget (float): Solve time budget in seconds; larger resolutions are skipped once it is exceeded.
+
+    Returns:
+        pd.DataFrame: One row per number of regions.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    rows = []
+    for n_regions in resolutions:
+        # fresh spawned process per resolution: peak memory is per solve, and forking would inherit linopy's thread state
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            rows.append(pool.submit(_benchmark_one, n_regions, solver_name).result())
+        print(rows[-1])
+        if budget is not None and rows[-1]['solve [s]'] > budget:
+            break
+    return pd.DataFrame(rows).set_index('regions')
+
+
+if __name__ == "__main__":
+    report = benchmark_resolutions(budget=600)
+    pd.set_option('display.width', 200)
+    print(report)
+    within = report[report['solve [s]'] <= 600]
+    if len(within):
+        print(f"Highest spatial detail within a 600 s solve budget: {within.index.max()} regions")
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import pathlib
+import time
+import traceback
+import pandas as pd
+import pypsa
+
+SWEEP_DIR = pathlib.Path(__file__).parent.resolve() / "sweeps"
+
+# Solver profiles tried in order, a failed scenario is retried with the next profile
+SOLVER_PROFILES = [
+    {'solver_name': 'highs', 'solver_options': {}},
+    {'solver_name': 'highs', 'solver_options': {'solver': 'ipm', 'run_crossover': 'on'}},
+    {'solver_name': 'highs', 'solver_options': {'solver': 'simplex', 'simplex_strategy': 4}},
+]
+
+
+def extract_results(network: pypsa.Network):
+    """ Capacities, objective and duals of the global constraints of a solved network """
+    return {
+        'objective'  : network.objective,
+        'capacities' : {
+            'Generator' : network.generators.p_nom_opt.to_dict(),
+            'Link'      : network.links.p_nom_opt.to_dict(),
+            'Store'     : network.stores.e_nom_opt.to_dict(),
+            'Line'      : network.lines.s_nom_opt.to_dict(),
+        },
+        'duals'      : network.global_constraints.mu.to_dict(),
+    }
+
+
+def default_solve(network: pypsa.Network, **profile):
+    """ Solve with network.optimize() using the options of a solver profile """
+    return network.optimize(**profile)
+
+
+def input_hash(*inputs):
+    """ Content hash of the inputs of a scenario: build arguments, sampled parameters, solver options, ... """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def scenario_hashes(scenarios: dict, profiles: list = SOLVER_PROFILES, inputs=None):
+    """ Input hash of every scenario, as stored in the records of run_sweep() """
+    return {key: input_hash(params, profiles, inputs) for key, params in scenarios.items()}
+
+
+def read_log(log_file: str | pathlib.Path):
+    """ All records of a sweep log, oldest first """
+    log_file = pathlib.Path(log_file)
+    if not log_file.exists():
+        return []
+    records = []
+    with open(log_file) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A crash while writing can leave a truncated last line behind
+                continue
+    return records
+
+
+def append_record(log_file: str | pathlib.Path, record: dict):
+    """ Append a record and force it to disk before the next scenario starts """
+    with open(log_file, 'a') as f:
+        f.write(json.dumps(record, default=float) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def run_sweep(
+        scenarios: dict,
+        build,
+        log_file: str | pathlib.Path,
+        extract=extract_results,
+        solve=default_solve,
+        profiles: list = SOLVER_PROFILES,
+        callback=None,
+        inputs=None,
+    ):
+    """
+    Solve a set of scenarios, logging every finished scenario to an append-only file.
+
+    Every record holds a hash of the scenario's inputs (its parameters, the solver profiles and
+    `inputs`). On resume a scenario is only skipped if a solved record with the same hash exists,
+    so a log written with other parameters or solver options is not reused.
+
+    Parameters:
+        scenarios (dict): Scenario key (str) -> parameters passed to `build`.
+        build (callable): Creates the network of a scenario from its parameters.
+        log_file (str | pathlib.Path): JSON-lines log, reused to resume an interrupted sweep.
+        extract (callable): Results stored for a solved network.
+        solve (callable): Solves the network with the keyword arguments of a solver profile.
+        profiles (list): Solver profiles, failed scenarios are retried with the next one.
+        callback (callable): Called as callback(key, network) for every solved scenario
+                             before it is logged, e.g. to store its time series.
+        inputs: Further inputs shared by all scenarios that invalidate the log when they change,
+                e.g. a data or code version. Must be JSON-serialisable (or str-convertible).
+
+    Returns:
+        pd.DataFrame: Status of every scenario after the sweep.
+    """
+    log_file = pathlib.Path(log_file)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    records = read_log(log_file)
+    completed = {(r['scenario'], r.get('inputs')) for r in records if r['status'] == 'ok'}
+    failures = {}
+    for r in records:
+        if r['status'] != 'ok':
+            failures[r['scenario'], r.get('inputs')] = failures.get((r['scenario'], r.get('inputs')), 0) + 1
+
+    digests = scenario_hashes(scenarios, profiles, inputs)
+    for key, params in scenarios.items():
+        digest = digests[key]
+        if (key, digest) in completed:
+            continue
+        for attempt in range(failures.get((key, digest), 0), len(profiles)):
+            profile = profiles[attempt]
+            start = time.perf_counter()
+            record = {'scenario': key, 'parameters': params, 'inputs': digest, 'profile': attempt}
+            try:
+                network = build(params)
+                status, condition = solve(network, **profile)
+                record.update(status=status, condition=condition)
+                if status == 'ok':
+                    record.update(extract(network))
+                    if callback is not None:
+                        callback(key, network)
+            except Exception:
+                record.update(status='error', condition=traceback.format_exc(limit=3))
+            record['time'] = time.perf_counter() - start
+            append_record(log_file, record)
+            if record['status'] == 'ok':
+                break
+
+    return sweep_status(log_file)
+
+
+def sweep_status(log_file: str | pathlib.Path):
+    """ Latest status, solver profile and solve time of every scenario in a log """
+    records = read_log(log_file)
+    if not records:
+        return pd.DataFrame(columns=['status', 'condition', 'profile', 'time'])
+    status = pd.DataFrame(records).groupby('scenario').last()
+    return status[['status', 'condition', 'profile', 'time']]
+
+
+def load_results(log_file: str | pathlib.Path, scenarios: dict | None = None, profiles: list = SOLVER_PROFILES, inputs=None):
+    """
+    Results of the solved scenarios, keyed by scenario and in the order of `scenarios`.
+
+    Only records whose input hash matches the current parameters, solver profiles and `inputs`
+    (the arguments given to run_sweep) are returned, so stale results of a scenario solved with
+    other inputs are never mixed in. Without `scenarios`, the latest solved record of every
+    scenario in the log is returned.
+    """
+    records = [r for r in read_log(log_file) if r['status'] == 'ok']
+    if scenarios is None:
+        return {r['scenario']: r for r in records}
+    digests = scenario_hashes(scenarios, profiles, inputs)
+    results = {r['scenario']: r for r in records if r.get('inputs') == digests.get(r['scenario'])}
+    return {key: results[key] for key in scenarios if key in results}
+
+
+def load_mixes(log_file: str | pathlib.Path, generators: list, links: list, scenarios: dict | None = None,
+               profiles: list = SOLVER_PROFILES, inputs=None):
+    """ Capacity mixes in the layout expected by the results_plotter functions, see load_results() """
+    return [
+        [r['capacities']['Generator'][gen] for gen in generators] + [r['capacities']['Link'][link] for link in links]
+        for r in load_results(log_file, scenarios, profiles, inputs).values()
+    ]
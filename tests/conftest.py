@@ -0,0 +1,30 @@
+import pathlib
+import sys
+import pandas as pd
+import pypsa
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+
+def build_small_network(gas_cost: float = 70., battery_marginal_cost: float = 0.):
+    """ One bus, a day of hourly snapshots, solar, gas and a battery store """
+    network = pypsa.Network()
+    network.set_snapshots(pd.date_range("2015-01-01", periods=24, freq="h"))
+    network.add("Carrier", "gas", co2_emissions=0.2)
+    network.add("Carrier", ["solar", "battery"])
+    network.add("Bus", "electricity bus")
+    network.add("Load", "load", bus="electricity bus", p_set=[800 + 10 * h for h in range(24)])
+    solar = [max(0., 1 - abs(h - 12) / 6) for h in range(24)]
+    network.add("Generator", "solar", bus="electricity bus", carrier="solar", p_nom_extendable=True,
+                p_max_pu=solar, capital_cost=60.)
+    network.add("Generator", "OCGT", bus="electricity bus", carrier="gas", p_nom_extendable=True,
+                capital_cost=40., marginal_cost=gas_cost, efficiency=0.4)
+    network.add("Store", "Battery", bus="electricity bus", carrier="battery", e_nom_extendable=True, e_cyclic=True,
+                capital_cost=10., marginal_cost=battery_marginal_cost)
+    return network
+
+
+@pytest.fixture
+def small_network():
+    return build_small_network
@@ -0,0 +1,17 @@
+import pytest
+import bound_tightening
+from bound_tightening import derive_bounds, optimize_tightened
+
+
+def test_binding_bounds_are_dropped(small_network, monkeypatch):
+    direct = small_network()
+    direct.optimize()
+
+    # Half the safety margin cuts into the optimal battery, the re-solve must drop that bound
+    monkeypatch.setattr(bound_tightening, "derive_bounds", lambda network: derive_bounds(network, margin=0.5))
+    network = small_network()
+    with pytest.warns(UserWarning, match="Battery"):
+        status, _ = optimize_tightened(network)
+    assert status == "ok"
+    assert network.objective == pytest.approx(direct.objective, rel=1e-6)
+    assert network.stores.at["Battery", "e_nom_max"] == direct.stores.at["Battery", "e_nom_max"]
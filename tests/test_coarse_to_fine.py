@@ -0,0 +1,22 @@
+import pytest
+from coarse_to_fine import coarse_to_fine
+
+
+def test_bound_mode_reports_gap_to_direct(small_network):
+    direct = small_network()
+    direct.optimize()
+
+    network = small_network()
+    iterations = coarse_to_fine(network, resolutions=(6, 3), gap_tolerance=0.5, direct_cost=direct.objective)
+    assert list(iterations['status']) == ["ok"]
+    assert iterations['gap to direct'].iloc[-1] == pytest.approx(network.objective / direct.objective - 1)
+    assert network.objective >= direct.objective * (1 - 1e-6)
+    assert network.objective_constant == pytest.approx(direct.objective_constant)
+
+
+def test_fix_mode_falls_back_to_full_resolution(small_network):
+    # The coarse mixes miss the hourly peak of the load, fixing them is infeasible without load shedding
+    network = small_network()
+    iterations = coarse_to_fine(network, resolutions=(6, 3), mode="fix")
+    assert list(iterations['hours']) == [6, 3, 1]
+    assert iterations['status'].iloc[-1] == "ok"
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from dispatch_simulator import STORAGES, simulate_dispatch
+
+
+def _fleet(**capacities):
+    fleet = {'onshore wind': 0., 'solar': 0., 'OCGT': 0., 'OCGT efficiency': 0.4,
+             'HDAM': 0., 'HDAM efficiency': 0.9, 'DamReservoir': 0.}
+    for storage in STORAGES:
+        fleet.update({f'{storage} charge': 0., f'{storage} discharge': 0., f'{storage} energy': 0.,
+                      f'{storage} charge efficiency': 0.9, f'{storage} discharge efficiency': 0.9})
+    fleet.update(capacities)
+    return fleet
+
+
+def _profiles(demand, solar):
+    return {'demand': np.array(demand, dtype=float), 'onshore wind': np.zeros(len(demand)),
+            'solar': np.array(solar, dtype=float), 'inflow': np.zeros(len(demand))}
+
+
+def test_discharge_is_limited_by_link_input():
+    # 100 MW of discharge capacity draws 100 MW from the store and delivers 90 MW
+    fleet = _fleet(**{'battery discharge': 100., 'battery energy': 1000.})
+    results = simulate_dispatch(fleet, _profiles([200.], [0.]), initial_soc=1., cycles=1, hourly=True)
+    assert results['series']['battery discharge'][0, 0] == pytest.approx(90.)
+
+
+def test_drawdown_of_initial_storage_is_unserved():
+    # Nothing recharges the battery, so the energy taken from its initial level was never paid for
+    fleet = _fleet(**{'battery discharge': 100., 'battery energy': 100.})
+    results = simulate_dispatch(fleet, _profiles([50., 50.], [0., 0.]), cycles=1)
+    assert results['storage drawdown'][0] == pytest.approx(45.)
+    assert results['unserved'][0] == pytest.approx(100.)
+
+    # Cycling settles on the empty battery, which serves nothing
+    results = simulate_dispatch(fleet, _profiles([50., 50.], [0., 0.]))
+    assert results['storage drawdown'][0] == pytest.approx(0.)
+    assert results['unserved'][0] == pytest.approx(100.)
+
+
+def test_cycling_recharges_to_the_initial_level():
+    # Solar surplus in the second hour refills what the first hour used
+    fleet = _fleet(**{'solar': 100., 'battery charge': 100., 'battery discharge': 100., 'battery energy': 100.})
+    results = simulate_dispatch(fleet, _profiles([40., 0.], [0., 1.]))
+    assert results['storage drawdown'][0] == pytest.approx(0.)
+    assert results['unserved'][0] == pytest.approx(0.)
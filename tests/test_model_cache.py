@@ -0,0 +1,32 @@
+import pytest
+from model_cache import load_or_create_model, optimize_cached
+
+
+def test_optimize_cached_twice(small_network, tmp_path):
+    network = small_network()
+    assert optimize_cached(network, cache_dir=tmp_path)[0] == "ok"
+
+    # Same structure, other gas cost: the cached model is patched
+    network = small_network(gas_cost=90.)
+    status, _ = optimize_cached(network, cache_dir=tmp_path)
+    reference = small_network(gas_cost=90.)
+    reference.optimize()
+    assert status == "ok"
+    assert network.objective == pytest.approx(reference.objective, rel=1e-6)
+
+
+def test_cost_change_is_patched(small_network, tmp_path):
+    assert load_or_create_model(small_network(), cache_dir=tmp_path) is None
+    assert load_or_create_model(small_network(gas_cost=90.), cache_dir=tmp_path) == ['costs']
+
+
+def test_new_cost_term_rebuilds(small_network, tmp_path):
+    optimize_cached(small_network(), cache_dir=tmp_path)
+
+    # The battery marginal cost was zero, so its term is missing from the cached objective
+    network = small_network(battery_marginal_cost=5.)
+    assert load_or_create_model(network, cache_dir=tmp_path) is None
+    network.optimize.solve_model()
+    reference = small_network(battery_marginal_cost=5.)
+    reference.optimize()
+    assert network.objective == pytest.approx(reference.objective, rel=1e-6)
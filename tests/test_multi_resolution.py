@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pypsa
+import pytest
+from multi_resolution import optimize_multi_resolution, expand_to_horizon
+
+
+def build_seasonal_network(days: int = 10):
+    """ Solar with a varying daily yield, a battery and a seasonal hydrogen store """
+    network = pypsa.Network()
+    network.set_snapshots(pd.date_range("2015-01-01", periods=24 * days, freq="h"))
+    network.add("Carrier", ["gas", "solar", "H2", "battery"])
+    network.add("Bus", "electricity bus")
+    network.add("Bus", "H2", carrier="H2")
+    hours = np.arange(len(network.snapshots))
+    day = hours // 24
+    solar = np.clip(1 - abs(hours % 24 - 12) / 6, 0, None) * (0.5 + 0.5 * np.cos(day / 2))
+    network.add("Load", "load", bus="electricity bus", p_set=800 + 100 * np.sin(day / 2))
+    network.add("Generator", "solar", bus="electricity bus", carrier="solar", p_nom_extendable=True,
+                p_max_pu=solar, capital_cost=60.)
+    network.add("Generator", "OCGT", bus="electricity bus", carrier="gas", p_nom_extendable=True,
+                capital_cost=40., marginal_cost=120.)
+    network.add("Store", "Battery", bus="electricity bus", carrier="battery", e_nom_extendable=True,
+                e_cyclic=True, capital_cost=10.)
+    network.add("Store", "H2 Storage", bus="H2", carrier="H2", e_nom_extendable=True, e_cyclic=True, capital_cost=0.5)
+    network.add("Link", "H2 Electrolysis", bus0="electricity bus", bus1="H2", p_nom_extendable=True,
+                efficiency=0.7, capital_cost=20.)
+    network.add("Link", "H2 Fuel Cell", bus0="H2", bus1="electricity bus", p_nom_extendable=True,
+                efficiency=0.5, capital_cost=20.)
+    return network
+
+
+def test_every_day_representative():
+    # With every day its own period only the battery is restricted (cyclic within each day)
+    full = build_seasonal_network()
+    full.optimize()
+    network = build_seasonal_network()
+    reduced, assignment = optimize_multi_resolution(network, n_periods=10)
+    expand_to_horizon(reduced, network, assignment)
+    assert network.objective >= full.objective * (1 - 1e-6)
+    assert network.objective == pytest.approx(full.objective, rel=0.02)
+    assert (network.stores_t.e['H2 Storage'] >= -1e-3).all()
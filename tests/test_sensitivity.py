@@ -0,0 +1,14 @@
+import numpy as np
+from sensitivity import optimize_with_sensitivities, sensitivity_report
+
+
+def test_sensitivity_report(small_network):
+    network = small_network()
+    assert optimize_with_sensitivities(network)[0] == "ok"
+    report = sensitivity_report(network)
+
+    solar = report.loc["Generator solar capital_cost"]
+    assert solar['sensitivity'] == network.generators.at["solar", "p_nom_opt"]
+    # The current solution stays optimal for small changes of the solar capital cost
+    assert solar['lower'] <= solar['value'] <= solar['upper']
+    assert np.isfinite(report[['lower', 'upper']].loc["Generator solar capital_cost"]).all()
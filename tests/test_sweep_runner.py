@@ -0,0 +1,18 @@
+from sweep_runner import run_sweep, load_results
+
+
+def _extract(network):
+    return {'objective': network.objective}
+
+
+def test_load_results_ignores_stale_inputs(small_network, tmp_path):
+    log_file = tmp_path / "sweep.jsonl"
+    scenarios = {f"gas={cost}": cost for cost in [50., 90.]}
+    build = lambda cost: small_network(gas_cost=cost)
+    run_sweep(scenarios, build, log_file, extract=_extract, inputs="v1")
+    assert list(load_results(log_file, scenarios, inputs="v1")) == list(scenarios)
+
+    # Records of the previous inputs version are not returned for the new one
+    assert load_results(log_file, scenarios, inputs="v2") == {}
+    run_sweep({"gas=90.0": 90.}, build, log_file, extract=_extract, inputs="v2")
+    assert list(load_results(log_file, scenarios, inputs="v2")) == ["gas=90.0"]
@@ -0,0 +1,130 @@
+import pathlib
+import time
+import numpy as np
+import pandas as pd
+import pypsa
+
+WARM_START_DIR = pathlib.Path(__file__).parent.resolve() / "cache" / "bases"
+
+
+def order_scenarios(features: pd.DataFrame, start=None):
+    """
+    Order scenarios so that consecutive ones are similar (greedy nearest neighbour).
+
+    Parameters:
+        features (pd.DataFrame): One row per scenario, e.g. the CO2 limit or the
+                                 weather_years.year_statistics of each year.
+        start: Scenario to start from, defaults to the one closest to the mean.
+
+    Returns:
+        list: Scenario keys in solve order.
+    """
+    x = features.values.astype(float)
+    x = (x - x.mean(axis=0)) / np.where(x.std(axis=0) > 0, x.std(axis=0), 1)
+    distances = np.linalg.norm(x[:, None, :] - x[None, :, :], axis=2)
+
+    current = features.index.get_loc(start) if start is not None else int(np.linalg.norm(x, axis=1).argmin())
+    order = [current]
+    visited = np.zeros(len(x), dtype=bool)
+    visited[current] = True
+    for _ in range(len(x) - 1):
+        current = int(np.where(visited, np.inf, distances[current]).argmin())
+        order.append(current)
+        visited[current] = True
+    return list(features.index[order])
+
+
+def solver_statistics(network: pypsa.Network):
+    """ Iteration counts and solver run time of the last solve, where the solver exposes them """
+    solver_model = getattr(network.model, "solver_model", None)
+    stats = {'simplex iterations': np.nan, 'barrier iterations': np.nan, 'solver time': np.nan}
+    if solver_model is None:
+        return stats
+    if hasattr(solver_model, "getInfo"): # HiGHS
+        info = solver_model.getInfo()
+        stats['simplex iterations'] = info.simplex_iteration_count
+        stats['barrier iterations'] = info.ipm_iteration_count
+        stats['solver time'] = solver_model.getRunTime()
+    elif hasattr(solver_model, "IterCount"): # Gurobi
+        stats['simplex iterations'] = solver_model.IterCount
+        stats['barrier iterations'] = solver_model.BarIterCount
+        stats['solver time'] = solver_model.Runtime
+    return stats
+
+
+def _optimize(network: pypsa.Network, **kwargs):
+    """ Default solve: network.optimize() with the warm-start file arguments """
+    return network.optimize(**kwargs)
+
+
+class WarmStartSolver:
+    """
+    Solve function for consecutive scenarios that seeds each solve with the basis of the
+    previous one (HiGHS and Gurobi through linopy's basis_fn / warmstart_fn).
+
+    The instance is passed as `solve` to sweep_runner.run_sweep or called directly. A basis
+    is only reused between networks with the same model structure, e.g. different weather
+    years or CO2 limits of the same builder.
+    """
+
+    def __init__(self, solve=_optimize, basis_dir: pathlib.Path = WARM_START_DIR, compare: bool = False):
+        self.solve = solve
+        self.basis_dir = pathlib.Path(basis_dir)
+        self.basis_dir.mkdir(parents=True, exist_ok=True)
+        self.compare = compare
+        self.previous = None
+        self.records = []
+
+    def _solve(self, network: pypsa.Network, warmstart_fn, basis_fn, **profile):
+        kwargs = dict(profile, basis_fn=str(basis_fn))
+        if warmstart_fn is not None:
+            kwargs['warmstart_fn'] = str(warmstart_fn)
+        start = time.perf_counter()
+        status, condition = self.solve(network, **kwargs)
+        stats = solver_statistics(network)
+        stats['total time'] = time.perf_counter() - start
+        return status, condition, stats
+
+    def __call__(self, network: pypsa.Network, **profile):
+        basis_fn = self.basis_dir / f"basis_{len(self.records)}.bas"
+        record = {'warm started': self.previous is not None}
+
+        if self.compare and self.previous is not None:
+            # Cold reference solve on a copy, so the warm solve below writes the network results
+            _, _, cold = self._solve(network.copy(), None, self.basis_dir / "cold.bas", **profile)
+            record.update({f"{key} (cold)": value for key, value in cold.items()})
+
+        status, condition, warm = self._solve(network, self.previous, basis_fn, **profile)
+        record.update(warm)
+        self.records.append(record)
+        if status == "ok":
+            self.previous = basis_fn
+        return status, condition
+
+    def report(self, labels: list | None = None):
+        """ Per-scenario iterations and times, with the savings against cold solves if compared """
+        report = pd.DataFrame(self.records, index=labels)
+        if self.compare:
+            for key in ['simplex iterations', 'solver time', 'total time']:
+                report[f"{key} saving"] = 1 - report[key] / report[f"{key} (cold)"]
+        return report
+
+
+if __name__ == "__main__":
+    from data_loader import DataLoader
+    from a import create_network
+    from b import add_co2_constraint
+    from d import add_storage
+
+    data = DataLoader(country="ESP", discount_rate=0.07)
+
+    co2_limits = pd.DataFrame({'co2 limit': [50e6, 4e6, 20e6, 0, 8e6, 2e6, 12e6, 16e6]})
+    order = order_scenarios(co2_limits, start=co2_limits['co2 limit'].idxmax())
+
+    solver = WarmStartSolver(compare=True)
+    for ix in order:
+        network = create_network(data)
+        network = add_storage(network, data)
+        network = add_co2_constraint(network, co2_limits.at[ix, 'co2 limit'])
+        solver(network)
+    print(solver.report(labels=co2_limits.loc[order, 'co2 limit'].div(1e6).values).round(2))
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+from data_loader import DataLoader
+
+# Quantiles of the residual-load duration curve used to characterise a year
+RLDC_QUANTILES = np.linspace(0, 1, 11)
+
+
+def longest_run(mask: np.ndarray):
+    """ Length of the longest run of True values along the last axis """
+    mask = np.atleast_2d(mask).astype(int)
+    padded = np.pad(mask, ((0, 0), (1, 1)))
+    edges = np.diff(padded, axis=1)
+    runs = []
+    for starts, ends in zip(edges == 1, edges == -1):
+        lengths = np.flatnonzero(ends) - np.flatnonzero(starts)
+        runs.append(lengths.max() if len(lengths) > 0 else 0)
+    return np.array(runs)
+
+
+def year_statistics(
+        datas: dict,
+        wind_share: float = 0.4,
+        solar_share: float = 0.3,
+        dunkelflaute_threshold: float = 0.1,
+    ):
+    """
+    Cheap statistics characterising each weather year.
+
+    Parameters:
+        datas (dict): Weather year -> DataLoader.
+        wind_share (float): Share of the mean annual demand covered by wind in the reference fleet.
+        solar_share (float): Share of the mean annual demand covered by solar in the reference fleet.
+        dunkelflaute_threshold (float): Daily mean VRE capacity factor below which hours count as dunkelflaute.
+
+    Returns:
+        pd.DataFrame: One row per year with annual yields, the longest dunkelflaute (hours)
+                      and the quantiles of the residual-load duration curve (MW).
+    """
+    years = list(datas)
+    country = datas[years[0]].country
+    demand = np.vstack([datas[y].p_d[country].values for y in years])
+    wind = np.vstack([datas[y].cf_onw[country].values for y in years])
+    solar = np.vstack([datas[y].cf_solar[country].values for y in years])
+    inflow = np.vstack([datas[y].cf_hydro.values for y in years])
+
+    # Reference fleet sized on the average year, identical for every year
+    wind_capacity = wind_share * demand.mean() / wind.mean()
+    solar_capacity = solar_share * demand.mean() / solar.mean()
+    residual = demand - wind_capacity * wind - solar_capacity * solar
+
+    vre = (wind_capacity * wind + solar_capacity * solar) / (wind_capacity + solar_capacity)
+    kernel = np.ones(24) / 24
+    daily_vre = np.apply_along_axis(lambda x: np.convolve(x, kernel, mode='same'), 1, vre)
+
+    stats = pd.DataFrame({
+        'wind yield'   : wind.mean(axis=1),
+        'solar yield'  : solar.mean(axis=1),
+        'hydro inflow' : inflow.sum(axis=1),
+        'dunkelflaute' : longest_run(daily_vre < dunkelflaute_threshold),
+    }, index=pd.Index(years, name='year'))
+    rldc = np.quantile(residual, RLDC_QUANTILES, axis=1).T
+    for q, values in zip(RLDC_QUANTILES, rldc.T):
+        stats[f'residual load q{int(q * 100)}'] = values
+    return stats
+
+
+def _standardise(stats: pd.DataFrame):
+    std = stats.std().replace(0, 1)
+    return ((stats - stats.mean()) / std).values
+
+
+def k_medoids(x: np.ndarray, k: int, n_iter: int = 100, seed: int = 0):
+    """ Vectorised k-medoids on the rows of x, returns medoid indices and cluster labels """
+    distances = np.linalg.norm(x[:, None, :] - x[None, :, :], axis=2)
+    rng = np.random.default_rng(seed)
+    medoids = rng.choice(len(x), size=k, replace=False)
+    for _ in range(n_iter):
+        labels = distances[:, medoids].argmin(axis=1)
+        # The new medoid of a cluster minimises the summed distance to its members
+        costs = np.where(labels[None, :] == labels[:, None], distances, 0).sum(axis=1)
+        new = np.array([np.flatnonzero(labels == j)[costs[labels == j].argmin()] for j in range(k)])
+        if set(new) == set(medoids):
+            break
+        medoids = new
+    labels = distances[:, medoids].argmin(axis=1)
+    return medoids, labels
+
+
+def select_years(stats: pd.DataFrame, k: int = 5, extremes: list | None = None, seed: int = 0):
+    """
+    Pick a small weighted subset of weather years.
+
+    Parameters:
+        stats (pd.DataFrame): Output of year_statistics.
+        k (int): Number of representative years (k-medoids clusters).
+        extremes (list): Statistics whose minimum and maximum year are always included,
+                         e.g. ['wind yield', 'dunkelflaute']. They get weight 0 unless
+                         they are also a medoid.
+        seed (int): Seed of the k-medoids initialisation.
+
+    Returns:
+        pd.Series: Weight (share of represented years) of each selected year.
+    """
+    medoids, labels = k_medoids(_standardise(stats), k, seed=seed)
+    weights = pd.Series(np.bincount(labels, minlength=k) / len(labels), index=stats.index[medoids])
+    for stat in extremes or []:
+        for year in [stats[stat].idxmin(), stats[stat].idxmax()]:
+            if year not in weights.index:
+                weights[year] = 0.
+    return weights.sort_index()
+
+
+def weighted_quantiles(values: np.ndarray, weights: np.ndarray, quantiles: np.ndarray):
+    """ Quantiles of each column of values under the given row weights """
+    order = np.argsort(values, axis=0)
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    cumulative = np.cumsum(weights[order], axis=0)
+    cumulative = (cumulative - 0.5 * weights[order]) / weights.sum()
+    return np.array([[np.interp(q, cumulative[:, j], sorted_values[:, j]) for j in range(values.shape[1])] for q in quantiles])
+
+
+def compare_distributions(full: pd.DataFrame, subset: pd.DataFrame, weights: pd.Series):
+    """
+    Compare the capacity distribution of all years with that of the weighted subset.
+
+    Parameters:
+        full (pd.DataFrame): Capacities per year (rows) and technology (columns).
+        subset (pd.DataFrame): Capacities of the selected years.
+        weights (pd.Series): Weights of the selected years.
+    """
+    w = weights.reindex(subset.index).values
+    quantiles = np.array([0.0, 0.25, 0.5, 0.75, 1.0])
+    rows = {}
+    for name, values, row_weights in [('full', full.values, np.ones(len(full))), ('subset', subset.values, w)]:
+        q = weighted_quantiles(values, row_weights, quantiles)
+        rows[(name, 'mean')] = np.average(values, axis=0, weights=row_weights)
+        for qi, qv in zip(quantiles, q):
+            rows[(name, f'q{int(qi * 100)}')] = qv
+    comparison = pd.DataFrame(rows, index=full.columns).T
+    error = (comparison.loc['subset'] - comparison.loc['full']) / comparison.loc['full'].abs().replace(0, np.nan)
+    return pd.concat({'full': comparison.loc['full'], 'subset': comparison.loc['subset'], 'relative error': error})
+
+
+if __name__ == "__main__":
+    import results_plotter as plot
+    from references import REFERENCES
+    from a import create_network
+    from sweep_runner import SWEEP_DIR, run_sweep, load_mixes
+
+    weather_years = range(1985, 2016)
+    datas = {year: DataLoader(country="ESP", discount_rate=0.07, weather_year=year) for year in weather_years}
+
+    stats = year_statistics(datas)
+    weights = select_years(stats, k=5, extremes=['wind yield', 'dunkelflaute'])
+    print(stats.round(3))
+    print(weights)
+
+    # Solve the selection (already solved years are reused from the c.py log) and all years
+    log_file = SWEEP_DIR / "c_weather_years.jsonl"
+    scenarios = {f"weather_year={year}": year for year in weather_years}
+    selected = {f"weather_year={year}": year for year in weights.index}
+    run_sweep(selected, lambda year: create_network(datas[year]), log_file)
+    run_sweep(scenarios, lambda year: create_network(datas[year]), log_file)
+
+    columns = REFERENCES['GENERATORS'] + REFERENCES['LINKS']
+    full = pd.DataFrame(load_mixes(log_file, REFERENCES['GENERATORS'], REFERENCES['LINKS'], scenarios),
+                        index=list(weather_years), columns=columns)
+    subset = full.loc[weights.index]
+    print(compare_distributions(full, subset, weights).round(3))
+    plot.plot_weather_selection(full.values, subset.values, weights.values, filename="c_weather_selection.png")
@@ -0,0 +1,227 @@
+import json
+import sys
+import threading
+import time
+import traceback
+import pandas as pd
+import pypsa
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from data_loader import DataLoader
+from a import create_network
+from b import add_co2_constraint
+from d import add_storage
+from f import add_neighbors
+from kpis import compute_kpis
+from model_cache import PATCHES, structure_hash, parameter_hashes, attach_model
+from cost_uncertainty import patch_costs
+from warm_start import WarmStartSolver
+
+HOST, PORT = "127.0.0.1", 8765
+
+# Networks kept warm. Every network has a (non-binding) CO2 limit so it can be patched.
+NETWORKS = {
+    'base'           : lambda data: add_co2_constraint(create_network(data), 1e9),
+    'storage'        : lambda data: add_co2_constraint(add_storage(create_network(data), data), 1e9),
+    'interconnected' : lambda data: add_neighbors(add_co2_constraint(add_storage(create_network(data), data), 1e9), data),
+}
+STAGES = ['patch', 'model', 'solve', 'kpis', 'total']
+
+
+class HotModel:
+    """ A built network and its linopy model, re-solved with parameter patches """
+
+    def __init__(self, network: pypsa.Network):
+        self.network = network
+        self.build_model(network)
+        self.solver = WarmStartSolver(solve=lambda network, **kwargs: network.optimize.solve_model(**kwargs))
+
+    def build_model(self, network: pypsa.Network):
+        network.optimize.create_model()
+        self.model = network.model
+        self.objective_constant = network.objective_constant
+        self.structure = structure_hash(network)
+        self.parameters = parameter_hashes(network)
+
+    def attach(self, network: pypsa.Network):
+        """
+        Attach the hot model to a patched copy of the network, patching in the parameter groups
+        that differ from the ones the model currently holds. Returns the patched groups,
+        or None if the model was rebuilt because the structure changed or a patch could not
+        be applied (e.g. a new non-zero cost on a variable missing from the objective).
+        """
+        if structure_hash(network) != self.structure:
+            self.build_model(network)
+            return None
+        hashes = parameter_hashes(network)
+        patched = [group for group, value in hashes.items() if self.parameters.get(group) != value]
+        if any([PATCHES[group](network, self.model) for group in patched]):
+            self.build_model(network)
+            return None
+        self.parameters = hashes
+        attach_model(network, self.model, self.objective_constant)
+        return patched
+
+
+def apply_patch(network: pypsa.Network, data: DataLoader, patch: dict):
+    """
+    Apply a what-if request to a copy of a network.
+
+    Supported keys:
+        co2_limit (float): CO2 limit in t.
+        costs (dict): Multiplicative factors on data.costs, e.g. {"battery storage": {"investment": 0.7}}.
+        attributes (dict): Component attributes, e.g. {"Generator": {"OCGT": {"p_nom_max": 10000}}}.
+    """
+    if 'costs' in patch:
+        sample = {f"{row}|{param}": data.costs.at[row, param] * factor
+                  for row, params in patch['costs'].items() for param, factor in params.items()}
+        patch_costs(network, data.costs, sample)
+    if 'co2_limit' in patch:
+        primary = network.global_constraints.type == "primary_energy"
+        network.global_constraints.loc[primary, 'constant'] = float(patch['co2_limit'])
+    for component, names in patch.get('attributes', {}).items():
+        df = network.df(component)
+        for name, attrs in names.items():
+            for attr, value in attrs.items():
+                df.at[name, attr] = value
+    return network
+
+
+def summarise(kpis: pd.DataFrame):
+    """ System KPIs and capacities of a KPI table, as JSON-friendly dicts """
+    system = kpis[kpis.component == 'System'].set_index('metric').value
+    capacities = kpis[kpis.metric == 'capacity']
+    return {
+        'system'     : system.to_dict(),
+        'capacities' : {c: df.set_index('name').value.to_dict() for c, df in capacities.groupby('component')},
+    }
+
+
+class WhatIfService:
+    """ Keeps the data, the networks and their models in memory and answers what-if requests """
+
+    def __init__(self, networks: dict = NETWORKS, preload: tuple = ()):
+        start = time.perf_counter()
+        self.data = DataLoader(country="ESP", discount_rate=0.07)
+        self.builders = networks
+        self.hot = {}
+        self.latencies = []
+        self.lock = threading.Lock() # one solve at a time on the shared models
+        for name in preload:
+            self.get(name)
+        print(f"Service ready in {time.perf_counter() - start:.1f} s")
+
+    def get(self, name: str):
+        if name not in self.hot:
+            self.hot[name] = HotModel(self.builders[name](self.data))
+        return self.hot[name]
+
+    def whatif(self, request: dict):
+        timings = {}
+        start = time.perf_counter()
+        with self.lock:
+            hot = self.get(request.get('network', 'storage'))
+            network = apply_patch(hot.network.copy(), self.data, request)
+            timings['patch'] = time.perf_counter() - start
+
+            t = time.perf_counter()
+            patched = hot.attach(network)
+            timings['model'] = time.perf_counter() - t
+
+            t = time.perf_counter()
+            status, condition = hot.solver(network, **request.get('solver', {}))
+            timings['solve'] = time.perf_counter() - t
+
+            t = time.perf_counter()
+            result = summarise(compute_kpis(network)) if status == "ok" else {}
+            timings['kpis'] = time.perf_counter() - t
+        timings['total'] = time.perf_counter() - start
+        self.latencies.append(timings)
+        return {
+            'status'    : status,
+            'condition' : condition,
+            'patched'   : patched if patched is not None else "rebuilt",
+            'latency'   : timings,
+            **result,
+        }
+
+    def metrics(self):
+        """ Request count and latency percentiles per stage, in seconds """
+        if not self.latencies:
+            return {'requests': 0}
+        df = pd.DataFrame(self.latencies)
+        return {
+            'requests' : len(df),
+            'latency'  : {stage: {'mean': df[stage].mean(), 'p50': df[stage].median(),
+                                  'p95': df[stage].quantile(0.95), 'max': df[stage].max()}
+                          for stage in STAGES if stage in df},
+            'networks' : list(self.hot),
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    POST /whatif  {"network": "storage", "co2_limit": 5e6, "costs": {"battery storage": {"investment": 0.7}}}
+    GET  /metrics
+    """
+    service: WhatIfService = None
+
+    def _reply(self, code: int, body: dict):
+        payload = json.dumps(body, default=lambda x: None if pd.isna(x) else float(x)).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._reply(200, self.service.metrics())
+        else:
+            self._reply(404, {'error': f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/whatif":
+            return self._reply(404, {'error': f"unknown path {self.path}"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            self._reply(200, self.service.whatif(request))
+        except Exception:
+            self._reply(400, {'error': traceback.format_exc(limit=3)})
+
+
+def serve(host: str = HOST, port: int = PORT, preload: tuple = ('storage',)):
+    """ Run the what-if service on a local port until interrupted """
+    Handler.service = WhatIfService(preload=preload)
+    server = HTTPServer((host, port), Handler) # requests are handled one at a time
+    print(f"Listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def ask(request: dict, host: str = HOST, port: int = PORT):
+    """ Client helper: send a what-if request and return the decoded reply """
+    from urllib.request import Request, urlopen
+    body = json.dumps(request).encode()
+    with urlopen(Request(f"http://{host}:{port}/whatif", data=body, headers={"Content-Type": "application/json"})) as reply:
+        return json.loads(reply.read())
+
+
+if __name__ == "__main__":
+    # python whatif_server.py              start the service
+    # python whatif_server.py example      send a few example requests to a running service
+    if sys.argv[1:] == ["example"]:
+        for request in [
+            {'network': 'storage'},
+            {'network': 'storage', 'costs': {'battery storage': {'investment': 0.7}}},
+            {'network': 'storage', 'co2_limit': 5e6},
+            {'network': 'storage', 'co2_limit': 5e6, 'costs': {'OCGT': {'fuel': 2}}},
+        ]:
+            reply = ask(request)
+            print(request, reply['status'], {k: round(v, 2) for k, v in reply['latency'].items()},
+                  f"{reply['system']['objective'] / 1e6:.1f} M€" if 'system' in reply else "")
+    else:
+        serve()